@@ -0,0 +1,100 @@
+"""Store capture time, camera and orientation on images rendered before they were extracted.
+
+    python -m backend.app.cli.backfill_metadata [--batch-size N]
+
+Run once after upgrading: until then such images have no taken_at, so listings sorted or filtered by
+capture time leave them out. It first gives all of them their upload time as taken_at in one update,
+then reads the EXIF header of each original and replaces that with the capture time where there is
+one. Safe to run while the server is live and to re-run; only documents still lacking the extracted
+fields (no ``orientation``, which every newer image carries, if only as null) are touched.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+from pathlib import Path
+from typing import Any
+
+from pymongo import UpdateOne
+
+from backend.app.db import connect, disconnect, get_db
+from backend.app.services.galleries import bump_versions
+from backend.app.services.images import read_capture_metadata, storage_key
+
+
+EMPTY_METADATA: dict[str, Any] = {"taken_at": None, "camera": None, "orientation": None}
+
+
+async def _metadata(path: str) -> dict[str, Any]:
+    try:
+        return await read_capture_metadata(Path(path))
+    except Exception:
+        # missing or unreadable original: nothing to extract, the image still gets a sort time
+        return EMPTY_METADATA
+
+
+async def backfill(batch_size: int) -> tuple[int, int]:
+    """Returns how many images were updated and how many of them had a capture time."""
+    db = get_db()
+    # listings cover every image right away; the EXIF pass below refines the times batch by batch
+    await db.images.update_many({"taken_at": {"$exists": False}}, [{"$set": {"taken_at": "$created_at"}}])
+    updated = with_time = 0
+    projection = {
+        "_id": 1,
+        "id": 1,
+        "album_id": 1,
+        "subfolder_id": 1,
+        "created_at": 1,
+        "original_path": 1,
+        "storage_key": 1,
+    }
+    last_id = None
+    while True:
+        query: dict[str, Any] = {"orientation": {"$exists": False}}
+        if last_id is not None:
+            query["_id"] = {"$gt": last_id}
+        docs = await db.images.find(query, projection).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not docs:
+            break
+        last_id = docs[-1]["_id"]
+        # deduplicated content is read once per batch
+        paths = {storage_key(d): d["original_path"] for d in docs}
+        found = dict(zip(paths, await asyncio.gather(*(_metadata(p) for p in paths.values()))))
+
+        ops = []
+        for d in docs:
+            meta = found[storage_key(d)]
+            ops.append(
+                UpdateOne(
+                    {"id": d["id"], "orientation": {"$exists": False}},
+                    {"$set": {**meta, "taken_at": meta["taken_at"] or d["created_at"]}},
+                )
+            )
+            with_time += meta["taken_at"] is not None
+        blob_ops = [UpdateOne({"sha256": key, "orientation": {"$exists": False}}, {"$set": meta}) for key, meta in found.items()]
+        result = await db.images.bulk_write(ops, ordered=False)
+        await db.blobs.bulk_write(blob_ops, ordered=False)
+        await bump_versions((d["album_id"], d["subfolder_id"]) for d in docs)
+        updated += result.modified_count
+        print(f"{updated} images updated")
+    return updated, with_time
+
+
+async def run(args: argparse.Namespace) -> None:
+    connect()
+    try:
+        updated, with_time = await backfill(args.batch_size)
+        print(f"done: {updated} images, {with_time} with an EXIF capture time")
+    finally:
+        disconnect()
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.app.cli.backfill_metadata", description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per bulk write")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,462 @@
+"""Import a local photo archive straight into storage and MongoDB, without going through HTTP uploads.
+
+    python -m backend.app.cli.bulk_ingest ROOT [--album NAME] [--workers N] [--batch-size N] [--link]
+
+Top-level folders of ROOT become albums and the folders below them subfolders (nested folders are
+flattened into "a / b" names); files directly inside an album folder go to --default-subfolder. With
+--album, all of ROOT goes into that one album and its top-level folders become the subfolders.
+
+Variants are rendered on the image worker pool as files are read, content is deduplicated by SHA-256
+like uploads, and documents are written in batches. Image ids derive from the folder and file name,
+so an interrupted run can be resumed: the checkpoint skips finished folders without hashing them
+again, and files imported already are never added twice. Files that can't be imported are listed
+in a JSON lines file next to the checkpoint.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import collections
+import hashlib
+import json
+import os
+import shutil
+import time
+import uuid
+from collections.abc import AsyncIterator
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException
+from PIL import Image
+from pymongo import ReturnDocument, UpdateOne
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import connect, disconnect, get_db
+from backend.app.services.blobs import settle_new_images
+from backend.app.services.engine import start_engine, stop_engine
+from backend.app.services.galleries import bump_versions
+from backend.app.services.images import StoredImage, render_variants
+from backend.app.services.storage import original_path
+from backend.app.services.uploads import hash_file
+from backend.app.utils.files import ensure_parent, guess_extension
+from backend.app.utils.ids import new_album_id, new_subfolder_id
+
+
+IMAGE_EXTENSIONS = frozenset(Image.registered_extensions())
+# namespace of the deterministic image ids, which make re-imports of a file no-ops
+IMAGE_ID_NAMESPACE = uuid.UUID("5b0c6f2e-2f4b-4c55-9a1e-7d3f1c9a8e21")
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+@dataclass(frozen=True)
+class SourceFile:
+    # path relative to ROOT, as names; the walk yields them in ascending order of this tuple
+    parts: tuple[str, ...]
+    path: Path
+    size: int
+
+
+@dataclass
+class Progress:
+    total: int | None = None
+    # done in earlier runs, according to the checkpoint
+    resumed: int = 0
+    files: int = 0
+    bytes: int = 0
+    rendered: int = 0
+    duplicates: int = 0
+    existing: int = 0
+    failed: int = 0
+    started: float = field(default_factory=time.monotonic)
+
+    def line(self) -> str:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.files / elapsed
+        done = self.resumed + self.files
+        if self.total is None:
+            position, eta = f"{done}/?", "?"
+        else:
+            remaining = max(self.total - done, 0)
+            position = f"{done}/{self.total} ({done / max(self.total, 1):.1%})"
+            eta = _duration(remaining / rate) if rate else "?"
+        return (
+            f"{position} files, {rate:.1f} files/s, {self.bytes / elapsed / 1e6:.1f} MB/s, "
+            f"{self.rendered} rendered, {self.duplicates} duplicates, {self.existing} already imported, "
+            f"{self.failed} failed, ETA {eta}"
+        )
+
+
+def _duration(seconds: float) -> str:
+    minutes, secs = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}h{minutes:02d}m" if hours else f"{minutes}m{secs:02d}s"
+
+
+def _is_image(name: str) -> bool:
+    return not name.startswith(".") and guess_extension(name) in IMAGE_EXTENSIONS
+
+
+def _list_dir(path: Path) -> list[tuple[str, bool, int]]:
+    """``(name, is_dir, size)`` of the visible entries of ``path``, sorted by name."""
+    entries = []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.name.startswith("."):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                entries.append((entry.name, True, 0))
+            elif entry.is_file() and _is_image(entry.name):
+                entries.append((entry.name, False, entry.stat().st_size))
+    entries.sort()
+    return entries
+
+
+def _count_images(root: Path) -> int:
+    count = 0
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(Path(entry.path))
+                elif _is_image(entry.name) and entry.is_file():
+                    count += 1
+    return count
+
+
+async def walk(directory: Path, after: tuple[str, ...] = (), prefix: tuple[str, ...] = ()) -> AsyncIterator[SourceFile]:
+    """Images below ``directory`` depth first in name order, i.e. ascending ``parts``, past ``after``."""
+    for name, is_dir, size in await run_in_threadpool(_list_dir, directory):
+        parts = (*prefix, name)
+        if parts < after and after[: len(parts)] != parts:
+            # sorts before the checkpoint and doesn't lead to it: done entirely
+            continue
+        if is_dir:
+            async for source in walk(directory / name, after, parts):
+                yield source
+        elif parts > after:
+            yield SourceFile(parts, directory / name, size)
+
+
+def _place_original(source: Path, dest: Path, link: bool) -> None:
+    ensure_parent(dest)
+    if link:
+        try:
+            os.link(source, dest)
+            return
+        except FileExistsError:
+            return
+        except OSError:
+            # another filesystem: fall back to copying
+            pass
+    tmp = dest.with_name(f"{dest.name}.part")
+    shutil.copyfile(source, tmp)
+    os.replace(tmp, dest)
+
+
+def _write_json(path: Path, data: dict[str, Any]) -> None:
+    ensure_parent(path)
+    tmp = path.with_name(f"{path.name}.tmp")
+    tmp.write_text(json.dumps(data))
+    os.replace(tmp, path)
+
+
+def _append_lines(path: Path, lines: list[str]) -> None:
+    ensure_parent(path)
+    with path.open("a") as f:
+        f.writelines(lines)
+
+
+class SkipFile(Exception):
+    pass
+
+
+class Ingest:
+    def __init__(self, settings: Settings, args: argparse.Namespace) -> None:
+        self.settings = settings
+        self.root = Path(args.root).resolve()
+        self.album = args.album
+        self.default_subfolder = args.default_subfolder
+        self.batch_size = args.batch_size
+        self.window = args.window
+        self.link = args.link
+        default = Path(settings.storage_path) / "ingest" / hashlib.sha1(str(self.root).encode()).hexdigest()[:16]
+        self.checkpoint = Path(args.checkpoint) if args.checkpoint else default.with_suffix(".json")
+        self.errors = self.checkpoint.with_suffix(".errors.jsonl")
+        self.progress = Progress()
+        self._scopes: dict[tuple[str, str], asyncio.Future[tuple[str, str]]] = {}
+        # content rendered by this run and not written to db.blobs yet, shared by duplicates in flight
+        self._content: dict[str, asyncio.Future[dict[str, Any]]] = {}
+        self._batch: list[tuple[StoredImage, dict[str, Any], bool]] = []
+        self._failures: list[str] = []
+
+    def _scope_names(self, parts: tuple[str, ...]) -> tuple[str, str]:
+        folders = list(parts[:-1])
+        if self.album:
+            folders.insert(0, self.album)
+        if not folders:
+            raise SkipFile("not inside an album folder")
+        album, rest = folders[0], folders[1:]
+        return album, " / ".join(rest) or self.default_subfolder
+
+    async def _create_scope(self, names: tuple[str, str]) -> tuple[str, str]:
+        db = get_db()
+        album = await db.albums.find_one_and_update(
+            {"name": names[0]},
+            {"$setOnInsert": {"id": new_album_id(), "created_at": _now()}},
+            projection={"_id": 0, "id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        sub = await db.subfolders.find_one_and_update(
+            {"album_id": album["id"], "name": names[1]},
+            {"$setOnInsert": {"id": new_subfolder_id(), "created_at": _now()}},
+            projection={"_id": 0, "id": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+        )
+        return album["id"], sub["id"]
+
+    async def _scope(self, names: tuple[str, str]) -> tuple[str, str]:
+        """Album and subfolder ids for these names, created when missing."""
+        if names not in self._scopes:
+            # once per folder, however many of its files are in flight
+            self._scopes[names] = asyncio.ensure_future(self._create_scope(names))
+        return await asyncio.shield(self._scopes[names])
+
+    async def _render(self, source: SourceFile, sha256: str) -> dict[str, Any]:
+        rendered = await render_variants(source.path, sha256, self.settings)
+        dest = original_path(self.settings, sha256, guess_extension(source.path.name))
+        await run_in_threadpool(_place_original, source.path, dest, self.link)
+        self.progress.rendered += 1
+        return {
+            "state": "ready",
+            "original_ext": dest.suffix,
+            "original_path": str(dest),
+            "thumb_path": rendered.paths["thumb"],
+            "preview_path": rendered.paths["preview"],
+            "formats": list(rendered.formats),
+            "width": rendered.width,
+            "height": rendered.height,
+            "blurhash": rendered.blurhash,
+            "dominant_color": rendered.dominant_color,
+            "taken_at": rendered.taken_at,
+            "camera": rendered.camera,
+            "orientation": rendered.orientation,
+            "created_at": _now(),
+        }
+
+    async def _content_for(self, source: SourceFile, sha256: str) -> tuple[dict[str, Any], bool]:
+        """Blob fields for ``sha256``, rendering it unless stored already; and whether this run rendered it."""
+        if sha256 in self._content:
+            self.progress.duplicates += 1
+            return await asyncio.shield(self._content[sha256]), True
+        blob = await get_db().blobs.find_one({"sha256": sha256}, {"_id": 0})
+        if blob is not None and blob["state"] in ("pending", "ready"):
+            self.progress.duplicates += 1
+            return blob, False
+        if blob is not None and blob["state"] == "deleting":
+            raise SkipFile("the same content is being deleted; run again to import it")
+        future: asyncio.Future[dict[str, Any]] = asyncio.get_running_loop().create_future()
+        self._content[sha256] = future
+        try:
+            fields = await self._render(source, sha256)
+        except Exception as e:
+            del self._content[sha256]
+            future.set_exception(e)
+            # only duplicates waiting on it care
+            future.exception()
+            raise
+        except BaseException:
+            del self._content[sha256]
+            future.cancel()
+            raise
+        future.set_result(fields)
+        return fields, True
+
+    async def _prepare(self, source: SourceFile) -> tuple[StoredImage, dict[str, Any], bool]:
+        if source.size > self.settings.max_upload_mb * 1024 * 1024:
+            raise SkipFile("larger than MAX_UPLOAD_MB")
+        album_id, subfolder_id = await self._scope(self._scope_names(source.parts))
+        sha256 = await hash_file(source.path)
+        blob, rendered = await self._content_for(source, sha256)
+        image = StoredImage(
+            image_id=uuid.uuid5(IMAGE_ID_NAMESPACE, f"{subfolder_id}/{'/'.join(source.parts)}").hex,
+            album_id=album_id,
+            subfolder_id=subfolder_id,
+            filename=source.parts[-1],
+            original_ext=blob["original_ext"],
+            original_path=blob["original_path"],
+            thumb_path=blob["thumb_path"],
+            preview_path=blob["preview_path"],
+            formats=tuple(blob["formats"]),
+            width=blob["width"],
+            height=blob["height"],
+            created_at=_now(),
+            sha256=sha256,
+            storage_key=sha256,
+            status="ready" if blob["state"] == "ready" else "processing",
+            blurhash=blob.get("blurhash"),
+            dominant_color=blob.get("dominant_color"),
+            taken_at=blob.get("taken_at"),
+            camera=blob.get("camera"),
+            orientation=blob.get("orientation"),
+        )
+        return image, blob, rendered
+
+    async def _flush(self, last: SourceFile) -> None:
+        batch, failures = self._batch, self._failures
+        self._batch, self._failures = [], []
+        db = get_db()
+        ids = [image.image_id for image, _, _ in batch]
+        # written by an interrupted run after its last checkpoint
+        existing = {d["id"] async for d in db.images.find({"id": {"$in": ids}}, {"_id": 0, "id": 1})}
+        self.progress.existing += len(existing)
+        fresh = [entry for entry in batch if entry[0].image_id not in existing]
+
+        references = collections.Counter(image.sha256 for image, _, _ in fresh)
+        blobs = {image.sha256: (blob, rendered) for image, blob, rendered in fresh}
+        ops = []
+        for sha256, count in references.items():
+            blob, rendered = blobs[sha256]
+            if not rendered:
+                ops.append(UpdateOne({"sha256": sha256}, {"$inc": {"refcount": count}}))
+                continue
+            # rendering given up on by the server earlier, or new content
+            ops.append(
+                UpdateOne({"sha256": sha256, "state": "failed"}, {"$set": blob, "$unset": {"error": ""}})
+            )
+            ops.append(
+                UpdateOne({"sha256": sha256}, {"$inc": {"refcount": count}, "$setOnInsert": blob}, upsert=True)
+            )
+        if ops:
+            # blobs before images: a crash in between leaves a reference counted too often, never one missing
+            await db.blobs.bulk_write(ops, ordered=True)
+            docs = [image.to_doc() for image, _, _ in fresh]
+            await db.images.insert_many(docs, ordered=False)
+            await bump_versions((image.album_id, image.subfolder_id) for image, _, _ in fresh)
+            await settle_new_images(docs)
+        for sha256 in references:
+            future = self._content.get(sha256)
+            if future is not None and future.done():
+                # in db.blobs now, where later duplicates look it up
+                del self._content[sha256]
+
+        if failures:
+            await run_in_threadpool(_append_lines, self.errors, failures)
+        state = {
+            "root": str(self.root),
+            "album": self.album,
+            "last": list(last.parts),
+            "done": self.progress.resumed + self.progress.files,
+        }
+        await run_in_threadpool(_write_json, self.checkpoint, state)
+
+    def _resume_point(self) -> tuple[str, ...]:
+        if not self.checkpoint.is_file():
+            return ()
+        state = json.loads(self.checkpoint.read_text())
+        if state.get("root") != str(self.root) or state.get("album") != self.album:
+            raise SystemExit(f"{self.checkpoint} belongs to another import; pass --checkpoint")
+        self.progress.resumed = state.get("done", 0)
+        return tuple(state.get("last") or ())
+
+    async def _report(self, interval: float) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            print(self.progress.line(), flush=True)
+
+    async def _settle(self, source: SourceFile, task: asyncio.Task[tuple[StoredImage, dict[str, Any], bool]]) -> None:
+        try:
+            self._batch.append(await task)
+        except (HTTPException, SkipFile, BrokenProcessPool, OSError) as e:
+            detail = e.detail if isinstance(e, HTTPException) else (str(e) or type(e).__name__)
+            self._failures.append(json.dumps({"path": str(source.path), "error": detail}) + "\n")
+            self.progress.failed += 1
+        self.progress.files += 1
+        self.progress.bytes += source.size
+        if len(self._batch) + len(self._failures) >= self.batch_size:
+            await self._flush(source)
+
+    async def run(self, report_seconds: float, count: bool) -> None:
+        after = self._resume_point()
+        if after:
+            print(f"resuming after {'/'.join(after)} ({self.progress.resumed} files done)")
+
+        async def count_total() -> None:
+            self.progress.total = await run_in_threadpool(_count_images, self.root)
+
+        background = [asyncio.create_task(self._report(report_seconds))]
+        if count:
+            background.append(asyncio.create_task(count_total()))
+        # in walk order: the checkpoint only moves past files once every file before them is written
+        pending: collections.deque[tuple[SourceFile, asyncio.Task[Any]]] = collections.deque()
+        last: SourceFile | None = None
+        try:
+            async for source in walk(self.root, after):
+                pending.append((source, asyncio.create_task(self._prepare(source))))
+                while len(pending) >= self.window or (pending and pending[0][1].done()):
+                    last = pending[0][0]
+                    await self._settle(*pending.popleft())
+            while pending:
+                last = pending[0][0]
+                await self._settle(*pending.popleft())
+            if last is not None and (self._batch or self._failures):
+                await self._flush(last)
+        finally:
+            for _, task in pending:
+                task.cancel()
+            for task in background:
+                task.cancel()
+        print(self.progress.line())
+        if self.progress.failed:
+            print(f"{self.progress.failed} files not imported, see {self.errors}")
+
+
+async def run(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    connect()
+    start_engine(workers=args.workers or None)
+    ingest = Ingest(settings, args)
+    try:
+        print(f"importing {ingest.root} (checkpoint {ingest.checkpoint})")
+        await ingest.run(args.report_seconds, count=not args.no_count)
+    finally:
+        stop_engine()
+        disconnect()
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m backend.app.cli.bulk_ingest", description=__doc__.splitlines()[0])
+    parser.add_argument("root", help="folder to import")
+    parser.add_argument("--album", help="import everything into this album; top-level folders become subfolders")
+    parser.add_argument("--default-subfolder", default="Main", help="subfolder for files directly inside an album folder")
+    parser.add_argument("--workers", type=int, default=0, help="image worker processes (default: IMAGE_WORKERS)")
+    parser.add_argument("--batch-size", type=int, default=500, help="files per batch of database writes and checkpoint")
+    parser.add_argument(
+        "--window",
+        type=int,
+        default=max(64, (settings.image_workers or os.cpu_count() or 1) * 8),
+        help="files read, hashed and rendered ahead of the last written batch",
+    )
+    parser.add_argument("--link", action="store_true", help="hard-link originals into storage instead of copying them")
+    parser.add_argument("--checkpoint", help="checkpoint file (default: <STORAGE_PATH>/ingest/<root hash>.json)")
+    parser.add_argument("--report-seconds", type=float, default=10.0, help="interval of the progress readout")
+    parser.add_argument("--no-count", action="store_true", help="skip counting files up front (no ETA)")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
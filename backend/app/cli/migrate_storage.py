@@ -0,0 +1,240 @@
+"""Move stored files into the configured STORAGE_LAYOUT.
+
+    python -m backend.app.cli.migrate_storage [--batch-size N] [--workers N] [--grace SECONDS] [--dry-run]
+
+Safe to run while the server is live, and resumable: every file is hard-linked under its new name,
+documents are switched over with compare-and-set bulk writes, and old names are only unlinked after
+a grace period (cached documents expire) and a final sweep for documents written meanwhile. A rerun
+skips what is already in place and finishes unlinking old names a previous run left behind.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any
+
+from pymongo import UpdateOne
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import connect, disconnect, get_db
+from backend.app.services.lookups import invalidate_image
+from backend.app.services.storage import (
+    STORAGE_LAYOUTS,
+    layout_path,
+    originals_root,
+    previews_root,
+    sibling_path,
+    thumbs_root,
+)
+from backend.app.utils.files import ensure_parent
+
+
+# Blobs first: duplicates uploaded mid-migration copy their paths from the blob document.
+COLLECTIONS: dict[str, str] = {"blobs": "sha256", "images": "id"}
+PATH_FIELDS = ("original_path", "thumb_path", "preview_path")
+
+
+@dataclass
+class Progress:
+    moved: int = 0
+    skipped: int = 0
+    # old name -> new name, unlinked once no document can still point at the old one
+    stale: dict[Path, Path] = field(default_factory=dict)
+
+
+def _roots(settings: Settings) -> dict[str, Path]:
+    return {
+        "original_path": originals_root(settings),
+        "thumb_path": thumbs_root(settings),
+        "preview_path": previews_root(settings),
+    }
+
+
+def _files(path: Path, field_name: str, doc: dict[str, Any]) -> list[Path]:
+    if field_name == "original_path":
+        return [path]
+    return [path] + [sibling_path(path, fmt) for fmt in doc.get("formats") or ()]
+
+
+def _link(src: Path, dst: Path) -> None:
+    if not src.exists():
+        return
+    ensure_parent(dst)
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        pass
+
+
+def _drop_orphan(src: Path, dst: Path) -> None:
+    # the document went away meanwhile; keep the new name only while the content still exists
+    if not src.exists():
+        dst.unlink(missing_ok=True)
+
+
+def _exists(src: Path, dst: Path) -> bool:
+    return src.exists()
+
+
+def _unlink_stale(src: Path, dst: Path) -> bool:
+    # only ever drop a name whose content is reachable under the new one
+    try:
+        if not os.path.samefile(src, dst):
+            return False
+    except FileNotFoundError:
+        return False
+    src.unlink(missing_ok=True)
+    return True
+
+
+class Migrator:
+    def __init__(self, settings: Settings, batch_size: int, workers: int, dry_run: bool) -> None:
+        self.settings = settings
+        self.layout = settings.storage_layout
+        self.roots = _roots(settings)
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.progress = Progress()
+
+    async def _in_pool(self, fn: Any, calls: list[tuple[Path, Path]]) -> list[Any]:
+        loop = asyncio.get_running_loop()
+        return await asyncio.gather(*(loop.run_in_executor(self.pool, fn, src, dst) for src, dst in calls))
+
+    def _plan(
+        self, doc: dict[str, Any]
+    ) -> tuple[dict[str, str], list[tuple[Path, Path]], list[tuple[Path, Path]]]:
+        """New field values, (old, new) file names to link, and old names possibly left over."""
+        updates: dict[str, str] = {}
+        moves: list[tuple[Path, Path]] = []
+        leftovers: list[tuple[Path, Path]] = []
+        for field_name, root in self.roots.items():
+            current = doc.get(field_name)
+            if not current:
+                continue
+            path = Path(current)
+            if not path.is_relative_to(root):
+                self.progress.skipped += 1
+                continue
+            target = layout_path(root, path.name, self.layout)
+            if path != target:
+                updates[field_name] = str(target)
+                moves += list(zip(_files(path, field_name, doc), _files(target, field_name, doc)))
+                continue
+            # already switched: pick up old names an interrupted run didn't unlink
+            for layout in STORAGE_LAYOUTS:
+                old = layout_path(root, path.name, layout)
+                if old != target:
+                    leftovers += zip(_files(old, field_name, doc), _files(target, field_name, doc))
+        return updates, moves, leftovers
+
+    async def _batch(self, collection: str, key: str, docs: list[dict[str, Any]]) -> int:
+        plans = [(doc, *self._plan(doc)) for doc in docs]
+        if not self.dry_run:
+            leftovers = [pair for _, _, _, doc_leftovers in plans for pair in doc_leftovers]
+            found = await self._in_pool(_exists, leftovers)
+            self.progress.stale.update(pair for pair, exists in zip(leftovers, found) if exists)
+        planned = [(doc, updates, moves) for doc, updates, moves, _ in plans if updates]
+        if not planned:
+            return 0
+        moves = [move for _, _, doc_moves in planned for move in doc_moves]
+        if self.dry_run:
+            self.progress.moved += len(moves)
+            return len(planned)
+
+        await self._in_pool(_link, moves)
+        ops = [
+            UpdateOne(
+                {key: doc[key], **{f: doc[f] for f in updates}},
+                {"$set": updates},
+            )
+            for doc, updates, _ in planned
+        ]
+        result = await get_db()[collection].bulk_write(ops, ordered=False)
+        if collection == "images":
+            # only reaches this process; the server's cached copies expire within the grace period
+            for doc, _, _ in planned:
+                invalidate_image(doc[key])
+        if result.matched_count < len(ops):
+            # changed or deleted meanwhile: drop links to content that's gone with it
+            await self._in_pool(_drop_orphan, moves)
+        self.progress.moved += len(moves)
+        self.progress.stale.update(moves)
+        return result.modified_count
+
+    async def sweep(self) -> int:
+        """One pass over every collection; returns how many documents were switched."""
+        db = get_db()
+        switched = 0
+        projection = {"_id": 1, "formats": 1, **{f: 1 for f in PATH_FIELDS}}
+        for collection, key in COLLECTIONS.items():
+            scanned, linked = 0, self.progress.moved
+            last_id = None
+            while True:
+                query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+                docs = await (
+                    db[collection].find(query, {key: 1, **projection}).sort("_id", 1).limit(self.batch_size)
+                ).to_list(self.batch_size)
+                if not docs:
+                    break
+                last_id = docs[-1]["_id"]
+                scanned += len(docs)
+                switched += await self._batch(collection, key, docs)
+            print(f"{collection}: {scanned} documents scanned, {self.progress.moved - linked} files linked")
+        return switched
+
+    async def unlink_stale(self) -> int:
+        stale = list(self.progress.stale.items())
+        removed = await self._in_pool(_unlink_stale, stale)
+        self.progress.stale.clear()
+        return sum(removed)
+
+    def close(self) -> None:
+        self.pool.shutdown(wait=True)
+
+
+async def run(args: argparse.Namespace) -> None:
+    settings = get_settings()
+    connect()
+    migrator = Migrator(settings, batch_size=args.batch_size, workers=args.workers, dry_run=args.dry_run)
+    try:
+        print(f"migrating {settings.storage_path} to the {settings.storage_layout} layout")
+        switched = await migrator.sweep()
+        if args.dry_run:
+            print(f"dry run: {switched} documents and {migrator.progress.moved} files would move")
+            return
+        if migrator.progress.stale:
+            print(f"{switched} documents switched; waiting {args.grace:g}s before unlinking old names")
+            await asyncio.sleep(args.grace)
+            # documents created from pre-migration state while the first pass ran
+            await migrator.sweep()
+            print(f"{await migrator.unlink_stale()} old names unlinked")
+        if migrator.progress.skipped:
+            print(f"{migrator.progress.skipped} paths outside {settings.storage_path} left untouched")
+    finally:
+        migrator.close()
+        disconnect()
+
+
+def main(argv: list[str] | None = None) -> None:
+    settings = get_settings()
+    parser = argparse.ArgumentParser(prog="python -m backend.app.cli.migrate_storage", description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500, help="documents per bulk write")
+    parser.add_argument("--workers", type=int, default=16, help="concurrent file operations")
+    parser.add_argument(
+        "--grace",
+        type=float,
+        default=settings.lookup_cache_ttl_seconds + 30,
+        help="seconds to keep old names after switching documents (default: lookup cache TTL + 30)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="only report what would move")
+    asyncio.run(run(parser.parse_args(argv)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from functools import lru_cache
-from typing import Annotated
+from typing import Annotated, Literal
 
 from pydantic import AnyUrl, Field
 from pydantic_settings import BaseSettings, SettingsConfigDict
@@ -18,15 +18,83 @@ class Settings(BaseSettings):
 
     public_base_url: Annotated[str, Field(alias="PUBLIC_BASE_URL")] = "http://localhost:8000"
     storage_path: Annotated[str, Field(alias="STORAGE_PATH")] = "/data"
+    # Where new files go: "flat" (one directory per kind) or "sharded" (ab/cd/<name> fan-out).
+    # Existing files are moved with `python -m backend.app.cli.migrate_storage`.
+    storage_layout: Annotated[Literal["flat", "sharded"], Field(alias="STORAGE_LAYOUT")] = "flat"
 
     cors_origins: Annotated[str, Field(alias="CORS_ORIGINS")] = ""
 
+    # Image processing pool: 0 workers means one per CPU; recycle workers after N images (0 = never)
+    image_workers: Annotated[int, Field(alias="IMAGE_WORKERS", ge=0)] = 0
+    image_worker_max_tasks: Annotated[int, Field(alias="IMAGE_WORKER_MAX_TASKS", ge=0)] = 200
+    # Estimated decode memory (MB) all image workers may use at once; images are admitted against it
+    # from their header dimensions, and those needing over a quarter of it decode on a low-memory path
+    image_memory_budget_mb: Annotated[int, Field(alias="IMAGE_MEMORY_BUDGET_MB", ge=64)] = 1024
+    # Files of one bulk upload processed at the same time
+    upload_concurrency: Annotated[int, Field(alias="UPLOAD_CONCURRENCY", ge=1)] = 8
+    # Largest accepted original, and the chunk size suggested to resumable upload clients
+    max_upload_mb: Annotated[int, Field(alias="MAX_UPLOAD_MB", ge=1)] = 1024
+    upload_chunk_mb: Annotated[int, Field(alias="UPLOAD_CHUNK_MB", ge=1)] = 8
+    # Resumable upload sessions idle this long are discarded together with their staging file
+    upload_session_ttl_hours: Annotated[int, Field(alias="UPLOAD_SESSION_TTL_HOURS", ge=1)] = 24
+
+    # Background variant rendering: concurrent jobs (0 = IMAGE_WORKERS), attempts before an image is
+    # marked failed, and how long a job may go without a heartbeat before another worker takes it over
+    job_workers: Annotated[int, Field(alias="JOB_WORKERS", ge=0)] = 0
+    job_max_attempts: Annotated[int, Field(alias="JOB_MAX_ATTEMPTS", ge=1)] = 5
+    job_lease_seconds: Annotated[int, Field(alias="JOB_LEASE_SECONDS", ge=10)] = 300
+
+    # On-demand /media/resize widths (requests snap up to the next one) and their disk cache budget
+    resize_widths: Annotated[str, Field(alias="RESIZE_WIDTHS")] = "320,480,640,960,1280,1920,2560"
+    resize_cache_max_mb: Annotated[int, Field(alias="RESIZE_CACHE_MAX_MB", ge=1)] = 2048
+    # Disk cache budget for share thumbnail sprite sheets
+    sprite_cache_max_mb: Annotated[int, Field(alias="SPRITE_CACHE_MAX_MB", ge=1)] = 512
+    # Deep-zoom tile pyramids for images larger than the preview, and the disk cache budget of their tiles
+    deep_zoom: Annotated[bool, Field(alias="DEEP_ZOOM")] = True
+    tile_cache_max_mb: Annotated[int, Field(alias="TILE_CACHE_MAX_MB", ge=1)] = 4096
+
+    # bcrypt runs on its own threads; further requests are rejected with 503 beyond max pending
+    password_hash_workers: Annotated[int, Field(alias="PASSWORD_HASH_WORKERS", ge=1)] = 2
+    password_hash_max_pending: Annotated[int, Field(alias="PASSWORD_HASH_MAX_PENDING", ge=1)] = 16
+    # Failed share password attempts allowed per share and window before answering 429
+    share_auth_max_failures: Annotated[int, Field(alias="SHARE_AUTH_MAX_FAILURES", ge=1)] = 10
+    share_auth_window_seconds: Annotated[int, Field(alias="SHARE_AUTH_WINDOW_SECONDS", ge=1)] = 300
+
+    # Lifetime window of HMAC-signed media URLs handed out in image listings
+    media_url_ttl_seconds: Annotated[int, Field(alias="MEDIA_URL_TTL_SECONDS", ge=60)] = 3600
+
+    # In-process cache of image/share documents and verified share tokens used by media routes
+    lookup_cache_size: Annotated[int, Field(alias="LOOKUP_CACHE_SIZE", ge=0)] = 50_000
+    lookup_cache_ttl_seconds: Annotated[float, Field(alias="LOOKUP_CACHE_TTL_SECONDS", ge=0)] = 60.0
+
+    # Serialized share listing pages kept in memory, served with ETags (entries; 0 disables)
+    manifest_cache_size: Annotated[int, Field(alias="MANIFEST_CACHE_SIZE", ge=0)] = 256
+
+    # Bearer token Prometheus sends to scrape /metrics; the endpoint is disabled while empty
+    metrics_token: Annotated[str, Field(alias="METRICS_TOKEN")] = ""
+    # Save the serving thread's sampled stacks of requests slower than this (ms, 0 = profiler off),
+    # sampling every PROFILE_INTERVAL_MS, to PROFILE_DIR (default: <STORAGE_PATH>/profiles)
+    profile_slow_request_ms: Annotated[int, Field(alias="PROFILE_SLOW_REQUEST_MS", ge=0)] = 0
+    profile_interval_ms: Annotated[float, Field(alias="PROFILE_INTERVAL_MS", ge=1)] = 5.0
+    profile_dir: Annotated[str, Field(alias="PROFILE_DIR")] = ""
+
+    # Modern encodings written next to every JPEG variant (comma-separated: webp, avif)
+    variant_formats: Annotated[str, Field(alias="VARIANT_FORMATS")] = "webp"
+
     def parsed_cors_origins(self) -> list[str]:
         raw = (self.cors_origins or "").strip()
         if not raw:
             return []
         return [o.strip() for o in raw.split(",") if o.strip()]
 
+    def parsed_resize_widths(self) -> list[int]:
+        widths = sorted({int(w) for w in (self.resize_widths or "").split(",") if w.strip()})
+        return [w for w in widths if w > 0] or [1280]
+
+    def parsed_variant_formats(self) -> list[str]:
+        raw = (self.variant_formats or "").lower()
+        return [f.strip() for f in raw.split(",") if f.strip()]
+
     def absolute_share_url(self, share_id: str) -> str:
         base = self.public_base_url.rstrip("/")
         return f"{base}/share/{share_id}"
@@ -3,6 +3,7 @@ from __future__ import annotations
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
 from backend.app.core.config import get_settings
+from backend.app.utils.metrics import MongoCommandListener
 
 
 _client: AsyncIOMotorClient | None = None
@@ -12,7 +13,7 @@ _db: AsyncIOMotorDatabase | None = None
 def connect() -> None:
     global _client, _db
     settings = get_settings()
-    _client = AsyncIOMotorClient(settings.mongodb_uri)
+    _client = AsyncIOMotorClient(settings.mongodb_uri, event_listeners=[MongoCommandListener()])
     _db = _client[settings.database_name]
 
 
@@ -1,16 +1,24 @@
 from __future__ import annotations
 
+import hmac
 from pathlib import Path
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, PlainTextResponse
 
 from backend.app.core.config import get_settings
 from backend.app.db import connect, disconnect, get_db
 from backend.app.routes.admin import router as admin_router
 from backend.app.routes.media import router as media_router
 from backend.app.routes.shares import router as shares_router
+from backend.app.services.blobs import requeue_pending_blobs
+from backend.app.services.engine import start_engine, stop_engine
+from backend.app.services.jobs import start_job_runner, stop_job_runner
+from backend.app.services.profiler import start_profiler, stop_profiler
+from backend.app.services.uploads import start_upload_sweeper, stop_upload_sweeper
+from backend.app.utils.metrics import MetricsMiddleware, render_metrics
+from backend.app.utils.security import shutdown_hashing_pool
 
 
 def create_app() -> FastAPI:
@@ -27,10 +35,12 @@ def create_app() -> FastAPI:
             allow_methods=["*"],
             allow_headers=["*"],
         )
+    app.add_middleware(MetricsMiddleware)
 
     @app.on_event("startup")
     async def _startup() -> None:
         connect()
+        start_engine()
         db = get_db()
         await db.albums.create_index([("id", 1)], unique=True)
         await db.albums.create_index([("name", 1)], unique=True)
@@ -39,14 +49,40 @@ def create_app() -> FastAPI:
         await db.subfolders.create_index([("album_id", 1), ("name", 1)], unique=True)
 
         await db.images.create_index([("id", 1)], unique=True)
-        await db.images.create_index([("album_id", 1), ("created_at", -1)])
-        await db.images.create_index([("album_id", 1), ("subfolder_id", 1), ("created_at", -1)])
+        await db.images.create_index([("album_id", 1), ("created_at", -1), ("id", -1)])
+        await db.images.create_index([("album_id", 1), ("subfolder_id", 1), ("created_at", -1), ("id", -1)])
+        # capture time order and range filters (either direction)
+        await db.images.create_index([("album_id", 1), ("taken_at", 1), ("id", 1)])
+        await db.images.create_index([("album_id", 1), ("subfolder_id", 1), ("taken_at", 1), ("id", 1)])
+
+        await db.images.create_index([("storage_key", 1), ("status", 1)])
+
+        await db.blobs.create_index([("sha256", 1)], unique=True)
+        await db.blobs.create_index([("state", 1)])
+        await db.upload_sessions.create_index([("id", 1)], unique=True)
+        await db.upload_sessions.create_index([("expires_at", 1)])
+
+        await db.jobs.create_index([("id", 1)], unique=True)
+        await db.jobs.create_index([("state", 1), ("run_after", 1)])
+        await db.jobs.create_index([("kind", 1), ("key", 1), ("state", 1)])
+        # finished jobs are kept a week for inspection
+        await db.jobs.create_index([("finished_at", 1)], expireAfterSeconds=7 * 24 * 3600)
 
         await db.shares.create_index([("id", 1)], unique=True)
         await db.shares.create_index([("expires_at", 1)])
 
+        start_job_runner()
+        await requeue_pending_blobs()
+        start_upload_sweeper()
+        start_profiler()
+
     @app.on_event("shutdown")
     async def _shutdown() -> None:
+        stop_profiler()
+        await stop_upload_sweeper()
+        await stop_job_runner()
+        stop_engine()
+        shutdown_hashing_pool()
         disconnect()
 
     app.include_router(admin_router)
@@ -60,6 +96,16 @@ def create_app() -> FastAPI:
     async def healthz() -> dict[str, str]:
         return {"status": "ok"}
 
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics(request: Request) -> PlainTextResponse:
+        token = settings.metrics_token
+        if not token:
+            raise HTTPException(status_code=404, detail="Not Found")
+        auth = request.headers.get("Authorization") or ""
+        if not hmac.compare_digest(auth.encode(), f"Bearer {token}".encode()):
+            raise HTTPException(status_code=401, detail="Metrics token required")
+        return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
     @app.get("/{full_path:path}", include_in_schema=False)
     async def spa_fallback(full_path: str) -> FileResponse:
         # API and media are routed before this handler. Everything else is either:
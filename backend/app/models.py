@@ -36,9 +36,82 @@ class ImageOut(BaseModel):
     width: int
     height: int
     created_at: datetime
+    # EXIF capture time, or the upload time for images without one; camera make and model
+    taken_at: datetime | None = None
+    camera: str | None = None
     thumb_url: str
     preview_url: str
     image_url: str
+    # DZI descriptor of the deep-zoom tile pyramid, for images larger than the preview
+    tiles_url: str | None = None
+    # LQIP placeholders painted until the thumbnail arrives
+    blurhash: str | None = None
+    dominant_color: str | None = None
+    # processing while variants render in the background; failed images carry an error
+    status: str = "ready"
+    error: str | None = None
+
+
+class ImagePageOut(BaseModel):
+    items: list[ImageOut]
+    next_cursor: str | None
+
+
+class SpriteTileOut(BaseModel):
+    id: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+class SpriteSheetOut(BaseModel):
+    """One image holding the thumbnails of a listing page, with where each one sits."""
+
+    url: str
+    width: int
+    height: int
+    tile_size: int
+    tiles: list[SpriteTileOut]
+    next_cursor: str | None = None
+
+
+class ProcessingStatusOut(BaseModel):
+    processing: int
+    ready: int
+    failed: int
+    # variant jobs waiting or running across all albums
+    queued_jobs: int
+
+
+class UploadErrorOut(BaseModel):
+    filename: str
+    detail: str
+
+
+class BulkUploadOut(BaseModel):
+    images: list[ImageOut]
+    errors: list[UploadErrorOut]
+
+
+class UploadSessionCreateIn(BaseModel):
+    album_id: str
+    subfolder_id: str
+    filename: str = Field(min_length=1, max_length=255)
+    content_type: str
+    size: int = Field(ge=1)
+
+
+class UploadSessionOut(BaseModel):
+    id: str
+    album_id: str
+    subfolder_id: str
+    filename: str
+    size: int
+    chunk_size: int
+    received: int
+    ranges: list[list[int]]
+    complete: bool
 
 
 class ShareCreateIn(BaseModel):
@@ -1,24 +1,44 @@
 from __future__ import annotations
 
+import asyncio
 from datetime import datetime, timedelta, timezone
+from pathlib import Path
 from typing import Any
 
-from fastapi import APIRouter, Depends, File, HTTPException, UploadFile, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
+from pymongo import ReturnDocument
 
 from backend.app.core.config import Settings, get_settings
 from backend.app.db import get_db
 from backend.app.models import (
     AlbumCreateIn,
     AlbumOut,
+    BulkUploadOut,
     ImageOut,
+    ImagePageOut,
+    ProcessingStatusOut,
     ShareCreateIn,
     ShareOut,
     SubfolderCreateIn,
     SubfolderOut,
+    UploadErrorOut,
+    UploadSessionCreateIn,
+    UploadSessionOut,
 )
-from backend.app.services.images import store_upload_as_image
-from backend.app.utils.ids import new_album_id, new_image_id, new_share_id, new_subfolder_id
-from backend.app.utils.security import hash_password, require_admin
+from backend.app.services.archives import collect_archive_entries, stream_zip, zip_download_headers
+from backend.app.services.blobs import RENDER_JOB, release_image_content, settle_new_images, store_original
+from backend.app.services.galleries import ListingOrder, bump_versions, encode_image_page, image_item, image_page, listing_order
+from backend.app.services.images import StoredImage, require_image_content_type
+from backend.app.services.ingest import IngestedFile, RejectedFile, ingest_multipart
+from backend.app.services.jobs import count_active_jobs
+from backend.app.services.lookups import invalidate_image
+from backend.app.services.storage import staging_path
+from backend.app.services.uploads import allocate_upload_file, hash_file, merge_ranges, received_bytes, session_expiry, write_chunk
+from backend.app.utils.files import ensure_parent, guess_extension
+from backend.app.utils.ids import new_album_id, new_image_id, new_share_id, new_subfolder_id, new_upload_id
+from backend.app.utils.security import hash_password_async, require_admin
+from backend.app.utils.signing import media_url_expiry
 
 
 router = APIRouter(prefix="/api/admin", tags=["admin"])
@@ -36,22 +56,40 @@ def _subfolder_doc_to_out(doc: dict[str, Any]) -> SubfolderOut:
     return SubfolderOut(id=doc["id"], album_id=doc["album_id"], name=doc["name"], created_at=doc["created_at"])
 
 
-def _image_doc_to_out(doc: dict[str, Any]) -> ImageOut:
-    image_id = doc["id"]
-    return ImageOut(
-        id=image_id,
+async def _require_album_subfolder(album_id: str, subfolder_id: str) -> None:
+    db = get_db()
+    album = await db.albums.find_one({"id": album_id}, {"_id": 0})
+    if not album:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
+    sub = await db.subfolders.find_one({"id": subfolder_id, "album_id": album_id}, {"_id": 0})
+    if not sub:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subfolder not found")
+
+
+def _upload_session_to_out(doc: dict[str, Any], settings: Settings) -> UploadSessionOut:
+    ranges = merge_ranges(doc.get("ranges") or [])
+    received = received_bytes(ranges)
+    return UploadSessionOut(
+        id=doc["id"],
         album_id=doc["album_id"],
         subfolder_id=doc["subfolder_id"],
         filename=doc["filename"],
-        width=doc["width"],
-        height=doc["height"],
-        created_at=doc["created_at"],
-        thumb_url=f"/media/thumb/{image_id}",
-        preview_url=f"/media/preview/{image_id}",
-        image_url=f"/media/original/{image_id}",
+        size=doc["size"],
+        chunk_size=settings.upload_chunk_mb * 1024 * 1024,
+        received=received,
+        ranges=ranges,
+        complete=received == doc["size"],
     )
 
 
+def _upload_not_found() -> HTTPException:
+    return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+
+
+def _image_doc_to_out(doc: dict[str, Any], settings: Settings, expires: int) -> ImageOut:
+    return ImageOut(**image_item(doc, settings, expires))
+
+
 @router.get("/albums", response_model=list[AlbumOut], dependencies=[Depends(require_admin)])
 async def list_albums() -> list[AlbumOut]:
     db = get_db()
@@ -96,57 +134,295 @@ async def create_subfolder(payload: SubfolderCreateIn) -> SubfolderOut:
     return _subfolder_doc_to_out(doc)
 
 
-@router.get("/images", response_model=list[ImageOut], dependencies=[Depends(require_admin)])
-async def list_images(album_id: str, subfolder_id: str | None = None) -> list[ImageOut]:
+@router.get("/images", response_model=ImagePageOut, dependencies=[Depends(require_admin)])
+async def list_images(
+    album_id: str,
+    subfolder_id: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(default=200, ge=1, le=1000),
+    order: ListingOrder = Depends(listing_order),
+    settings: Settings = Depends(get_settings),
+) -> Response:
+    q: dict[str, Any] = {"album_id": album_id}
+    if subfolder_id:
+        q["subfolder_id"] = subfolder_id
+    docs, next_cursor = await image_page(q, cursor, limit, order=order)
+    # serialized directly; response_model only documents the shape
+    body = encode_image_page(docs, next_cursor, settings, media_url_expiry(settings))
+    return Response(content=body, media_type="application/json")
+
+
+@router.get("/albums/{album_id}/download.zip", dependencies=[Depends(require_admin)])
+async def download_album_zip(album_id: str, subfolder_id: str | None = None) -> StreamingResponse:
     db = get_db()
+    album = await db.albums.find_one({"id": album_id}, {"_id": 0})
+    if not album:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
     q: dict[str, Any] = {"album_id": album_id}
+    name = album["name"]
     if subfolder_id:
+        sub = await db.subfolders.find_one({"id": subfolder_id, "album_id": album_id}, {"_id": 0})
+        if not sub:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subfolder not found")
         q["subfolder_id"] = subfolder_id
-    cur = db.images.find(q, {"_id": 0}).sort("created_at", -1)
-    return [_image_doc_to_out(d) async for d in cur]
+        name = f"{album['name']}-{sub['name']}"
+    entries = await collect_archive_entries(q, by_subfolder=not subfolder_id)
+    return StreamingResponse(stream_zip(entries), media_type="application/zip", headers=zip_download_headers(name))
+
 
+# Body is parsed by ingest_multipart, not FastAPI; document it by hand so the schema stays the same.
+_BULK_UPLOAD_BODY: dict[str, Any] = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+    }
+}
 
-@router.post("/upload", response_model=list[ImageOut], dependencies=[Depends(require_admin)])
+
+@router.post(
+    "/upload",
+    response_model=BulkUploadOut,
+    dependencies=[Depends(require_admin)],
+    openapi_extra=_BULK_UPLOAD_BODY,
+)
 async def bulk_upload(
     album_id: str,
     subfolder_id: str,
-    files: list[UploadFile] = File(...),
+    request: Request,
     settings: Settings = Depends(get_settings),
-) -> list[ImageOut]:
+) -> BulkUploadOut:
     db = get_db()
-    album = await db.albums.find_one({"id": album_id}, {"_id": 0})
-    if not album:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Album not found")
-    sub = await db.subfolders.find_one({"id": subfolder_id, "album_id": album_id}, {"_id": 0})
-    if not sub:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Subfolder not found")
+    await _require_album_subfolder(album_id, subfolder_id)
+
+    sem = asyncio.Semaphore(settings.upload_concurrency)
 
-    outs: list[ImageOut] = []
-    for upload in files:
-        image_id = new_image_id()
-        stored = await store_upload_as_image(
-            upload=upload,
-            image_id=image_id,
-            album_id=album_id,
-            subfolder_id=subfolder_id,
+    async def _process(part: IngestedFile) -> StoredImage:
+        async with sem:
+            try:
+                return await store_original(
+                    staged=part.path,
+                    sha256=part.sha256,
+                    image_id=part.image_id,
+                    album_id=album_id,
+                    subfolder_id=subfolder_id,
+                    filename=part.filename,
+                    settings=settings,
+                )
+            except BaseException:
+                part.path.unlink(missing_ok=True)
+                raise
+
+    # Files are processed while later parts are still streaming in.
+    pending: list[tuple[str, asyncio.Task[StoredImage] | str]] = []
+    staged: list[Path] = []
+    try:
+        async for part in ingest_multipart(request, settings, new_image_id):
+            if isinstance(part, RejectedFile):
+                pending.append((part.filename, part.detail))
+            else:
+                staged.append(part.path)
+                pending.append((part.filename, asyncio.create_task(_process(part))))
+    except BaseException:
+        tasks = [t for _, t in pending if isinstance(t, asyncio.Task)]
+        for task in tasks:
+            task.cancel()
+        for result in await asyncio.gather(*tasks, return_exceptions=True):
+            if isinstance(result, StoredImage):
+                await release_image_content(result.to_doc(), settings)
+        # parts whose task was cancelled before it started (stored ones were moved away already)
+        for path in staged:
+            path.unlink(missing_ok=True)
+        raise
+
+    tasks = [t for _, t in pending if isinstance(t, asyncio.Task)]
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+    docs: list[dict[str, Any]] = []
+    errors: list[UploadErrorOut] = []
+    for filename, outcome in pending:
+        if isinstance(outcome, str):
+            errors.append(UploadErrorOut(filename=filename, detail=outcome))
+            continue
+        if outcome.cancelled():
+            raise asyncio.CancelledError()
+        exc = outcome.exception()
+        if exc is None:
+            docs.append(outcome.result().to_doc())
+        elif isinstance(exc, HTTPException):
+            errors.append(UploadErrorOut(filename=filename, detail=str(exc.detail)))
+        elif isinstance(exc, Exception):
+            errors.append(UploadErrorOut(filename=filename, detail="Upload failed"))
+        else:
+            raise exc
+
+    if docs:
+        await db.images.insert_many(docs, ordered=False)
+        await bump_versions([(album_id, subfolder_id)])
+        await settle_new_images(docs)
+    expires = media_url_expiry(settings)
+    return BulkUploadOut(images=[_image_doc_to_out(d, settings, expires) for d in docs], errors=errors)
+
+
+@router.get("/processing", response_model=ProcessingStatusOut, dependencies=[Depends(require_admin)])
+async def get_processing_status(album_id: str | None = None, subfolder_id: str | None = None) -> ProcessingStatusOut:
+    """Progress of background variant rendering, optionally for one album or subfolder."""
+    q: dict[str, Any] = {}
+    if album_id:
+        q["album_id"] = album_id
+    if subfolder_id:
+        q["subfolder_id"] = subfolder_id
+    counts = {"processing": 0, "ready": 0, "failed": 0}
+    pipeline = [{"$match": q}, {"$group": {"_id": {"$ifNull": ["$status", "ready"]}, "n": {"$sum": 1}}}]
+    async for row in get_db().images.aggregate(pipeline):
+        counts[row["_id"]] = row["n"]
+    return ProcessingStatusOut(**counts, queued_jobs=await count_active_jobs(RENDER_JOB))
+
+
+@router.post(
+    "/uploads",
+    response_model=UploadSessionOut,
+    status_code=status.HTTP_201_CREATED,
+    dependencies=[Depends(require_admin)],
+)
+async def create_upload_session(payload: UploadSessionCreateIn, settings: Settings = Depends(get_settings)) -> UploadSessionOut:
+    require_image_content_type(payload.content_type)
+    if payload.size > settings.max_upload_mb * 1024 * 1024:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+    await _require_album_subfolder(payload.album_id, payload.subfolder_id)
+
+    upload_id = new_upload_id()
+    staged = staging_path(settings, upload_id, guess_extension(payload.filename))
+    ensure_parent(staged)
+    await allocate_upload_file(staged, payload.size)
+    doc = {
+        "id": upload_id,
+        "image_id": new_image_id(),
+        "album_id": payload.album_id,
+        "subfolder_id": payload.subfolder_id,
+        "filename": payload.filename,
+        "content_type": payload.content_type,
+        "size": payload.size,
+        "staging_path": str(staged),
+        "ranges": [],
+        "state": "open",
+        "created_at": _now(),
+        "expires_at": session_expiry(settings),
+    }
+    await get_db().upload_sessions.insert_one(doc)
+    return _upload_session_to_out(doc, settings)
+
+
+@router.get("/uploads/{upload_id}", response_model=UploadSessionOut, dependencies=[Depends(require_admin)])
+async def get_upload_session(upload_id: str, settings: Settings = Depends(get_settings)) -> UploadSessionOut:
+    doc = await get_db().upload_sessions.find_one({"id": upload_id, "state": "open"}, {"_id": 0})
+    if not doc:
+        raise _upload_not_found()
+    return _upload_session_to_out(doc, settings)
+
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionOut, dependencies=[Depends(require_admin)])
+async def put_upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(ge=0),
+    settings: Settings = Depends(get_settings),
+) -> UploadSessionOut:
+    db = get_db()
+    doc = await db.upload_sessions.find_one({"id": upload_id, "state": "open"}, {"_id": 0})
+    if not doc:
+        raise _upload_not_found()
+    if offset >= doc["size"]:
+        raise HTTPException(status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE, detail="Offset beyond upload size")
+
+    # Chunks may arrive in parallel or be retried; a range only counts once fully written.
+    written = await write_chunk(Path(doc["staging_path"]), offset, request.stream(), doc["size"])
+    if written:
+        updated = await db.upload_sessions.find_one_and_update(
+            {"id": upload_id, "state": "open"},
+            {"$push": {"ranges": [offset, offset + written]}, "$set": {"expires_at": session_expiry(settings)}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.AFTER,
+        )
+        if not updated:
+            raise _upload_not_found()
+        doc = updated
+    return _upload_session_to_out(doc, settings)
+
+
+@router.post("/uploads/{upload_id}/complete", response_model=ImageOut, dependencies=[Depends(require_admin)])
+async def complete_upload_session(upload_id: str, settings: Settings = Depends(get_settings)) -> ImageOut:
+    db = get_db()
+    doc = await db.upload_sessions.find_one_and_update(
+        {"id": upload_id, "state": "open"},
+        # a process dying mid-way leaves it finalizing; the sweep reclaims it once this deadline passes
+        {"$set": {"state": "finalizing", "expires_at": session_expiry(settings)}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if not doc:
+        raise _upload_not_found()
+    if received_bytes(doc["ranges"]) != doc["size"]:
+        await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"state": "open"}})
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload incomplete")
+
+    staged = Path(doc["staging_path"])
+    try:
+        stored = await store_original(
+            staged=staged,
+            sha256=await hash_file(staged),
+            image_id=doc["image_id"],
+            album_id=doc["album_id"],
+            subfolder_id=doc["subfolder_id"],
+            filename=doc["filename"],
             settings=settings,
         )
-        doc = {
-            "id": stored.image_id,
-            "album_id": stored.album_id,
-            "subfolder_id": stored.subfolder_id,
-            "filename": stored.filename,
-            "original_ext": stored.original_ext,
-            "original_path": stored.original_path,
-            "thumb_path": stored.thumb_path,
-            "preview_path": stored.preview_path,
-            "width": stored.width,
-            "height": stored.height,
-            "created_at": stored.created_at,
-        }
-        await db.images.insert_one(doc)
-        outs.append(_image_doc_to_out(doc))
-    return outs
+    except HTTPException as e:
+        if e.status_code < 500:
+            # not an image: nothing a retry could fix
+            staged.unlink(missing_ok=True)
+            await db.upload_sessions.delete_one({"id": upload_id})
+        else:
+            # e.g. 503 while the same content is being deleted: keep the received file for a retry
+            await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"state": "open"}})
+        raise
+    except BaseException:
+        await db.upload_sessions.update_one({"id": upload_id}, {"$set": {"state": "open"}})
+        raise
+
+    image_doc = stored.to_doc()
+    await db.images.insert_one(image_doc)
+    await bump_versions([(image_doc["album_id"], image_doc["subfolder_id"])])
+    await settle_new_images([image_doc])
+    await db.upload_sessions.delete_one({"id": upload_id})
+    return _image_doc_to_out(image_doc, settings, media_url_expiry(settings))
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_admin)])
+async def abort_upload_session(upload_id: str) -> Response:
+    doc = await get_db().upload_sessions.find_one_and_delete({"id": upload_id, "state": "open"}, {"_id": 0})
+    if not doc:
+        raise _upload_not_found()
+    Path(doc["staging_path"]).unlink(missing_ok=True)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
+
+
+@router.delete("/images/{image_id}", status_code=status.HTTP_204_NO_CONTENT, dependencies=[Depends(require_admin)])
+async def delete_image(image_id: str, settings: Settings = Depends(get_settings)) -> Response:
+    doc = await get_db().images.find_one_and_delete({"id": image_id}, {"_id": 0})
+    if not doc:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Image not found")
+    invalidate_image(image_id)
+    await bump_versions([(doc["album_id"], doc["subfolder_id"])])
+    await release_image_content(doc, settings)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post("/shares", response_model=ShareOut, status_code=status.HTTP_201_CREATED, dependencies=[Depends(require_admin)])
@@ -167,7 +443,7 @@ async def create_share(payload: ShareCreateIn, settings: Settings = Depends(get_
         "id": share_id,
         "album_id": payload.album_id,
         "subfolder_id": payload.subfolder_id,
-        "password_hash": hash_password(payload.password),
+        "password_hash": await hash_password_async(payload.password),
         "created_at": created_at,
         "expires_at": expires_at,
     }
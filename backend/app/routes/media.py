@@ -1,19 +1,32 @@
 from __future__ import annotations
 
 import mimetypes
+import time
+from collections.abc import Iterable
 from datetime import datetime, timezone
+from pathlib import Path
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, Request, status
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from fastapi.responses import FileResponse, Response
 
 from backend.app.core.config import Settings, get_settings
-from backend.app.db import get_db
-from backend.app.utils.security import decode_share_jwt
+from backend.app.services.galleries import ListingOrder
+from backend.app.services.images import MEDIA_TYPES, enabled_variant_formats, resized_variant, snap_resize_width
+from backend.app.services.lookups import get_image, get_share, verify_share_token
+from backend.app.services.sprites import MAX_SPRITE_TILES, share_sprite_sheet
+from backend.app.services.storage import sibling_path, variant_path_candidates
+from backend.app.services.tiles import dzi_descriptor, tile_bytes
+from backend.app.utils.signing import verify_media_signature, verify_sprite_signature
 
 
 router = APIRouter(tags=["media"])
 
+# Served representation depends on Accept, so shared caches must key on it too.
+_VARIANT_HEADERS = {"Cache-Control": "public, max-age=31536000, immutable", "Vary": "Accept"}
+# Most compact first
+_FORMAT_PREFERENCE = ("avif", "webp")
+
 
 def _now() -> datetime:
     return datetime.now(timezone.utc)
@@ -23,6 +36,85 @@ def _not_found() -> HTTPException:
     return HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
 
 
+def _accepted_types(request: Request) -> set[str]:
+    accepted: set[str] = set()
+    for item in (request.headers.get("Accept") or "").split(","):
+        media_type, _, params = item.strip().partition(";")
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            accepted.add(media_type.strip().lower())
+    return accepted
+
+
+def _negotiate_format(request: Request, available: Iterable[str]) -> str:
+    # Wildcards don't count: browsers list image/avif and image/webp explicitly when they decode them.
+    accepted = _accepted_types(request)
+    offered = set(available)
+    for fmt in _FORMAT_PREFERENCE:
+        if fmt in offered and MEDIA_TYPES[fmt] in accepted:
+            return fmt
+    return "jpeg"
+
+
+def _variant_response(path: str, img: dict[str, Any], request: Request) -> FileResponse:
+    fmt = _negotiate_format(request, img.get("formats") or ())
+    return FileResponse(sibling_path(Path(path), fmt), media_type=MEDIA_TYPES[fmt], headers=_VARIANT_HEADERS)
+
+
+def _signed_key(image_id: str, request: Request) -> str:
+    # storage key of deduplicated content; images stored before that use their own id
+    return request.query_params.get("k") or image_id
+
+
+def _signed_expiry(variant: str, image_id: str, request: Request, settings: Settings) -> int | None:
+    """Expiry of a valid signed URL, None when the request isn't signed at all."""
+    signature = request.query_params.get("s")
+    if not signature:
+        return None
+    try:
+        expires = int(request.query_params.get("e") or "")
+    except ValueError:
+        expires = 0
+    key = _signed_key(image_id, request)
+    if not verify_media_signature(settings, variant, image_id, expires, key, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired link")
+    return expires
+
+
+def _signed_headers(expires: int, vary: bool = True) -> dict[str, str]:
+    # cacheable by anyone holding the URL, but no longer than the URL itself is valid
+    max_age = max(0, expires - int(time.time()))
+    headers = {"Cache-Control": f"public, max-age={max_age}, immutable"}
+    if vary:
+        headers["Vary"] = "Accept"
+    return headers
+
+
+def _signed_variant_response(variant: str, image_id: str, request: Request, settings: Settings, expires: int) -> FileResponse:
+    # Resolved from the storage layout alone: no database round trip for signed variant URLs.
+    candidates = variant_path_candidates(settings, variant, _signed_key(image_id, request))
+    jpeg = next((p for p in candidates if p.is_file()), candidates[0])
+    accepted = _accepted_types(request)
+    for fmt in _FORMAT_PREFERENCE:
+        if MEDIA_TYPES[fmt] in accepted:
+            candidate = sibling_path(jpeg, fmt)
+            if candidate.is_file():
+                return FileResponse(candidate, media_type=MEDIA_TYPES[fmt], headers=_signed_headers(expires))
+    if jpeg.is_file():
+        return FileResponse(jpeg, media_type="image/jpeg", headers=_signed_headers(expires))
+    if variant == "preview":
+        # Fallback to thumb if preview doesn't exist (e.g. old images)
+        return _signed_variant_response("thumb", image_id, request, settings, expires)
+    raise _not_found()
+
+
 def _ensure_share_access(img: dict[str, Any], share: dict[str, Any]) -> None:
     if img["album_id"] != share["album_id"]:
         raise _not_found()
@@ -32,8 +124,7 @@ def _ensure_share_access(img: dict[str, Any], share: dict[str, Any]) -> None:
 
 
 async def _require_admin_or_share_access(image_id: str, request: Request, settings: Settings) -> dict[str, Any]:
-    db = get_db()
-    img = await db.images.find_one({"id": image_id}, {"_id": 0})
+    img = await get_image(image_id)
     if not img:
         raise _not_found()
 
@@ -49,9 +140,9 @@ async def _require_admin_or_share_access(image_id: str, request: Request, settin
             token = auth.split(" ", 1)[1].strip()
     if not token:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Not authorized")
-    session = decode_share_jwt(token, settings)
+    session = verify_share_token(token, settings)
 
-    share = await db.shares.find_one({"id": session.share_id}, {"_id": 0, "password_hash": 0})
+    share = await get_share(session.share_id)
     if not share:
         raise _not_found()
     expires_at = share.get("expires_at")
@@ -63,27 +154,111 @@ async def _require_admin_or_share_access(image_id: str, request: Request, settin
 
 @router.get("/media/thumb/{image_id}")
 async def get_thumb(image_id: str, request: Request, settings: Settings = Depends(get_settings)) -> FileResponse:
+    expires = _signed_expiry("thumb", image_id, request, settings)
+    if expires is not None:
+        return _signed_variant_response("thumb", image_id, request, settings, expires)
     img = await _require_admin_or_share_access(image_id, request, settings)
-    path = img["thumb_path"]
-    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    return _variant_response(img["thumb_path"], img, request)
 
 
 @router.get("/media/preview/{image_id}")
 async def get_preview(image_id: str, request: Request, settings: Settings = Depends(get_settings)) -> FileResponse:
+    expires = _signed_expiry("preview", image_id, request, settings)
+    if expires is not None:
+        return _signed_variant_response("preview", image_id, request, settings, expires)
     img = await _require_admin_or_share_access(image_id, request, settings)
     # Fallback to thumb if preview doesn't exist (e.g. old images)
     path = img.get("preview_path") or img["thumb_path"]
-    return FileResponse(path, media_type="image/jpeg", headers={"Cache-Control": "public, max-age=31536000, immutable"})
+    return _variant_response(path, img, request)
+
+
+@router.get("/media/resize/{image_id}")
+async def get_resized(
+    image_id: str,
+    request: Request,
+    w: int = Query(ge=1, le=10000),
+    settings: Settings = Depends(get_settings),
+) -> FileResponse:
+    img = await _require_admin_or_share_access(image_id, request, settings)
+    width = snap_resize_width(settings, w)
+    fmt = _negotiate_format(request, enabled_variant_formats(settings))
+    try:
+        path = await resized_variant(img, width, settings, fmt)
+    except OSError as e:
+        raise _not_found() from e
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=_VARIANT_HEADERS)
+
+
+@router.get("/media/sprite/{share_id}/{fingerprint}")
+async def get_sprite(
+    share_id: str,
+    fingerprint: str,
+    request: Request,
+    n: int = Query(ge=1, le=MAX_SPRITE_TILES),
+    t: int = Query(ge=32, le=256),
+    e: int = 0,
+    s: str = "",
+    c: str | None = None,
+    o: str = "",
+    settings: Settings = Depends(get_settings),
+) -> FileResponse:
+    # only reachable through URLs minted by the share's sprite endpoint
+    if not verify_sprite_signature(settings, share_id, fingerprint, c, n, t, e, s, o):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired link")
+    fmt = _negotiate_format(request, enabled_variant_formats(settings))
+    path = await share_sprite_sheet(share_id, fingerprint, c, n, t, fmt, settings, ListingOrder.from_token(o))
+    return FileResponse(path, media_type=MEDIA_TYPES[fmt], headers=_signed_headers(e))
+
+
+async def _tiles_access(image_id: str, request: Request, settings: Settings) -> tuple[dict[str, Any], dict[str, str]]:
+    if not settings.deep_zoom:
+        raise _not_found()
+    # tile requests carry the descriptor URL's signature, so both verify as variant "tiles"
+    expires = _signed_expiry("tiles", image_id, request, settings)
+    if expires is None:
+        img = await _require_admin_or_share_access(image_id, request, settings)
+        return img, {"Cache-Control": "public, max-age=31536000, immutable"}
+    img = await get_image(image_id)
+    if not img:
+        raise _not_found()
+    return img, _signed_headers(expires, vary=False)
+
+
+@router.get("/media/tiles/{image_id}.dzi")
+async def get_tiles_descriptor(image_id: str, request: Request, settings: Settings = Depends(get_settings)) -> Response:
+    img, headers = await _tiles_access(image_id, request, settings)
+    return Response(dzi_descriptor(img), media_type="application/xml", headers=headers)
+
+
+@router.get("/media/tiles/{image_id}/{level}/{x}_{y}.jpg")
+async def get_tile(
+    image_id: str, level: int, x: int, y: int, request: Request, settings: Settings = Depends(get_settings)
+) -> Response:
+    img, headers = await _tiles_access(image_id, request, settings)
+    try:
+        content = await tile_bytes(img, level, x, y, settings)
+    except OSError as e:
+        raise _not_found() from e
+    return Response(content, media_type="image/jpeg", headers=headers)
 
 
 @router.get("/media/original/{image_id}")
 async def get_original(image_id: str, request: Request, settings: Settings = Depends(get_settings)) -> FileResponse:
-    img = await _require_admin_or_share_access(image_id, request, settings)
+    expires = _signed_expiry("original", image_id, request, settings)
+    if expires is not None:
+        # the stored extension and download name still come from the (cached) image document
+        img = await get_image(image_id)
+        if not img:
+            raise _not_found()
+        headers = _signed_headers(expires, vary=False)
+    else:
+        img = await _require_admin_or_share_access(image_id, request, settings)
+        headers = {"Cache-Control": "public, max-age=31536000, immutable"}
     path = img["original_path"]
     mime, _ = mimetypes.guess_type(path)
     return FileResponse(
         path,
         media_type=mime or "application/octet-stream",
         filename=img.get("filename") or f"{image_id}",
-        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+        headers=headers,
     )
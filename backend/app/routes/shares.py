@@ -3,12 +3,40 @@ from __future__ import annotations
 from datetime import datetime, timedelta, timezone
 from typing import Any
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response, status
+from fastapi.responses import StreamingResponse
 
 from backend.app.core.config import Settings, get_settings
 from backend.app.db import get_db
-from backend.app.models import ImageOut, ShareAuthIn, ShareAuthOut, ShareScopeOut
-from backend.app.utils.security import create_share_jwt, get_share_session, verify_password
+from backend.app.models import (
+    ImagePageOut,
+    ShareAuthIn,
+    ShareAuthOut,
+    ShareScopeOut,
+    SpriteSheetOut,
+    SpriteTileOut,
+)
+from backend.app.services.archives import collect_archive_entries, stream_zip, zip_download_headers
+from backend.app.services.galleries import (
+    ListingOrder,
+    encode_image_page,
+    etag_matches,
+    get_manifest_cache,
+    image_page,
+    listing_order,
+    manifest_etag,
+    scope_version,
+    share_image_query,
+)
+from backend.app.services.lookups import get_share, verify_share_token
+from backend.app.services.sprites import MAX_SPRITE_TILES, share_sprite_page
+from backend.app.utils.security import (
+    create_share_jwt,
+    get_share_auth_limiter,
+    get_share_session,
+    verify_password_async,
+)
+from backend.app.utils.signing import media_url_expiry, signed_sprite_url
 
 
 router = APIRouter(prefix="/api/shares", tags=["shares"])
@@ -29,26 +57,18 @@ def _ensure_not_expired(doc: dict[str, Any]) -> None:
         raise _share_not_found()
 
 
-def _image_doc_to_out(doc: dict[str, Any]) -> ImageOut:
-    image_id = doc["id"]
-    return ImageOut(
-        id=image_id,
-        album_id=doc["album_id"],
-        subfolder_id=doc["subfolder_id"],
-        filename=doc["filename"],
-        width=doc["width"],
-        height=doc["height"],
-        created_at=doc["created_at"],
-        thumb_url=f"/media/thumb/{image_id}",
-        preview_url=f"/media/preview/{image_id}",
-        image_url=f"/media/original/{image_id}",
-    )
+def _share_url_expiry(share: dict[str, Any], settings: Settings) -> int:
+    # signed URLs must not outlive the share itself
+    share_exp = share.get("expires_at")
+    cap = None
+    if isinstance(share_exp, datetime):
+        cap = int((share_exp if share_exp.tzinfo else share_exp.replace(tzinfo=timezone.utc)).timestamp())
+    return media_url_expiry(settings, cap=cap)
 
 
 @router.get("/{share_id}/meta", response_model=ShareScopeOut)
 async def get_share_meta(share_id: str) -> ShareScopeOut:
-    db = get_db()
-    share = await db.shares.find_one({"id": share_id}, {"_id": 0, "password_hash": 0})
+    share = await get_share(share_id)
     if not share:
         raise _share_not_found()
     _ensure_not_expired(share)
@@ -74,8 +94,17 @@ async def auth_share(share_id: str, payload: ShareAuthIn, settings: Settings = D
     if not share:
         raise _share_not_found()
     _ensure_not_expired(share)
-    if not verify_password(payload.password, share["password_hash"]):
+    limiter = get_share_auth_limiter()
+    # reserved before hashing: a brute-force run must not turn into bcrypt CPU load
+    limiter.acquire(share_id)
+    try:
+        valid = await verify_password_async(payload.password, share["password_hash"])
+    finally:
+        limiter.release(share_id)
+    if not valid:
+        limiter.record_failure(share_id)
         raise _share_not_found()
+    limiter.reset(share_id)
 
     now = _now()
     session_exp = now + timedelta(hours=12)
@@ -88,20 +117,91 @@ async def auth_share(share_id: str, payload: ShareAuthIn, settings: Settings = D
     return ShareAuthOut(token=token, token_expires_at=token_expires_at)
 
 
-@router.get("/{share_id}/images", response_model=list[ImageOut])
+@router.get("/{share_id}/images", response_model=ImagePageOut)
 async def list_share_images(
     share_id: str,
+    request: Request,
+    cursor: str | None = None,
+    limit: int = Query(default=200, ge=1, le=1000),
+    order: ListingOrder = Depends(listing_order),
     session=Depends(get_share_session),
-) -> list[ImageOut]:
+    settings: Settings = Depends(get_settings),
+) -> Response:
     if session.share_id != share_id:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
-    db = get_db()
-    share = await db.shares.find_one({"id": share_id}, {"_id": 0, "password_hash": 0})
+    share = await get_share(share_id)
     if not share:
         raise _share_not_found()
     _ensure_not_expired(share)
-    q: dict[str, Any] = {"album_id": share["album_id"]}
-    if share.get("subfolder_id"):
-        q["subfolder_id"] = share["subfolder_id"]
-    cur = db.images.find(q, {"_id": 0}).sort("created_at", -1)
-    return [_image_doc_to_out(d) async for d in cur]
+    # A page is fully determined by the scope's version and the signed URL window, so revalidation
+    # and cache hits never touch the images collection.
+    version = await scope_version(share["album_id"], share.get("subfolder_id"))
+    expires = _share_url_expiry(share, settings)
+    etag = manifest_etag(share_id, version, cursor, limit, order.token(), expires)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    manifests = get_manifest_cache()
+    body = manifests.get(etag)
+    if body is None:
+        docs, next_cursor = await image_page(share_image_query(share), cursor, limit, order=order)
+        body = encode_image_page(docs, next_cursor, settings, expires)
+        manifests.set(etag, body)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/{share_id}/sprites", response_model=SpriteSheetOut)
+async def get_share_sprite(
+    share_id: str,
+    cursor: str | None = None,
+    limit: int = Query(default=200, ge=1, le=MAX_SPRITE_TILES),
+    tile: int = Query(default=128, ge=32, le=256),
+    order: ListingOrder = Depends(listing_order),
+    session=Depends(get_share_session),
+    settings: Settings = Depends(get_settings),
+) -> SpriteSheetOut:
+    """Thumbnails of the same page as /images (same cursor, limit and order) in a single sprite sheet."""
+    if session.share_id != share_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    share = await get_share(share_id)
+    if not share:
+        raise _share_not_found()
+    _ensure_not_expired(share)
+    fingerprint, layout, next_cursor = await share_sprite_page(share, cursor, limit, tile, order)
+    expires = _share_url_expiry(share, settings)
+    return SpriteSheetOut(
+        url=signed_sprite_url(settings, share_id, fingerprint, cursor, limit, tile, expires, order.token()),
+        width=layout.width,
+        height=layout.height,
+        tile_size=tile,
+        tiles=[SpriteTileOut(id=t.image_id, x=t.x, y=t.y, width=t.width, height=t.height) for t in layout.tiles],
+        next_cursor=next_cursor,
+    )
+
+
+@router.get("/{share_id}/download.zip")
+async def download_share_zip(
+    share_id: str,
+    request: Request,
+    t: str | None = None,
+    settings: Settings = Depends(get_settings),
+) -> StreamingResponse:
+    # plain links can't send headers, so the session token may also come as ?t=
+    token = t
+    if not token:
+        auth = request.headers.get("Authorization") or ""
+        if auth.startswith("Bearer "):
+            token = auth.split(" ", 1)[1].strip()
+    if not token:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Bearer token required")
+    session = verify_share_token(token, settings)
+    if session.share_id != share_id:
+        raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token")
+    share = await get_share(share_id)
+    if not share:
+        raise _share_not_found()
+    _ensure_not_expired(share)
+    # only what the gallery shows: nothing still rendering or undecodable
+    entries = await collect_archive_entries(share_image_query(share), by_subfolder=not share.get("subfolder_id"))
+    return StreamingResponse(stream_zip(entries), media_type="application/zip", headers=zip_download_headers("photos"))
@@ -0,0 +1,298 @@
+from __future__ import annotations
+
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException, status
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import get_db
+from backend.app.services.galleries import bump_versions
+from backend.app.services.images import (
+    StoredImage,
+    get_resize_cache,
+    probe_image,
+    remove_image_files,
+    render_variants,
+    resize_cache_prefix,
+    storage_key,
+)
+from backend.app.services.jobs import JobFailed, enqueue_job, has_active_job, register_job_handler
+from backend.app.services.lookups import invalidate_image
+from backend.app.services.storage import original_path, preview_path, thumb_path
+from backend.app.services.tiles import get_tile_cache
+from backend.app.utils.files import ensure_parent
+
+
+# Originals are stored once per SHA-256 in db.blobs, together with their rendered variants and a
+# reference count of the image documents using them. Blob states: pending (variants queued for
+# rendering), ready, failed (rendering gave up), deleting (last reference gone, files being removed).
+# Image documents mirror their blob as status processing/ready/failed.
+
+RENDER_JOB = "variants"
+POLL_INTERVAL = 0.2
+# how long an upload waits for a previous copy of the same content to finish being deleted
+WAIT_TIMEOUT = 60.0
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def _wait_deleted(sha256: str, deadline: float) -> None:
+    db = get_db()
+    loop = asyncio.get_running_loop()
+    while await db.blobs.find_one({"sha256": sha256, "state": "deleting"}, {"_id": 1}):
+        if loop.time() > deadline:
+            raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail="Please retry the upload")
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def acquire_blob(staged: Path, sha256: str, size: tuple[int, int], settings: Settings) -> dict[str, Any]:
+    """Take a reference on the blob for ``sha256``, storing ``staged`` and queueing its variants if new.
+
+    ``staged`` is consumed: moved into place for new content, deleted for duplicates.
+    """
+    db = get_db()
+    deadline = asyncio.get_running_loop().time() + WAIT_TIMEOUT
+    dest = original_path(settings, sha256, staged.suffix)
+    fields = {
+        "state": "pending",
+        "original_ext": dest.suffix,
+        "original_path": str(dest),
+        "thumb_path": str(thumb_path(settings, sha256)),
+        "preview_path": str(preview_path(settings, sha256)),
+        "formats": [],
+        "width": size[0],
+        "height": size[1],
+        "created_at": _now(),
+    }
+    while True:
+        try:
+            prev = await db.blobs.find_one_and_update(
+                {"sha256": sha256},
+                {"$inc": {"refcount": 1}, "$setOnInsert": fields},
+                projection={"_id": 0},
+                upsert=True,
+                return_document=ReturnDocument.BEFORE,
+            )
+        except DuplicateKeyError:
+            # lost a concurrent upsert; the winner's document is visible now
+            continue
+        if prev is None:
+            try:
+                ensure_parent(dest)
+                os.replace(staged, dest)
+                await enqueue_job(RENDER_JOB, {"sha256": sha256}, key=sha256)
+            except BaseException:
+                dest.unlink(missing_ok=True)
+                await db.blobs.delete_one({"sha256": sha256})
+                raise
+            return {"sha256": sha256, "refcount": 1, **fields}
+        if prev["state"] == "deleting":
+            # our increment goes away with that document, start over once it's gone
+            await _wait_deleted(sha256, deadline)
+            continue
+        staged.unlink(missing_ok=True)
+        if prev["state"] == "failed":
+            # someone uploads it again: give rendering another go
+            retried = await db.blobs.update_one(
+                {"sha256": sha256, "state": "failed"}, {"$set": {"state": "pending"}, "$unset": {"error": ""}}
+            )
+            if retried.modified_count:
+                await enqueue_job(RENDER_JOB, {"sha256": sha256}, key=sha256)
+            prev["state"] = "pending"
+        return prev
+
+
+async def release_blob(sha256: str, settings: Settings) -> None:
+    """Drop one reference; the last one removes the files."""
+    db = get_db()
+    blob = await db.blobs.find_one_and_update(
+        {"sha256": sha256, "refcount": {"$gt": 0}},
+        {"$inc": {"refcount": -1}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is None or blob["refcount"] > 0 or blob["state"] == "deleting":
+        return
+    # Claim the deletion; a concurrent acquire bumping refcount first makes this a no-op.
+    claimed = await db.blobs.update_one(
+        {"sha256": sha256, "refcount": 0, "state": blob["state"]}, {"$set": {"state": "deleting"}}
+    )
+    if not claimed.modified_count:
+        return
+    await run_in_threadpool(remove_image_files, blob)
+    get_resize_cache(settings).discard(resize_cache_prefix(sha256))
+    get_tile_cache(settings).discard(resize_cache_prefix(sha256))
+    await db.blobs.delete_one({"sha256": sha256, "state": "deleting"})
+
+
+async def _settle_images(blob: dict[str, Any]) -> None:
+    """Bring the image documents of ``blob`` in line with its state."""
+    db = get_db()
+    query: dict[str, Any] = {"storage_key": blob["sha256"], "status": {"$in": ["processing", "failed"]}}
+    if blob["state"] == "ready":
+        result = await db.images.update_many(
+            query,
+            {
+                "$set": {
+                    "status": "ready",
+                    "thumb_path": blob["thumb_path"],
+                    "preview_path": blob["preview_path"],
+                    "formats": blob["formats"],
+                    "width": blob["width"],
+                    "height": blob["height"],
+                    "blurhash": blob.get("blurhash"),
+                    "dominant_color": blob.get("dominant_color"),
+                    "camera": blob.get("camera"),
+                    "orientation": blob.get("orientation"),
+                    # without one the images keep their upload time
+                    **({"taken_at": blob["taken_at"]} if blob.get("taken_at") else {}),
+                },
+                "$unset": {"error": ""},
+            },
+        )
+    elif blob["state"] == "failed":
+        query["status"] = "processing"
+        result = await db.images.update_many(query, {"$set": {"status": "failed", "error": blob.get("error")}})
+    else:
+        return
+    if result.modified_count:
+        changed = await db.images.find(
+            {"storage_key": blob["sha256"], "status": "ready" if blob["state"] == "ready" else "failed"},
+            {"_id": 0, "id": 1, "album_id": 1, "subfolder_id": 1},
+        ).to_list(None)
+        # media routes must not keep serving the processing state (and its missing variant paths)
+        for d in changed:
+            invalidate_image(d["id"])
+        # images that just became ready show up in share listings
+        await bump_versions([(d["album_id"], d["subfolder_id"]) for d in changed])
+
+
+async def settle_new_images(docs: list[dict[str, Any]]) -> None:
+    """Catch up image documents inserted after their blob finished rendering."""
+    keys = {d["storage_key"] for d in docs if d.get("status") == "processing"}
+    if not keys:
+        return
+    async for blob in get_db().blobs.find({"sha256": {"$in": list(keys)}, "state": {"$in": ["ready", "failed"]}}, {"_id": 0}):
+        await _settle_images(blob)
+
+
+async def _render_blob(job: dict[str, Any]) -> None:
+    db = get_db()
+    settings = get_settings()
+    sha256 = job["payload"]["sha256"]
+    blob = await db.blobs.find_one({"sha256": sha256, "state": "pending"}, {"_id": 0})
+    if blob is None:
+        # rendered by an earlier attempt, or deleted meanwhile
+        return
+    try:
+        rendered = await render_variants(Path(blob["original_path"]), sha256, settings)
+    except HTTPException as e:
+        raise JobFailed(str(e.detail)) from e
+    ready = await db.blobs.find_one_and_update(
+        {"sha256": sha256, "state": "pending"},
+        {
+            "$set": {
+                "state": "ready",
+                "thumb_path": rendered.paths["thumb"],
+                "preview_path": rendered.paths["preview"],
+                "formats": list(rendered.formats),
+                "width": rendered.width,
+                "height": rendered.height,
+                "blurhash": rendered.blurhash,
+                "dominant_color": rendered.dominant_color,
+                "taken_at": rendered.taken_at,
+                "camera": rendered.camera,
+                "orientation": rendered.orientation,
+            }
+        },
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if ready is None:
+        # every image went away while rendering; the deletion didn't know about the new files
+        await run_in_threadpool(remove_image_files, {**blob, "formats": list(rendered.formats)})
+        return
+    await _settle_images(ready)
+
+
+async def _render_failed(job: dict[str, Any], detail: str) -> None:
+    blob = await get_db().blobs.find_one_and_update(
+        {"sha256": job["payload"]["sha256"], "state": "pending"},
+        {"$set": {"state": "failed", "error": detail}},
+        projection={"_id": 0},
+        return_document=ReturnDocument.AFTER,
+    )
+    if blob is not None:
+        await _settle_images(blob)
+
+
+register_job_handler(RENDER_JOB, _render_blob, on_failure=_render_failed)
+
+
+async def requeue_pending_blobs() -> int:
+    """Queue rendering for pending blobs whose job was lost (crash between storing and queueing)."""
+    db = get_db()
+    requeued = 0
+    async for blob in db.blobs.find({"state": "pending"}, {"_id": 0, "sha256": 1}):
+        if not await has_active_job(RENDER_JOB, blob["sha256"]):
+            await enqueue_job(RENDER_JOB, {"sha256": blob["sha256"]}, key=blob["sha256"])
+            requeued += 1
+    return requeued
+
+
+async def store_original(
+    *,
+    staged: Path,
+    sha256: str,
+    image_id: str,
+    album_id: str,
+    subfolder_id: str,
+    filename: str,
+    settings: Settings,
+) -> StoredImage:
+    """Keep an uploaded original; its variants are rendered in the background unless already known."""
+    size = await probe_image(staged)
+    blob = await acquire_blob(staged, sha256, size, settings)
+    return StoredImage(
+        image_id=image_id,
+        album_id=album_id,
+        subfolder_id=subfolder_id,
+        filename=filename,
+        original_ext=blob["original_ext"],
+        original_path=blob["original_path"],
+        thumb_path=blob["thumb_path"],
+        preview_path=blob["preview_path"],
+        formats=tuple(blob["formats"]),
+        width=blob["width"],
+        height=blob["height"],
+        created_at=_now(),
+        sha256=sha256,
+        storage_key=sha256,
+        status="ready" if blob["state"] == "ready" else "processing",
+        blurhash=blob.get("blurhash"),
+        dominant_color=blob.get("dominant_color"),
+        taken_at=blob.get("taken_at"),
+        camera=blob.get("camera"),
+        orientation=blob.get("orientation"),
+    )
+
+
+async def release_image_content(img: dict[str, Any], settings: Settings) -> None:
+    """Give up the files behind an image document that is being deleted."""
+    key = storage_key(img)
+    if img.get("sha256") and key == img["sha256"]:
+        await release_blob(key, settings)
+        return
+    # stored before deduplication: the files belong to this image alone
+    await run_in_threadpool(remove_image_files, img)
+    get_resize_cache(settings).discard(resize_cache_prefix(key))
+    get_tile_cache(settings).discard(resize_cache_prefix(key))
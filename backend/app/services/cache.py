@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Generic, Hashable, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.utils.files import ensure_parent
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class TTLCache(Generic[K, V]):
+    """Size-bounded in-memory LRU whose entries also expire after ``ttl`` seconds.
+
+    Only touched from the event loop, so no locking. Values are shared: callers must not mutate them.
+    """
+
+    def __init__(self, maxsize: int, ttl: float) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[K, tuple[float, V]] = OrderedDict()
+
+    def get(self, key: K) -> V | None:
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: K, value: V, ttl: float | None = None) -> None:
+        lifetime = self.ttl if ttl is None else min(ttl, self.ttl)
+        if lifetime <= 0 or self.maxsize <= 0:
+            return
+        self._data[key] = (time.monotonic() + lifetime, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: K) -> None:
+        self._data.pop(key, None)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+
+def _scan(root: Path) -> list[tuple[float, str, int]]:
+    entries: list[tuple[float, str, int]] = []
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            full = os.path.join(dirpath, name)
+            try:
+                st = os.stat(full)
+            except FileNotFoundError:
+                continue
+            if ".tmp-" in name:
+                os.unlink(full)
+                continue
+            entries.append((st.st_mtime, os.path.relpath(full, root), st.st_size))
+    entries.sort()
+    return entries
+
+
+class DiskLRUCache:
+    """Size-bounded on-disk cache of derived files with LRU eviction.
+
+    The recency index lives in memory and is rebuilt from mtimes on first use, so the
+    bound is enforced per process. Concurrent misses for the same key share one build.
+    """
+
+    def __init__(self, root: Path, max_bytes: int) -> None:
+        self.root = root
+        self.max_bytes = max_bytes
+        self._index: OrderedDict[str, int] = OrderedDict()
+        self._total = 0
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+        self._inflight: dict[str, asyncio.Task[Path]] = {}
+
+    def path_for(self, key: str) -> Path:
+        return self.root / key
+
+    async def _ensure_loaded(self) -> None:
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if self._loaded:
+                return
+            for _, key, size in await run_in_threadpool(_scan, self.root):
+                self._index[key] = size
+                self._total += size
+            self._loaded = True
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total -= size
+            self.path_for(key).unlink(missing_ok=True)
+
+    def _register(self, key: str, size: int) -> None:
+        previous = self._index.pop(key, None)
+        if previous is not None:
+            self._total -= previous
+        self._index[key] = size
+        self._total += size
+        self._evict()
+
+    def discard(self, prefix: str) -> None:
+        """Drop every entry whose key starts with ``prefix`` (e.g. one image's variants)."""
+        for key in [k for k in self._index if k.startswith(prefix)]:
+            self._total -= self._index.pop(key)
+            self.path_for(key).unlink(missing_ok=True)
+
+    async def get_or_create(self, key: str, build: Callable[[Path], Awaitable[None]]) -> Path:
+        """Return the cached file for ``key``, calling ``build(tmp_path)`` on a miss."""
+        await self._ensure_loaded()
+        path = self.path_for(key)
+        if key in self._index:
+            if path.is_file():
+                self._index.move_to_end(key)
+                return path
+            self._total -= self._index.pop(key)
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._build(key, build))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._build_done(key, t))
+        # shielded: a disconnecting client must not abort a build other requests wait on
+        return await asyncio.shield(task)
+
+    def _build_done(self, key: str, task: asyncio.Task[Path]) -> None:
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()
+
+    async def _build(self, key: str, build: Callable[[Path], Awaitable[None]]) -> Path:
+        path = self.path_for(key)
+        tmp = path.with_name(f"{path.name}.tmp-{uuid.uuid4().hex}")
+        try:
+            ensure_parent(path)
+            await build(tmp)
+            os.replace(tmp, path)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        self._register(key, path.stat().st_size)
+        return path
@@ -0,0 +1,193 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Callable, TypeVar
+
+from backend.app.core.config import get_settings
+from backend.app.utils.metrics import register_gauge
+
+
+T = TypeVar("T")
+
+
+def _mp_context() -> multiprocessing.context.BaseContext:
+    # Never fork the serving process: it owns an event loop and Motor's background threads.
+    # forkserver is cheap on Linux; spawn everywhere else.
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("forkserver")
+    return multiprocessing.get_context("spawn")
+
+
+class MemoryBudget:
+    """First-come first-served admission of tasks by their estimated memory use, in bytes.
+
+    A task estimated above the whole budget is admitted once nothing else holds any of it, so it runs alone.
+    """
+
+    def __init__(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self.used = 0
+        self._waiters: collections.deque[tuple[int, asyncio.Future[None]]] = collections.deque()
+
+    @property
+    def waiting(self) -> int:
+        return sum(1 for _, fut in self._waiters if not fut.done())
+
+    async def acquire(self, cost: int) -> int:
+        """Wait for ``cost`` bytes; returns the amount to hand back to ``release``."""
+        cost = min(max(0, cost), self.limit)
+        if not self._waiters and self.used + cost <= self.limit:
+            self.used += cost
+            return cost
+        fut: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self._waiters.append((cost, fut))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.done() and not fut.cancelled():
+                # granted just as we were cancelled
+                self.release(cost)
+            else:
+                self._grant()
+            raise
+        return cost
+
+    def release(self, cost: int) -> None:
+        self.used -= cost
+        self._grant()
+
+    def _grant(self) -> None:
+        while self._waiters:
+            cost, fut = self._waiters[0]
+            if fut.done():
+                # cancelled while waiting
+                self._waiters.popleft()
+                continue
+            if self.used + cost > self.limit:
+                # strictly in order: a large task isn't starved by smaller ones behind it
+                return
+            self._waiters.popleft()
+            self.used += cost
+            fut.set_result(None)
+
+
+class VariantEngine:
+    """Dedicated process pool for CPU-bound image work (decode, resize, encode).
+
+    Kept apart from Starlette's threadpool so Pillow work neither competes with sync
+    dependencies for threads nor holds the serving process' GIL. Tasks that decode images are
+    also admitted against a memory budget, so a few huge originals can't exhaust memory together.
+    """
+
+    def __init__(self, workers: int, max_tasks_per_child: int | None = None, memory_budget: int = 1024 * 1024 * 1024) -> None:
+        self.workers = max(1, workers)
+        self.max_tasks_per_child = max_tasks_per_child or None
+        self.budget = MemoryBudget(memory_budget)
+        # submitted and not finished yet, queued or running
+        self.pending = 0
+        self._lock = threading.Lock()
+        self._executor = self._new_executor()
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=_mp_context(),
+            max_tasks_per_child=self.max_tasks_per_child,
+        )
+
+    def _reset(self, broken: ProcessPoolExecutor) -> None:
+        # A worker killed mid-task (e.g. OOM) breaks the whole pool; replace it once.
+        with self._lock:
+            if self._executor is broken:
+                broken.shutdown(wait=False, cancel_futures=True)
+                self._executor = self._new_executor()
+
+    async def run(self, fn: Callable[..., T], *args: Any, memory: int = 0) -> T:
+        """Run ``fn(*args)`` in a worker once ``memory`` (estimated peak bytes) fits the budget.
+
+        The memory stays held until the worker is done with the task, even if the caller is
+        cancelled first: a task that already started can't be stopped.
+        """
+        loop = asyncio.get_running_loop()
+        granted = await self.budget.acquire(memory) if memory else 0
+        executor = self._executor
+        self.pending += 1
+
+        def finished() -> None:
+            self.pending -= 1
+            if granted:
+                self.budget.release(granted)
+
+        def on_done(_: Future[T]) -> None:
+            # called from the executor's thread
+            with contextlib.suppress(RuntimeError):  # loop already closed at shutdown
+                loop.call_soon_threadsafe(finished)
+
+        try:
+            future = executor.submit(fn, *args)
+        except BaseException as e:
+            finished()
+            if isinstance(e, BrokenProcessPool):
+                self._reset(executor)
+            raise
+        future.add_done_callback(on_done)
+        try:
+            # cancelling this cancels a task still queued; a running one completes regardless
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            self._reset(executor)
+            raise
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=True, cancel_futures=True)
+
+
+_engine: VariantEngine | None = None
+
+
+def start_engine(workers: int | None = None) -> None:
+    global _engine
+    if _engine is not None:
+        return
+    settings = get_settings()
+    workers = workers or settings.image_workers or os.cpu_count() or 1
+    _engine = VariantEngine(
+        workers=workers,
+        max_tasks_per_child=settings.image_worker_max_tasks,
+        memory_budget=settings.image_memory_budget_mb * 1024 * 1024,
+    )
+
+
+def stop_engine() -> None:
+    global _engine
+    if _engine is not None:
+        _engine.shutdown()
+    _engine = None
+
+
+def get_engine() -> VariantEngine:
+    if _engine is None:
+        raise RuntimeError("Variant engine not started")
+    return _engine
+
+
+register_gauge("proofflow_engine_workers", "Image worker processes.", lambda: [((), get_engine().workers)])
+register_gauge("proofflow_engine_tasks", "Image tasks queued for or running on the worker processes.", lambda: [((), get_engine().pending)])
+register_gauge(
+    "proofflow_engine_memory_budget_bytes",
+    "Decode memory budget of the image workers: estimated bytes in use, and the limit.",
+    lambda: [(("used",), get_engine().budget.used), (("limit",), get_engine().budget.limit)],
+    ("state",),
+)
+register_gauge(
+    "proofflow_engine_tasks_waiting_for_memory",
+    "Image tasks held back until the decode memory budget has room.",
+    lambda: [((), get_engine().budget.waiting)],
+)
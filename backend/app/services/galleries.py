@@ -0,0 +1,204 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import Iterable
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Literal
+
+import orjson
+from fastapi import HTTPException, status
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import get_db
+from backend.app.services.cache import TTLCache
+from backend.app.services.images import storage_key
+from backend.app.services.tiles import deep_zoom_worthwhile
+from backend.app.utils.cursors import after_cursor, encode_cursor, keyset_sort
+from backend.app.utils.signing import signed_media_url, signed_tiles_url
+
+
+# Everything an ImageOut needs; listings fetch only this
+LISTING_PROJECTION: dict[str, int] = {
+    "_id": 0,
+    "id": 1,
+    "album_id": 1,
+    "subfolder_id": 1,
+    "filename": 1,
+    "width": 1,
+    "height": 1,
+    "created_at": 1,
+    "taken_at": 1,
+    "camera": 1,
+    "storage_key": 1,
+    "status": 1,
+    "error": 1,
+    "blurhash": 1,
+    "dominant_color": 1,
+}
+
+
+@dataclass(frozen=True)
+class ListingOrder:
+    """Sort order of an image listing, optionally narrowed to a capture time range [taken_from, taken_to)."""
+
+    field: str = "created_at"
+    direction: int = -1
+    taken_from: datetime | None = None
+    taken_to: datetime | None = None
+
+    def filter(self) -> dict[str, Any]:
+        bounds: dict[str, datetime] = {}
+        if self.taken_from:
+            bounds["$gte"] = self.taken_from
+        if self.taken_to:
+            bounds["$lt"] = self.taken_to
+        return {"taken_at": bounds} if bounds else {}
+
+    def token(self) -> str:
+        """Compact form carried by sprite URLs and ETags; empty for the default order."""
+        if self == DEFAULT_ORDER:
+            return ""
+        bounds = [d.isoformat() if d else "" for d in (self.taken_from, self.taken_to)]
+        return ",".join([self.field, "asc" if self.direction > 0 else "desc", *bounds])
+
+    @classmethod
+    def from_token(cls, token: str | None) -> ListingOrder:
+        if not token:
+            return DEFAULT_ORDER
+        try:
+            field, order, taken_from, taken_to = token.split(",")
+            return listing_order(
+                field,  # type: ignore[arg-type]
+                order,  # type: ignore[arg-type]
+                datetime.fromisoformat(taken_from) if taken_from else None,
+                datetime.fromisoformat(taken_to) if taken_to else None,
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid listing order") from e
+
+
+DEFAULT_ORDER = ListingOrder()
+
+
+def _utc(value: datetime | None) -> datetime | None:
+    if value is None or value.tzinfo is not None:
+        return value
+    return value.replace(tzinfo=timezone.utc)
+
+
+def listing_order(
+    sort: Literal["created_at", "taken_at"] = "created_at",
+    order: Literal["asc", "desc"] = "desc",
+    taken_from: datetime | None = None,
+    taken_to: datetime | None = None,
+) -> ListingOrder:
+    """Listing query parameters (a dependency): upload or capture time order, capture time range."""
+    if sort not in ("created_at", "taken_at") or order not in ("asc", "desc"):
+        raise ValueError("unknown sort")
+    if (taken_from or taken_to) and sort != "taken_at":
+        # only then is the range served by the same index as the sort
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="taken_from/taken_to require sort=taken_at")
+    return ListingOrder(sort, 1 if order == "asc" else -1, _utc(taken_from), _utc(taken_to))
+
+
+# Serialized share listing pages keyed by their ETag, which covers the scope's version counter
+_manifests: TTLCache[str, bytes] | None = None
+
+
+def share_image_query(share: dict[str, Any]) -> dict[str, Any]:
+    """Images a share exposes: its album or subfolder, only once their variants are rendered."""
+    q: dict[str, Any] = {"album_id": share["album_id"], "status": {"$nin": ["processing", "failed"]}}
+    if share.get("subfolder_id"):
+        q["subfolder_id"] = share["subfolder_id"]
+    return q
+
+
+def image_item(doc: dict[str, Any], settings: Settings, expires: int) -> dict[str, Any]:
+    """ImageOut fields of an image document, in ImageOut order."""
+    image_id = doc["id"]
+    key = storage_key(doc)
+    return {
+        "id": image_id,
+        "album_id": doc["album_id"],
+        "subfolder_id": doc["subfolder_id"],
+        "filename": doc["filename"],
+        "width": doc["width"],
+        "height": doc["height"],
+        "created_at": doc["created_at"],
+        "taken_at": doc.get("taken_at") or doc["created_at"],
+        "camera": doc.get("camera"),
+        "thumb_url": signed_media_url(settings, "thumb", image_id, expires, key),
+        "preview_url": signed_media_url(settings, "preview", image_id, expires, key),
+        "image_url": signed_media_url(settings, "original", image_id, expires, key),
+        "tiles_url": signed_tiles_url(settings, image_id, expires, key) if deep_zoom_worthwhile(doc, settings) else None,
+        "blurhash": doc.get("blurhash"),
+        "dominant_color": doc.get("dominant_color"),
+        "status": doc.get("status", "ready"),
+        "error": doc.get("error"),
+    }
+
+
+def encode_image_page(docs: list[dict[str, Any]], next_cursor: str | None, settings: Settings, expires: int) -> bytes:
+    """ImagePageOut JSON straight from documents, skipping pydantic model construction and validation."""
+    page = {"items": [image_item(d, settings, expires) for d in docs], "next_cursor": next_cursor}
+    # OPT_UTC_Z: aware datetimes as "...Z", like pydantic
+    return orjson.dumps(page, option=orjson.OPT_UTC_Z)
+
+
+async def image_page(
+    query: dict[str, Any],
+    cursor: str | None,
+    limit: int,
+    projection: dict[str, Any] | None = None,
+    order: ListingOrder = DEFAULT_ORDER,
+) -> tuple[list[dict[str, Any]], str | None]:
+    """One keyset page of images matching ``query`` and the cursor continuing after it."""
+    q = {**query, **order.filter()}
+    if cursor:
+        q.update(after_cursor(cursor, order.field, order.direction))
+    sort = keyset_sort(order.field, order.direction)
+    cur = get_db().images.find(q, projection or LISTING_PROJECTION).sort(sort).limit(limit + 1)
+    docs = [d async for d in cur]
+    next_cursor = encode_cursor(docs[limit - 1], order.field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+async def bump_versions(scopes: Iterable[tuple[str, str]]) -> None:
+    """Record that images of these (album_id, subfolder_id) scopes changed; call after the write."""
+    pairs = set(scopes)
+    if not pairs:
+        return
+    db = get_db()
+    await db.albums.update_many({"id": {"$in": sorted({a for a, _ in pairs})}}, {"$inc": {"version": 1}})
+    await db.subfolders.update_many({"id": {"$in": sorted({s for _, s in pairs})}}, {"$inc": {"version": 1}})
+
+
+async def scope_version(album_id: str, subfolder_id: str | None) -> int:
+    """Version counter of an album, or of one subfolder (an album's covers all its subfolders)."""
+    db = get_db()
+    if subfolder_id:
+        doc = await db.subfolders.find_one({"id": subfolder_id}, {"_id": 0, "version": 1})
+    else:
+        doc = await db.albums.find_one({"id": album_id}, {"_id": 0, "version": 1})
+    return (doc or {}).get("version", 0)
+
+
+def manifest_etag(*parts: str | int | None) -> str:
+    return '"' + hashlib.sha256("\n".join(str(p) for p in parts).encode("utf-8")).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    if not if_none_match:
+        return False
+    candidates = {c.strip().removeprefix("W/") for c in if_none_match.split(",")}
+    return "*" in candidates or etag in candidates
+
+
+def get_manifest_cache() -> TTLCache[str, bytes]:
+    global _manifests
+    if _manifests is None:
+        settings = get_settings()
+        # entries embed signed URLs, which roll over every media URL TTL window anyway
+        _manifests = TTLCache(settings.manifest_cache_size, settings.media_url_ttl_seconds)
+    return _manifests
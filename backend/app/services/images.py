@@ -1,16 +1,69 @@
 from __future__ import annotations
 
+import io
+import re
+import struct
+import time
+from concurrent.futures.process import BrokenProcessPool
 from dataclasses import dataclass
-from datetime import datetime, timezone
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from typing import Any
 
-from fastapi import HTTPException, UploadFile, status
-from PIL import Image, ImageOps
+from fastapi import HTTPException, status
+from PIL import Image, ImageOps, features
 from starlette.concurrency import run_in_threadpool
 
 from backend.app.core.config import Settings
-from backend.app.services.storage import original_path, preview_path, thumb_path
-from backend.app.utils.files import ensure_parent, guess_extension
+from backend.app.services.cache import DiskLRUCache
+from backend.app.services.engine import get_engine
+from backend.app.services.storage import FORMAT_EXTENSIONS, sibling_path, variant_path
+from backend.app.utils import blurhash
+from backend.app.utils.files import ensure_parent
+from backend.app.utils.metrics import StageTimer, observe_stages
+
+
+@dataclass(frozen=True)
+class VariantSpec:
+    name: str
+    max_size: int
+    quality: int
+
+
+# Rendered largest-first; each variant is downscaled from the previous one.
+VARIANTS: tuple[VariantSpec, ...] = (
+    VariantSpec(name="preview", max_size=2560, quality=88),
+    VariantSpec(name="thumb", max_size=512, quality=86),
+)
+PREVIEW = VARIANTS[0]
+RESIZE_QUALITY = 85
+# Placeholder sampling: BlurHash from a ~32px copy, dominant color from a 64px palette
+BLURHASH_SIZE = 32
+PALETTE_SIZE = 64
+# Images whose regular decode is estimated above this share of the memory budget take the low-memory path
+OVERSIZED_SHARE = 4
+# Modes Image.reduce can't work in, and what they are converted to first
+_REDUCE_MODES = {"1": "L", "P": "RGB", "I;16": "I", "I;16L": "I", "I;16B": "I", "I;16N": "I"}
+# EXIF orientation -> the transpose turning the image upright, as in ImageOps.exif_transpose
+_ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+# EXIF: camera fields of IFD0, and (date/time, sub-second, UTC offset) tags in order of preference
+_EXIF_IFD = 0x8769
+_MAKE, _MODEL, _ORIENTATION = 0x010F, 0x0110, 0x0112
+_CAPTURE_TAGS = ((0x9003, 0x9291, 0x9011), (0x9004, 0x9292, 0x9012), (0x0132, 0x9290, 0x9010))
+_UTC_OFFSET = re.compile(r"([+-])(\d{2}):(\d{2})")
+
+MEDIA_TYPES: dict[str, str] = {"jpeg": "image/jpeg", "webp": "image/webp", "avif": "image/avif"}
+
+_resize_cache: DiskLRUCache | None = None
 
 
 @dataclass(frozen=True)
@@ -23,86 +76,477 @@ class StoredImage:
     original_path: str
     thumb_path: str
     preview_path: str
+    formats: tuple[str, ...]
     width: int
     height: int
     created_at: datetime
+    sha256: str | None = None
+    # name of the variant files; the content hash for deduplicated storage
+    storage_key: str | None = None
+    # "processing" until the variants are rendered in the background, then "ready" (or "failed")
+    status: str = "ready"
+    blurhash: str | None = None
+    dominant_color: str | None = None
+    taken_at: datetime | None = None
+    camera: str | None = None
+    orientation: int | None = None
+
+    def to_doc(self) -> dict[str, Any]:
+        return {
+            "id": self.image_id,
+            "album_id": self.album_id,
+            "subfolder_id": self.subfolder_id,
+            "filename": self.filename,
+            "original_ext": self.original_ext,
+            "original_path": self.original_path,
+            "thumb_path": self.thumb_path,
+            "preview_path": self.preview_path,
+            "formats": list(self.formats),
+            "width": self.width,
+            "height": self.height,
+            "created_at": self.created_at,
+            "sha256": self.sha256,
+            "storage_key": self.storage_key or self.image_id,
+            "status": self.status,
+            "blurhash": self.blurhash,
+            "dominant_color": self.dominant_color,
+            # listings sort and filter by capture time; images without one (or not rendered yet) by upload time
+            "taken_at": self.taken_at or self.created_at,
+            "camera": self.camera,
+            "orientation": self.orientation,
+        }
+
+
+def enabled_variant_formats(settings: Settings) -> tuple[str, ...]:
+    """Configured extra encodings this Pillow build can actually write."""
+    return tuple(
+        f for f in settings.parsed_variant_formats() if f != "jpeg" and f in FORMAT_EXTENSIONS and features.check(f)
+    )
 
 
-async def store_upload_as_image(
-    *,
-    upload: UploadFile,
-    image_id: str,
-    album_id: str,
-    subfolder_id: str,
-    settings: Settings,
-) -> StoredImage:
-    if not upload.content_type or not upload.content_type.startswith("image/"):
+def require_image_content_type(content_type: str | None) -> None:
+    if not content_type or not content_type.startswith("image/"):
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Only image uploads are supported")
 
-    ext = guess_extension(upload.filename or "")
-    orig = original_path(settings, image_id, ext)
-    thm = thumb_path(settings, image_id)
-    prv = preview_path(settings, image_id)
-    ensure_parent(orig)
-    ensure_parent(thm)
-    ensure_parent(prv)
-
-    await _write_upload_to_path(upload, orig)
-    width, height = await _generate_variants(orig, thm, prv)
-
-    return StoredImage(
-        image_id=image_id,
-        album_id=album_id,
-        subfolder_id=subfolder_id,
-        filename=upload.filename or f"{image_id}{ext or ''}",
-        original_ext=ext,
-        original_path=str(orig),
-        thumb_path=str(thm),
-        preview_path=str(prv),
+
+def _probe_worker(path: Path) -> tuple[int, int]:
+    with Image.open(path) as img:
+        return _oriented_size(img)
+
+
+async def probe_image(path: Path) -> tuple[int, int]:
+    """Upright size from the file header alone; 400 if Pillow can't identify the file."""
+    try:
+        return await run_in_threadpool(_probe_worker, path)
+    except Exception as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file") from e
+
+
+@dataclass(frozen=True)
+class DecodePlan:
+    # estimated peak bytes for decoding and downscaling the image
+    memory: int
+    # box-reduce the full-size frame right after decoding, before rotating or converting it
+    reduce_first: bool
+
+
+def _bytes_per_pixel(mode: str) -> int:
+    # as Pillow stores them: 3-band modes are padded to 4 bytes
+    if mode in ("1", "L", "P"):
+        return 1
+    return 2 if mode.startswith("I;16") else 4
+
+
+def _draft_scale(size: tuple[int, int], requested: tuple[int, int]) -> int:
+    # the 1/2, 1/4 or 1/8 scale JpegImageFile.draft settles on
+    scale = min(size[0] // requested[0], size[1] // requested[1])
+    return next(s for s in (8, 4, 2, 1) if scale >= s)
+
+
+def _plan_worker(path: Path, max_size: int, oversized: int) -> DecodePlan:
+    with Image.open(path) as img:
+        w, h = img.size
+        bpp = _bytes_per_pixel(img.mode)
+        if img.format == "JPEG":
+            # libjpeg decodes straight to the drafted size
+            s = _draft_scale(img.size, _fit_size(img.size, max_size))
+            w, h = -(-w // s), -(-h // s)
+        # the decoded frame, a rotated or RGB copy of it, and the first pass of the LANCZOS resize
+        regular = w * h * (bpp + max(bpp, 4)) + w * h * 4 * min(max_size, max(w, h)) // max(w, h)
+        factor = max(w, h) // max_size
+        if img.format == "JPEG" or regular <= oversized or factor < 2:
+            return DecodePlan(memory=regular, reduce_first=False)
+        converted = 4 if img.mode in _REDUCE_MODES else 0
+        return DecodePlan(memory=w * h * (bpp + converted) + w * h * 4 // factor**2, reduce_first=True)
+
+
+async def _decode_plan(path: Path, max_size: int) -> DecodePlan:
+    """Memory estimate and decode path for scaling ``path`` to ``max_size``, from its header."""
+    oversized = get_engine().budget.limit // OVERSIZED_SHARE
+    return await run_in_threadpool(_plan_worker, path, max_size, oversized)
+
+
+@dataclass(frozen=True)
+class RenderedVariants:
+    width: int
+    height: int
+    formats: tuple[str, ...]
+    paths: dict[str, str]
+    blurhash: str
+    dominant_color: str
+    # from EXIF: capture time (UTC), camera and orientation, each None when the file doesn't say
+    taken_at: datetime | None = None
+    camera: str | None = None
+    orientation: int | None = None
+
+
+async def render_variants(original: Path, key: str, settings: Settings) -> RenderedVariants:
+    """Render every variant of ``original`` under storage ``key``; no files are left behind on failure."""
+    targets = [(spec, variant_path(settings, spec.name, key)) for spec in VARIANTS]
+    formats = enabled_variant_formats(settings)
+    for _, dest in targets:
+        ensure_parent(dest)
+
+    try:
+        width, height, placeholder, color, metadata = await _generate_variants(original, targets, formats)
+    except BaseException:
+        for _, dest in targets:
+            dest.unlink(missing_ok=True)
+            for fmt in formats:
+                sibling_path(dest, fmt).unlink(missing_ok=True)
+        raise
+
+    return RenderedVariants(
         width=width,
         height=height,
-        created_at=datetime.now(timezone.utc),
+        formats=formats,
+        paths={spec.name: str(dest) for spec, dest in targets},
+        blurhash=placeholder,
+        dominant_color=color,
+        **metadata,
     )
 
 
-async def _write_upload_to_path(upload: UploadFile, dest: Path) -> None:
+def remove_image_files(doc: dict[str, Any]) -> None:
+    """Delete the original and every stored variant encoding of an image document."""
+    Path(doc["original_path"]).unlink(missing_ok=True)
+    for key in ("thumb_path", "preview_path"):
+        if doc.get(key):
+            jpeg = Path(doc[key])
+            jpeg.unlink(missing_ok=True)
+            for fmt in doc.get("formats") or ():
+                sibling_path(jpeg, fmt).unlink(missing_ok=True)
+
+
+def snap_resize_width(settings: Settings, requested: int) -> int:
+    widths = settings.parsed_resize_widths()
+    for w in widths:
+        if w >= requested:
+            return w
+    return widths[-1]
+
+
+def get_resize_cache(settings: Settings) -> DiskLRUCache:
+    global _resize_cache
+    if _resize_cache is None:
+        root = Path(settings.storage_path) / "cache" / "resize"
+        _resize_cache = DiskLRUCache(root, max_bytes=settings.resize_cache_max_mb * 1024 * 1024)
+    return _resize_cache
+
+
+def storage_key(img: dict[str, Any]) -> str:
+    """Name variant files of ``img`` are stored under (image id for images predating dedup)."""
+    return img.get("storage_key") or img["id"]
+
+
+def resize_cache_prefix(key: str) -> str:
+    return f"{key[:2]}/{key}/"
+
+
+async def resized_variant(img: dict[str, Any], width: int, settings: Settings, fmt: str = "jpeg") -> Path:
+    """Path of ``img`` scaled to ``width`` (a snapped width), rendering it on first request."""
+    source = Path(img["original_path"])
+    preview = img.get("preview_path")
+    if preview and img.get("status", "ready") == "ready" and _fit_size((img["width"], img["height"]), PREVIEW.max_size)[0] >= width:
+        # the preview covers this width and is far cheaper to decode than the original
+        source = Path(preview)
+
+    async def build(tmp: Path) -> None:
+        plan = await _decode_plan(source, max(width, round(img["height"] * width / img["width"])))
+        await get_engine().run(_resize_worker, source, tmp, width, RESIZE_QUALITY, fmt, plan.reduce_first, memory=plan.memory)
+
+    # keyed by content, so duplicates of one upload share their resized variants
+    key = f"{resize_cache_prefix(storage_key(img))}w{width}{FORMAT_EXTENSIONS[fmt]}"
+    return await get_resize_cache(settings).get_or_create(key, build)
+
+
+def _fit_size(size: tuple[int, int], max_size: int) -> tuple[int, int]:
+    w, h = size
+    scale = min(1.0, max_size / max(w, h))
+    return max(1, round(w * scale)), max(1, round(h * scale))
+
+
+def _exif_text(value: Any) -> str:
+    if isinstance(value, bytes):
+        value = value.decode("ascii", "ignore")
+    return value.strip("\x00 ") if isinstance(value, str) else ""
+
+
+def _exif_datetime(value: Any, subsec: Any, offset: Any) -> datetime | None:
     try:
-        with dest.open("wb") as f:
-            while True:
-                chunk = await upload.read(1024 * 1024)
-                if not chunk:
-                    break
-                f.write(chunk)
-    finally:
-        await upload.close()
+        taken = datetime.strptime(_exif_text(value), "%Y:%m:%d %H:%M:%S")
+    except ValueError:
+        return None
+    digits = "".join(c for c in _exif_text(subsec) if c.isdigit())
+    if digits:
+        taken = taken.replace(microsecond=int(digits[:6].ljust(6, "0")))
+    # without a recorded offset the camera clock is taken as UTC, which keeps the order within a shoot
+    tz = timezone.utc
+    match = _UTC_OFFSET.fullmatch(_exif_text(offset))
+    if match:
+        sign = -1 if match[1] == "-" else 1
+        tz = timezone(sign * timedelta(hours=int(match[2]), minutes=int(match[3])))
+    return taken.replace(tzinfo=tz).astimezone(timezone.utc)
+
+
+def capture_metadata(img: Image.Image) -> dict[str, Any]:
+    """Capture time, camera and orientation from the EXIF header; read before decoding (TIFF drops it after)."""
+    exif = img.getexif()
+    ifd = exif.get_ifd(_EXIF_IFD)
+    taken_at = None
+    for tag, subsec, offset in _CAPTURE_TAGS:
+        tags = exif if tag == 0x0132 else ifd
+        taken_at = _exif_datetime(tags.get(tag), ifd.get(subsec), ifd.get(offset))
+        if taken_at is not None:
+            break
+    make, model = _exif_text(exif.get(_MAKE)), _exif_text(exif.get(_MODEL))
+    camera = model if model.lower().startswith(make.lower()) else f"{make} {model}".strip()
+    orientation = exif.get(_ORIENTATION)
+    return {
+        "taken_at": taken_at,
+        "camera": camera or None,
+        "orientation": orientation if isinstance(orientation, int) else None,
+    }
+
+
+def _metadata_worker(path: Path) -> dict[str, Any]:
+    with Image.open(path) as img:
+        return capture_metadata(img)
+
+
+async def read_capture_metadata(path: Path) -> dict[str, Any]:
+    """capture_metadata of a stored file, from its header alone."""
+    return await run_in_threadpool(_metadata_worker, path)
+
+
+def _oriented_size(img: Image.Image) -> tuple[int, int]:
+    w, h = img.size
+    # EXIF orientations 5-8 rotate by 90 degrees
+    if img.getexif().get(0x0112) in (5, 6, 7, 8):
+        return h, w
+    return w, h
+
+
+def _downscale(img: Image.Image, max_size: int) -> Image.Image:
+    size = _fit_size(img.size, max_size)
+    if size == img.size:
+        return img
+    # reducing_gap: cheap integer box reduction down to ~2x the target, LANCZOS for the rest
+    return img.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def _decode_upright(img: Image.Image, max_size: int, timer: StageTimer | None = None) -> Image.Image:
+    # Let libjpeg decode at the smallest 1/2, 1/4 or 1/8 scale still covering max_size.
+    if img.format == "JPEG":
+        img.draft("RGB", _fit_size(img.size, max_size))
+    if timer is not None:
+        # decoding would otherwise happen inside exif_transpose
+        img.load()
+        timer.lap("decode")
+    ImageOps.exif_transpose(img, in_place=True)
+    upright = img if img.mode == "RGB" else img.convert("RGB")
+    if timer is not None:
+        timer.lap("exif_transpose")
+    return upright
+
+
+def _decode_reduced(img: Image.Image, max_size: int, timer: StageTimer | None = None) -> Image.Image:
+    """Low-memory alternative to _decode_upright for huge images Pillow can't draft.
+
+    Only one full-size frame exists at a time (two for modes reduce can't handle): it is box-reduced
+    by an integer factor right away, and rotation and RGB conversion happen on the small result.
+    """
+    orientation = img.getexif().get(0x0112)
+    img.load()
+    if timer is not None:
+        timer.lap("decode")
+    frame = img.convert(_REDUCE_MODES[img.mode]) if img.mode in _REDUCE_MODES else img
+    if frame is not img:
+        img.close()
+    # down to no less than max_size (not 2x like reducing_gap): LANCZOS does the rest
+    reduced = frame.reduce(max(1, max(frame.size) // max_size))
+    frame.close()
+    if timer is not None:
+        timer.lap("resize")
+    transpose = _ORIENTATION_TRANSPOSE.get(orientation)
+    if transpose is not None:
+        reduced = reduced.transpose(transpose)
+    upright = reduced if reduced.mode == "RGB" else reduced.convert("RGB")
+    if timer is not None:
+        timer.lap("exif_transpose")
+    return upright
+
+
+def _encode(img: Image.Image, dest: Path, fmt: str, quality: int) -> None:
+    if fmt == "webp":
+        img.save(dest, format="WEBP", quality=quality, method=4)
+    elif fmt == "avif":
+        # AVIF reaches JPEG-equivalent quality at a much lower setting
+        img.save(dest, format="AVIF", quality=max(1, quality - 25), speed=6)
+    else:
+        img.save(dest, format="JPEG", quality=quality, optimize=True, progressive=True)
+
+
+def _placeholder(img: Image.Image) -> tuple[str, str]:
+    """BlurHash and dominant ``#rrggbb`` color of an already downscaled RGB image."""
+    small = img.resize(_fit_size(img.size, BLURHASH_SIZE), Image.Resampling.BOX)
+    w, h = small.size
+    components = (4, 3) if w >= h else (3, 4)
+    data = small.tobytes()
+    placeholder = blurhash.encode(list(zip(data[0::3], data[1::3], data[2::3])), w, h, *components)
+
+    palette = img.resize(_fit_size(img.size, PALETTE_SIZE), Image.Resampling.BOX).quantize(colors=8)
+    _, index = max(palette.getcolors() or [(1, 0)])
+    r, g, b = palette.getpalette()[index * 3 : index * 3 + 3]
+    return placeholder, f"#{r:02x}{g:02x}{b:02x}"
+
+
+def _process_image_worker(
+    original: Path,
+    targets: list[tuple[VariantSpec, Path]],
+    formats: tuple[str, ...] = (),
+    reduce_first: bool = False,
+) -> tuple[int, int, str, str, dict[str, Any], dict[str, float]]:
+    ordered = sorted(targets, key=lambda t: t[0].max_size, reverse=True)
+    largest = ordered[0][0].max_size
+    timer = StageTimer()
+
+    with Image.open(original) as img:
+        width, height = _oriented_size(img)
+        metadata = capture_metadata(img)
+        timer.lap("open")
+        decode = _decode_reduced if reduce_first else _decode_upright
+        current = decode(img, largest, timer)
+        for spec, dest in ordered:
+            current = _downscale(current, spec.max_size)
+            timer.lap("resize")
+            _encode(current, dest, "jpeg", spec.quality)
+            timer.lap("encode_jpeg")
+            for fmt in formats:
+                _encode(current, sibling_path(dest, fmt), fmt, spec.quality)
+                timer.lap(f"encode_{fmt}")
+
+        # sampled from the smallest variant, still in memory
+        placeholder, color = _placeholder(current)
+        timer.lap("placeholder")
+        return width, height, placeholder, color, metadata, timer.timings
+
+
+def _resize_worker(source: Path, dest: Path, width: int, quality: int, fmt: str, reduce_first: bool = False) -> None:
+    with Image.open(source) as img:
+        src_w, src_h = _oriented_size(img)
+        target = min(width, src_w)
+        max_size = max(target, round(src_h * target / src_w))
+        decode = _decode_reduced if reduce_first else _decode_upright
+        frame = _downscale(decode(img, max_size), max_size)
+        _encode(frame, dest, fmt, quality)
+
+
+def _sprite_worker(
+    tiles: list[tuple[str, int, int, int, int]],
+    size: tuple[int, int],
+    dest: Path,
+    fmt: str,
+    quality: int,
+) -> None:
+    sheet = Image.new("RGB", size)
+    for path, x, y, w, h in tiles:
+        try:
+            with Image.open(path) as img:
+                # thumbnails are stored upright already
+                if img.format == "JPEG":
+                    img.draft("RGB", (w, h))
+                tile = img if img.mode == "RGB" else img.convert("RGB")
+                sheet.paste(tile.resize((w, h), Image.Resampling.LANCZOS, reducing_gap=2.0), (x, y))
+        except OSError:
+            # missing or unreadable thumbnail: leave its cell blank
+            continue
+    _encode(sheet, dest, fmt, quality)
+
+
+def _tile_level_worker(
+    source: Path, dest: Path, size: tuple[int, int], tile: int, quality: int, reduce_first: bool = False
+) -> None:
+    with Image.open(source) as img:
+        decode = _decode_reduced if reduce_first else _decode_upright
+        frame = decode(img, max(size))
+    if frame.size != size:
+        frame = frame.resize(size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+    w, h = size
+    offsets = [0]
+    with open(dest, "wb") as f:
+        for y in range(0, h, tile):
+            for x in range(0, w, tile):
+                buf = io.BytesIO()
+                frame.crop((x, y, min(x + tile, w), min(y + tile, h))).save(buf, format="JPEG", quality=quality)
+                f.write(buf.getbuffer())
+                offsets.append(offsets[-1] + buf.tell())
+        # row-major tile i is bytes offsets[i]..offsets[i + 1]; the table ends the file
+        f.write(struct.pack(f"<{len(offsets)}Q", *offsets))
 
 
-def _process_image_worker(original: Path, thumb: Path, preview: Path) -> tuple[int, int]:
-    with Image.open(original) as img_raw:
-        img = ImageOps.exif_transpose(img_raw)
-        width, height = img.size
+async def render_tile_level(source: Path, dest: Path, size: tuple[int, int], tile: int, quality: int) -> None:
+    """Scale ``source`` to ``size`` and write all its ``tile``-pixel JPEG tiles into one pack file at ``dest``."""
+    plan = await _decode_plan(source, max(size))
+    # plus the level frame itself, which can be larger than the decode of a drafted JPEG
+    memory = plan.memory + size[0] * size[1] * 4
+    await get_engine().run(_tile_level_worker, source, dest, size, tile, quality, plan.reduce_first, memory=memory)
 
-        # Convert if needed
-        if img.mode not in ("RGB", "L"):
-            img = img.convert("RGB")
-        elif img.mode == "L":
-            img = img.convert("RGB")
 
-        # Generate thumbnail (512px)
-        thumb_img = img.copy()
-        thumb_img.thumbnail((512, 512), Image.Resampling.LANCZOS)
-        thumb_img.save(thumb, format="JPEG", quality=86, optimize=True, progressive=True)
+def read_tile(pack: Path, count: int, index: int) -> bytes:
+    """Tile ``index`` of a pack written by render_tile_level holding ``count`` tiles."""
+    with open(pack, "rb") as f:
+        f.seek(-(count + 1 - index) * 8, 2)
+        start, end = struct.unpack("<2Q", f.read(16))
+        f.seek(start)
+        return f.read(end - start)
 
-        # Generate preview (2560px)
-        preview_img = img.copy()
-        preview_img.thumbnail((2560, 2560), Image.Resampling.LANCZOS)
-        preview_img.save(preview, format="JPEG", quality=88, optimize=True, progressive=True)
 
-        return width, height
+async def render_sprite(
+    tiles: list[tuple[str, int, int, int, int]], size: tuple[int, int], dest: Path, fmt: str, quality: int
+) -> None:
+    """Composite ``(thumb_path, x, y, w, h)`` tiles into one sheet image at ``dest``."""
+    # the sheet, plus the encoder's copy of it
+    await get_engine().run(_sprite_worker, tiles, size, dest, fmt, quality, memory=size[0] * size[1] * 4 * 2)
 
 
-async def _generate_variants(original: Path, thumb: Path, preview: Path) -> tuple[int, int]:
+async def _generate_variants(
+    original: Path,
+    targets: list[tuple[VariantSpec, Path]],
+    formats: tuple[str, ...],
+) -> tuple[int, int, str, str, dict[str, Any]]:
+    started = time.perf_counter()
     try:
-        return await run_in_threadpool(_process_image_worker, original, thumb, preview)
+        plan = await _decode_plan(original, max(spec.max_size for spec, _ in targets))
+        width, height, placeholder, color, metadata, timings = await get_engine().run(
+            _process_image_worker, original, targets, formats, plan.reduce_first, memory=plan.memory
+        )
+    except BrokenProcessPool:
+        # the worker died (e.g. OOM), not necessarily because of this image
+        raise
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid image file") from e
+    # whatever the worker didn't account for was spent waiting for memory and a free worker (plus IPC)
+    timings["queue_wait"] = max(0.0, time.perf_counter() - started - sum(timings.values()))
+    observe_stages(timings)
+    return width, height, placeholder, color, metadata
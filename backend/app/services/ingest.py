@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import hashlib
+from collections.abc import AsyncIterator, Callable
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, BinaryIO
+
+from fastapi import HTTPException, Request, status
+from python_multipart.exceptions import FormParserError
+from python_multipart.multipart import MultipartParser, MultipartState, parse_options_header
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.config import Settings
+from backend.app.services.storage import staging_path
+from backend.app.utils.files import ensure_parent, guess_extension
+
+
+WRITE_BUFFER = 1024 * 1024
+
+
+@dataclass
+class IngestedFile:
+    """One file part of a multipart body, already written to its staging path."""
+
+    image_id: str
+    filename: str
+    path: Path
+    size: int
+    sha256: str
+
+
+@dataclass
+class RejectedFile:
+    filename: str
+    detail: str
+
+
+class _PartWriter:
+    def __init__(self, path: Path, limit: int) -> None:
+        self.path = path
+        self.limit = limit
+        self.size = 0
+        self.hasher = hashlib.sha256()
+        self._buf = bytearray()
+        self._file: BinaryIO | None = None
+
+    def _flush_sync(self, data: bytes) -> None:
+        if self._file is None:
+            ensure_parent(self.path)
+            self._file = self.path.open("wb")
+        self.hasher.update(data)
+        self._file.write(data)
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.size > self.limit:
+            raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="File too large")
+        self._buf += data
+        if len(self._buf) >= WRITE_BUFFER:
+            await self._flush()
+
+    async def _flush(self) -> None:
+        data = bytes(self._buf)
+        self._buf.clear()
+        await run_in_threadpool(self._flush_sync, data)
+
+    async def close(self) -> None:
+        if self._buf or self._file is None:
+            await self._flush()
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+
+    async def discard(self) -> None:
+        if self._file is not None:
+            await run_in_threadpool(self._file.close)
+        self.path.unlink(missing_ok=True)
+
+
+def _disposition(headers: dict[bytes, bytes]) -> tuple[str | None, str | None]:
+    _, params = parse_options_header(headers.get(b"content-disposition", b""))
+    name = params.get(b"name")
+    filename = params.get(b"filename")
+    return (
+        name.decode("utf-8", "replace") if name is not None else None,
+        filename.decode("utf-8", "replace") if filename is not None else None,
+    )
+
+
+async def ingest_multipart(
+    request: Request,
+    settings: Settings,
+    new_image_id: Callable[[], str],
+    field: str = "files",
+) -> AsyncIterator[IngestedFile | RejectedFile]:
+    """Stream ``field`` file parts of a multipart body straight to disk.
+
+    Replaces UploadFile spooling: each part is hashed, size-checked and written (off the event loop)
+    as its bytes arrive, and yielded as soon as it is complete so processing can start while later
+    parts are still uploading. Rejected parts are yielded too, with nothing left on disk.
+
+    A body cut off before its closing boundary, or without any ``field`` file part, raises 400 / 422
+    once the stream ends; files yielded before that are the caller's to clean up.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Expected multipart/form-data")
+
+    limit = settings.max_upload_mb * 1024 * 1024
+    events: list[tuple[str, Any]] = []
+    try:
+        parser = MultipartParser(
+            boundary,
+            callbacks={
+                "on_part_begin": lambda: events.append(("begin", None)),
+                "on_header_field": lambda d, s, e: events.append(("field", bytes(d[s:e]))),
+                "on_header_value": lambda d, s, e: events.append(("value", bytes(d[s:e]))),
+                "on_header_end": lambda: events.append(("header_end", None)),
+                "on_headers_finished": lambda: events.append(("headers", None)),
+                "on_part_data": lambda d, s, e: events.append(("data", bytes(d[s:e]))),
+                "on_part_end": lambda: events.append(("end", None)),
+            },
+        )
+    except FormParserError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid multipart boundary") from e
+
+    headers: dict[bytes, bytes] = {}
+    header_field = b""
+    header_value = b""
+    writer: _PartWriter | None = None
+    current: IngestedFile | None = None
+    rejected: RejectedFile | None = None
+    seen = False
+
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            batch, events[:] = list(events), []
+            for kind, data in batch:
+                if kind == "begin":
+                    headers, header_field, header_value = {}, b"", b""
+                    writer, current, rejected = None, None, None
+                elif kind == "field":
+                    header_field += data
+                elif kind == "value":
+                    header_value += data
+                elif kind == "header_end":
+                    headers[header_field.lower()] = header_value
+                    header_field, header_value = b"", b""
+                elif kind == "headers":
+                    name, filename = _disposition(headers)
+                    if name != field or filename is None:
+                        continue
+                    seen = True
+                    part_type = headers.get(b"content-type", b"").decode("latin-1")
+                    if not part_type.startswith("image/"):
+                        rejected = RejectedFile(filename=filename, detail="Only image uploads are supported")
+                        continue
+                    image_id = new_image_id()
+                    ext = guess_extension(filename)
+                    path = staging_path(settings, image_id, ext)
+                    writer = _PartWriter(path, limit)
+                    current = IngestedFile(
+                        image_id=image_id, filename=filename or f"{image_id}{ext}", path=path, size=0, sha256=""
+                    )
+                elif kind == "data":
+                    if writer is None or current is None:
+                        continue
+                    try:
+                        await writer.write(data)
+                    except HTTPException as e:
+                        await writer.discard()
+                        rejected = RejectedFile(filename=current.filename, detail=str(e.detail))
+                        writer, current = None, None
+                elif kind == "end":
+                    if writer is not None and current is not None:
+                        await writer.close()
+                        current.size = writer.size
+                        current.sha256 = writer.hasher.hexdigest()
+                        writer = None
+                        yield current
+                    elif rejected is not None:
+                        yield rejected
+                    current, rejected = None, None
+        parser.finalize()
+    except FormParserError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Malformed multipart body") from e
+    finally:
+        # client went away mid-part: drop the partial file
+        if writer is not None:
+            await writer.discard()
+    # finalize() accepts a body that stops short of its closing boundary
+    if parser.state != MultipartState.END:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incomplete multipart body")
+    if not seen:
+        # what the File(...) parameter this replaces answered
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=f"Field required: {field}")
@@ -0,0 +1,202 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import os
+import uuid
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable
+
+from pymongo import ReturnDocument
+
+from backend.app.core.config import get_settings
+from backend.app.db import get_db
+
+
+# Mongo-backed work queue (db.jobs). Jobs are leased for a limited time and the lease is renewed
+# while they run, so jobs of a crashed process are picked up again once their lease expires.
+# Job states: queued, leased, done, failed. Handlers must be idempotent.
+
+POLL_INTERVAL = 2.0
+MAX_BACKOFF = 300.0
+
+JobHandler = Callable[[dict[str, Any]], Awaitable[None]]
+FailureHandler = Callable[[dict[str, Any], str], Awaitable[None]]
+
+
+class JobFailed(Exception):
+    """Raised by a handler for errors a retry cannot fix."""
+
+
+@dataclass(frozen=True)
+class _Registration:
+    run: JobHandler
+    on_failure: FailureHandler | None
+
+
+_handlers: dict[str, _Registration] = {}
+
+
+def register_job_handler(kind: str, run: JobHandler, on_failure: FailureHandler | None = None) -> None:
+    """``on_failure(job, detail)`` runs once a job is given up on."""
+    _handlers[kind] = _Registration(run=run, on_failure=on_failure)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def enqueue_job(kind: str, payload: dict[str, Any], key: str | None = None) -> str:
+    """Queue a job; ``key`` names what it works on, for status queries."""
+    now = _now()
+    job_id = uuid.uuid4().hex
+    await get_db().jobs.insert_one(
+        {
+            "id": job_id,
+            "kind": kind,
+            "key": key,
+            "payload": payload,
+            "state": "queued",
+            "attempts": 0,
+            "run_after": now,
+            "created_at": now,
+            "updated_at": now,
+        }
+    )
+    if _runner is not None:
+        _runner.wake()
+    return job_id
+
+
+async def has_active_job(kind: str, key: str) -> bool:
+    job = await get_db().jobs.find_one({"kind": kind, "key": key, "state": {"$in": ["queued", "leased"]}}, {"_id": 1})
+    return job is not None
+
+
+async def count_active_jobs(kind: str) -> int:
+    return await get_db().jobs.count_documents({"kind": kind, "state": {"$in": ["queued", "leased"]}})
+
+
+class JobRunner:
+    """Worker tasks draining db.jobs; the CPU-heavy parts of handlers run on the variant engine."""
+
+    def __init__(self, workers: int, lease_seconds: float, max_attempts: int) -> None:
+        self.workers = max(1, workers)
+        self.lease = timedelta(seconds=lease_seconds)
+        self.max_attempts = max_attempts
+        self._wake = asyncio.Event()
+        self._tasks: list[asyncio.Task[None]] = []
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def wake(self) -> None:
+        self._wake.set()
+
+    async def _claim(self) -> dict[str, Any] | None:
+        now = _now()
+        return await get_db().jobs.find_one_and_update(
+            {
+                "kind": {"$in": list(_handlers)},
+                "$or": [
+                    {"state": "queued", "run_after": {"$lte": now}},
+                    # lease ran out: the process holding it died or hung
+                    {"state": "leased", "lease_until": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {"state": "leased", "lease_until": now + self.lease, "lease_token": uuid.uuid4().hex, "updated_at": now},
+                "$inc": {"attempts": 1},
+            },
+            projection={"_id": 0},
+            sort=[("run_after", 1)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def _work(self) -> None:
+        while True:
+            try:
+                job = await self._claim()
+            except Exception:
+                job = None
+            if job is None:
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._wake.wait(), POLL_INTERVAL)
+                self._wake.clear()
+                continue
+            with contextlib.suppress(Exception):
+                # e.g. database unavailable; the lease runs out and the job is retried
+                await self._run(job)
+
+    async def _heartbeat(self, job: dict[str, Any]) -> None:
+        while True:
+            await asyncio.sleep(self.lease.total_seconds() / 3)
+            await get_db().jobs.update_one(
+                {"id": job["id"], "lease_token": job["lease_token"]},
+                {"$set": {"lease_until": _now() + self.lease}},
+            )
+
+    async def _finish(self, job: dict[str, Any], fields: dict[str, Any]) -> None:
+        await get_db().jobs.update_one(
+            {"id": job["id"], "lease_token": job["lease_token"]},
+            {"$set": {**fields, "updated_at": _now()}, "$unset": {"lease_until": "", "lease_token": ""}},
+        )
+
+    async def _fail(self, job: dict[str, Any], detail: str) -> None:
+        await self._finish(job, {"state": "failed", "error": detail, "finished_at": _now()})
+        registration = _handlers[job["kind"]]
+        if registration.on_failure is not None:
+            await registration.on_failure(job, detail)
+
+    async def _run(self, job: dict[str, Any]) -> None:
+        if job["attempts"] > self.max_attempts:
+            # crashed its worker on every attempt
+            await self._fail(job, "Processing did not finish")
+            return
+        heartbeat = asyncio.create_task(self._heartbeat(job))
+        try:
+            await _handlers[job["kind"]].run(job)
+        except asyncio.CancelledError:
+            # shutting down: hand the job straight back instead of waiting for the lease to run out
+            with contextlib.suppress(Exception):
+                await asyncio.shield(self._finish(job, {"state": "queued", "run_after": _now()}))
+            raise
+        except JobFailed as e:
+            await self._fail(job, str(e))
+        except Exception as e:
+            if job["attempts"] >= self.max_attempts:
+                await self._fail(job, "Processing failed")
+            else:
+                delay = min(MAX_BACKOFF, 2.0 ** job["attempts"])
+                await self._finish(job, {"state": "queued", "run_after": _now() + timedelta(seconds=delay), "error": repr(e)})
+        else:
+            await self._finish(job, {"state": "done", "finished_at": _now()})
+        finally:
+            heartbeat.cancel()
+
+
+_runner: JobRunner | None = None
+
+
+def start_job_runner() -> None:
+    global _runner
+    if _runner is not None:
+        return
+    settings = get_settings()
+    workers = settings.job_workers or settings.image_workers or os.cpu_count() or 1
+    _runner = JobRunner(workers=workers, lease_seconds=settings.job_lease_seconds, max_attempts=settings.job_max_attempts)
+    _runner.start()
+
+
+async def stop_job_runner() -> None:
+    global _runner
+    if _runner is not None:
+        await _runner.stop()
+    _runner = None
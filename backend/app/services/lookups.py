@@ -0,0 +1,66 @@
+from __future__ import annotations
+
+import time
+from typing import Any
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import get_db
+from backend.app.services.cache import TTLCache
+from backend.app.utils.security import ShareSession, decode_share_jwt
+
+
+# Hot-path lookups for media requests. Misses are never cached, so new documents show up
+# immediately; changed or deleted images must go through invalidate_image (which only reaches this
+# process, the TTL bounds staleness elsewhere). Shares are never modified once created.
+_images: TTLCache[str, dict[str, Any]] | None = None
+_shares: TTLCache[str, dict[str, Any]] | None = None
+_tokens: TTLCache[str, ShareSession] | None = None
+
+
+def _caches() -> tuple[TTLCache[str, dict[str, Any]], TTLCache[str, dict[str, Any]], TTLCache[str, ShareSession]]:
+    global _images, _shares, _tokens
+    if _images is None or _shares is None or _tokens is None:
+        settings = get_settings()
+        size, ttl = settings.lookup_cache_size, settings.lookup_cache_ttl_seconds
+        _images = TTLCache(size, ttl)
+        _shares = TTLCache(size, ttl)
+        _tokens = TTLCache(size, ttl)
+    return _images, _shares, _tokens
+
+
+async def get_image(image_id: str) -> dict[str, Any] | None:
+    images, _, _ = _caches()
+    img = images.get(image_id)
+    if img is None:
+        img = await get_db().images.find_one({"id": image_id}, {"_id": 0})
+        if img is not None:
+            images.set(image_id, img)
+    return img
+
+
+async def get_share(share_id: str) -> dict[str, Any] | None:
+    """Share scope document, without its password hash."""
+    _, shares, _ = _caches()
+    share = shares.get(share_id)
+    if share is None:
+        share = await get_db().shares.find_one({"id": share_id}, {"_id": 0, "password_hash": 0})
+        if share is not None:
+            shares.set(share_id, share)
+    return share
+
+
+def verify_share_token(token: str, settings: Settings) -> ShareSession:
+    """``decode_share_jwt`` with verified tokens remembered until they expire."""
+    _, _, tokens = _caches()
+    session = tokens.get(token)
+    if session is not None and session.exp > time.time():
+        return session
+    session = decode_share_jwt(token, settings)
+    tokens.set(token, session, ttl=session.exp - time.time())
+    return session
+
+
+def invalidate_image(image_id: str) -> None:
+    images, _, _ = _caches()
+    images.pop(image_id)
+
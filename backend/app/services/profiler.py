@@ -0,0 +1,121 @@
+from __future__ import annotations
+
+import collections
+import queue
+import re
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from types import FrameType
+
+from backend.app.core.config import get_settings
+from backend.app.utils.metrics import register_counter, set_slow_request_hook
+
+
+# Opt-in sampling profiler for slow requests. A background thread records the event loop thread's stack
+# every few milliseconds into a ring buffer; when a request ends over the threshold, the samples taken
+# while it was in flight are written out as folded stacks (flamegraph.pl / speedscope input). Requests
+# interleave on the loop, so a profile shows everything the serving thread did during that window.
+# Picking the samples out, writing and pruning happen on a writer thread, keeping file I/O off the loop.
+
+MAX_STACK_DEPTH = 64
+# profiles kept on disk, oldest removed first
+MAX_PROFILES = 200
+
+SLOW_REQUESTS = register_counter(
+    "proofflow_slow_requests_profiled_total", "Requests over the profiling threshold whose stacks were saved.", ("route",)
+)
+
+
+def _fold(frame: FrameType | None) -> str:
+    names: list[str] = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({Path(code.co_filename).name}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+class SlowRequestProfiler:
+    def __init__(self, threshold_ms: float, interval_ms: float, directory: Path, window_seconds: float = 120.0) -> None:
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self._samples: collections.deque[tuple[float, str]] = collections.deque(maxlen=int(window_seconds / self.interval))
+        self._target = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="slow-request-profiler", daemon=True)
+        self._captures: queue.SimpleQueue[tuple[str, str, float, float, float, list[tuple[float, str]]] | None] = (
+            queue.SimpleQueue()
+        )
+        self._writer = threading.Thread(target=self._write, name="slow-request-profile-writer", daemon=True)
+        # files on disk, oldest first; listed once at start, then kept up to date by the writer
+        self._profiles: collections.deque[Path] = collections.deque()
+
+    def start(self) -> None:
+        """Must be called from the thread to profile (the event loop's)."""
+        self._target = threading.get_ident()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._profiles.extend(sorted(self.directory.glob("*.folded")))
+        self._thread.start()
+        self._writer.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._captures.put(None)
+        self._thread.join(timeout=1)
+        self._writer.join(timeout=5)
+
+    def _sample(self) -> None:
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self._target)
+            if frame is not None:
+                self._samples.append((time.monotonic(), _fold(frame)))
+
+    def capture(self, method: str, route: str, started: float, finished: float, seconds: float) -> None:
+        """Slow request hook, on the loop thread: only snapshots the ring buffer for the writer."""
+        self._captures.put((method, route, started, finished, seconds, list(self._samples)))
+
+    def _write(self) -> None:
+        while (item := self._captures.get()) is not None:
+            method, route, started, finished, seconds, samples = item
+            counts = collections.Counter(stack for at, stack in samples if started <= at <= finished)
+            if not counts:
+                continue
+            SLOW_REQUESTS.inc(route)
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S.%f")
+            slug = re.sub(r"[^A-Za-z0-9]+", "_", route).strip("_") or "root"
+            body = "".join(f"{stack} {n}\n" for stack, n in counts.most_common())
+            path = self.directory / f"{stamp}-{method}-{slug}-{round(seconds * 1000)}ms.folded"
+            try:
+                path.write_text(body)
+            except OSError:
+                continue
+            self._profiles.append(path)
+            while len(self._profiles) > MAX_PROFILES:
+                self._profiles.popleft().unlink(missing_ok=True)
+
+
+_profiler: SlowRequestProfiler | None = None
+
+
+def start_profiler() -> None:
+    """Starts sampling when PROFILE_SLOW_REQUEST_MS is set; call from the event loop thread."""
+    global _profiler
+    settings = get_settings()
+    if _profiler is not None or not settings.profile_slow_request_ms:
+        return
+    directory = Path(settings.profile_dir or Path(settings.storage_path) / "profiles")
+    _profiler = SlowRequestProfiler(settings.profile_slow_request_ms, settings.profile_interval_ms, directory)
+    _profiler.start()
+    set_slow_request_hook(settings.profile_slow_request_ms, _profiler.capture)
+
+
+def stop_profiler() -> None:
+    global _profiler
+    if _profiler is not None:
+        set_slow_request_hook(0, None)
+        _profiler.stop()
+    _profiler = None
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import hashlib
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+from fastapi import HTTPException, status
+
+from backend.app.core.config import Settings
+from backend.app.services.cache import DiskLRUCache
+from backend.app.services.galleries import DEFAULT_ORDER, LISTING_PROJECTION, ListingOrder, image_page, share_image_query
+from backend.app.services.images import render_sprite
+from backend.app.services.lookups import get_share
+from backend.app.services.storage import FORMAT_EXTENSIONS
+
+
+SPRITE_QUALITY = 80
+# Largest page a sheet covers; at 256px tiles that's a 5120px square sheet
+MAX_SPRITE_TILES = 400
+
+_sprite_cache: DiskLRUCache | None = None
+
+
+@dataclass(frozen=True)
+class SpriteTile:
+    image_id: str
+    thumb_path: str
+    x: int
+    y: int
+    width: int
+    height: int
+
+
+@dataclass(frozen=True)
+class SpriteLayout:
+    width: int
+    height: int
+    tiles: list[SpriteTile]
+
+
+def get_sprite_cache(settings: Settings) -> DiskLRUCache:
+    global _sprite_cache
+    if _sprite_cache is None:
+        root = Path(settings.storage_path) / "cache" / "sprites"
+        _sprite_cache = DiskLRUCache(root, max_bytes=settings.sprite_cache_max_mb * 1024 * 1024)
+    return _sprite_cache
+
+
+def sprite_fingerprint(docs: list[dict[str, Any]], tile: int) -> str:
+    """Identifies a sheet by its tile size and exact contents.
+
+    Any change to the page (uploads, deletions, re-rendered content) yields a new fingerprint, so
+    stale sheets are never served; they just age out of the LRU cache.
+    """
+    h = hashlib.sha256(f"{tile}".encode())
+    for d in docs:
+        h.update(f"\n{d['id']}:{d.get('storage_key') or d['id']}".encode())
+    return h.hexdigest()[:32]
+
+
+def sprite_layout(docs: list[dict[str, Any]], tile: int) -> SpriteLayout:
+    """Row-major grid of ``tile``-sized cells, each image fitted into its cell's top-left corner."""
+    columns = max(1, math.ceil(math.sqrt(len(docs))))
+    rows = max(1, math.ceil(len(docs) / columns))
+    tiles: list[SpriteTile] = []
+    for i, d in enumerate(docs):
+        w, h = d["width"], d["height"]
+        scale = min(1.0, tile / max(w, h, 1))
+        tiles.append(
+            SpriteTile(
+                image_id=d["id"],
+                thumb_path=d["thumb_path"],
+                x=(i % columns) * tile,
+                y=(i // columns) * tile,
+                width=max(1, round(w * scale)),
+                height=max(1, round(h * scale)),
+            )
+        )
+    return SpriteLayout(width=columns * tile, height=rows * tile, tiles=tiles)
+
+
+async def share_sprite_page(
+    share: dict[str, Any], cursor: str | None, limit: int, tile: int, order: ListingOrder = DEFAULT_ORDER
+) -> tuple[str, SpriteLayout, str | None]:
+    """Fingerprint, layout and next cursor of the sheet for one page of a share."""
+    projection = {**LISTING_PROJECTION, "thumb_path": 1}
+    docs, next_cursor = await image_page(share_image_query(share), cursor, limit, projection, order)
+    return sprite_fingerprint(docs, tile), sprite_layout(docs, tile), next_cursor
+
+
+async def share_sprite_sheet(
+    share_id: str,
+    fingerprint: str,
+    cursor: str | None,
+    limit: int,
+    tile: int,
+    fmt: str,
+    settings: Settings,
+    order: ListingOrder = DEFAULT_ORDER,
+) -> Path:
+    """Cached sheet image; on a miss the page is queried again and must still match ``fingerprint``."""
+
+    async def build(tmp: Path) -> None:
+        share = await get_share(share_id)
+        if not share:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Share not found")
+        current, layout, _ = await share_sprite_page(share, cursor, limit, tile, order)
+        if current != fingerprint:
+            # the page changed since the URL was handed out; the client refetches the sprite map
+            raise HTTPException(status_code=status.HTTP_410_GONE, detail="Sprite sheet is out of date")
+        tiles = [(t.thumb_path, t.x, t.y, t.width, t.height) for t in layout.tiles]
+        await render_sprite(tiles, (layout.width, layout.height), tmp, fmt, SPRITE_QUALITY)
+
+    key = f"{fingerprint[:2]}/{fingerprint}{FORMAT_EXTENSIONS[fmt]}"
+    return await get_sprite_cache(settings).get_or_create(key, build)
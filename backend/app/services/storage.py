@@ -5,26 +5,69 @@ from pathlib import Path
 from backend.app.core.config import Settings
 
 
+# variant name -> directory under storage_path
+VARIANT_DIRS: dict[str, str] = {"thumb": "thumbs", "preview": "previews"}
+# variant encoding -> file extension; JPEG is always present, others are siblings of it
+FORMAT_EXTENSIONS: dict[str, str] = {"jpeg": ".jpg", "webp": ".webp", "avif": ".avif"}
+STORAGE_LAYOUTS = ("flat", "sharded")
+
+
+def layout_path(root: Path, name: str, layout: str) -> Path:
+    """``root/name``, or ``root/ab/cd/name`` when sharded (names are hex ids or hashes)."""
+    if layout == "sharded":
+        return root / name[:2] / name[2:4] / name
+    return root / name
+
+
 def originals_root(settings: Settings) -> Path:
     return Path(settings.storage_path) / "originals"
 
 
+def variant_root(settings: Settings, variant: str) -> Path:
+    return Path(settings.storage_path) / VARIANT_DIRS[variant]
+
+
 def thumbs_root(settings: Settings) -> Path:
-    return Path(settings.storage_path) / "thumbs"
+    return variant_root(settings, "thumb")
 
 
 def previews_root(settings: Settings) -> Path:
-    return Path(settings.storage_path) / "previews"
+    return variant_root(settings, "preview")
+
 
+def staging_root(settings: Settings) -> Path:
+    return Path(settings.storage_path) / "staging"
 
-def original_path(settings: Settings, image_id: str, ext: str) -> Path:
+
+def staging_path(settings: Settings, name: str, ext: str) -> Path:
+    """Where an upload is assembled before its content hash (and so its final name) is known."""
     ext_clean = ext if ext.startswith(".") else (f".{ext}" if ext else "")
-    return originals_root(settings) / f"{image_id}{ext_clean}"
+    return staging_root(settings) / f"{name}{ext_clean}"
+
+
+def original_path(settings: Settings, key: str, ext: str) -> Path:
+    ext_clean = ext if ext.startswith(".") else (f".{ext}" if ext else "")
+    return layout_path(originals_root(settings), f"{key}{ext_clean}", settings.storage_layout)
+
+
+def variant_path(settings: Settings, variant: str, key: str, fmt: str = "jpeg") -> Path:
+    return layout_path(variant_root(settings, variant), f"{key}{FORMAT_EXTENSIONS[fmt]}", settings.storage_layout)
+
+
+def variant_path_candidates(settings: Settings, variant: str, key: str) -> list[Path]:
+    """Possible locations of a variant JPEG, configured layout first (files may not be migrated yet)."""
+    name = f"{key}{FORMAT_EXTENSIONS['jpeg']}"
+    layouts = sorted(STORAGE_LAYOUTS, key=lambda layout: layout != settings.storage_layout)
+    return [layout_path(variant_root(settings, variant), name, layout) for layout in layouts]
+
+
+def sibling_path(path: Path, fmt: str) -> Path:
+    return path.with_suffix(FORMAT_EXTENSIONS[fmt])
 
 
-def thumb_path(settings: Settings, image_id: str) -> Path:
-    return thumbs_root(settings) / f"{image_id}.jpg"
+def thumb_path(settings: Settings, key: str) -> Path:
+    return variant_path(settings, "thumb", key)
 
 
-def preview_path(settings: Settings, image_id: str) -> Path:
-    return previews_root(settings) / f"{image_id}.jpg"
+def preview_path(settings: Settings, key: str) -> Path:
+    return variant_path(settings, "preview", key)
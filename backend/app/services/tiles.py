@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+from xml.sax.saxutils import quoteattr
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.config import Settings
+from backend.app.services.cache import DiskLRUCache
+from backend.app.services.images import PREVIEW, read_tile, render_tile_level, resize_cache_prefix, storage_key
+
+
+# Deep Zoom (DZI) pyramids: level L is the upright image scaled by 2^(L - max level), max level being
+# full size, cut into TILE_SIZE squares without overlap. Levels are rendered on first request, all
+# tiles of a level in one pass, and kept as one pack file per level in a disk cache.
+
+TILE_SIZE = 256
+TILE_QUALITY = 85
+DZI_NAMESPACE = "http://schemas.microsoft.com/deepzoom/2008"
+
+_tile_cache: DiskLRUCache | None = None
+
+
+def get_tile_cache(settings: Settings) -> DiskLRUCache:
+    global _tile_cache
+    if _tile_cache is None:
+        root = Path(settings.storage_path) / "cache" / "tiles"
+        _tile_cache = DiskLRUCache(root, max_bytes=settings.tile_cache_max_mb * 1024 * 1024)
+    return _tile_cache
+
+
+def max_level(width: int, height: int) -> int:
+    """Level at which the image is full size: level 0 is a single pixel."""
+    return (max(width, height) - 1).bit_length()
+
+
+def level_size(width: int, height: int, level: int) -> tuple[int, int]:
+    scale = 1 << (max_level(width, height) - level)
+    return -(-width // scale), -(-height // scale)
+
+
+def deep_zoom_worthwhile(doc: dict[str, Any], settings: Settings) -> bool:
+    # smaller images are fully shown by the preview already
+    return settings.deep_zoom and max(doc["width"], doc["height"]) > PREVIEW.max_size
+
+
+def dzi_descriptor(img: dict[str, Any]) -> str:
+    """DZI XML; ``Url`` points viewers at the tile route, which they call with the descriptor's query string."""
+    url = quoteattr(f"/media/tiles/{img['id']}/")
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Image xmlns="{DZI_NAMESPACE}" Url={url} Format="jpg" Overlap="0" TileSize="{TILE_SIZE}">'
+        f'<Size Width="{img["width"]}" Height="{img["height"]}"/></Image>\n'
+    )
+
+
+async def tile_bytes(img: dict[str, Any], level: int, x: int, y: int, settings: Settings) -> bytes:
+    """JPEG of tile ``x``, ``y`` of pyramid ``level``, rendering that level on first request."""
+    width, height = img["width"], img["height"]
+    if not 0 <= level <= max_level(width, height):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+    size = level_size(width, height, level)
+    cols, rows = -(-size[0] // TILE_SIZE), -(-size[1] // TILE_SIZE)
+    if not (0 <= x < cols and 0 <= y < rows):
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Not found")
+
+    source = Path(img["original_path"])
+    preview = img.get("preview_path")
+    if preview and img.get("status", "ready") == "ready" and max(size) <= PREVIEW.max_size:
+        # levels the preview covers are far cheaper to cut from it than from the original
+        source = Path(preview)
+
+    async def build(tmp: Path) -> None:
+        await render_tile_level(source, tmp, size, TILE_SIZE, TILE_QUALITY)
+
+    # keyed by content like resized variants, so they are dropped together with them
+    key = f"{resize_cache_prefix(storage_key(img))}tiles/{level}.pack"
+    pack = await get_tile_cache(settings).get_or_create(key, build)
+    return await run_in_threadpool(read_tile, pack, cols * rows, y * cols + x)
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import hashlib
+import logging
+import os
+from collections.abc import AsyncIterator
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from fastapi import HTTPException, status
+from starlette.concurrency import run_in_threadpool
+
+from backend.app.core.config import Settings, get_settings
+from backend.app.db import get_db
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER = 1024 * 1024
+HASH_BUFFER = 4 * 1024 * 1024
+SWEEP_INTERVAL = 15 * 60
+
+
+def merge_ranges(ranges: list[list[int]]) -> list[list[int]]:
+    """Coalesce received [start, end) byte ranges, which may overlap or arrive out of order."""
+    merged: list[list[int]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def received_bytes(ranges: list[list[int]]) -> int:
+    return sum(end - start for start, end in merge_ranges(ranges))
+
+
+def _allocate(path: Path, size: int) -> None:
+    with path.open("wb") as f:
+        f.truncate(size)
+
+
+async def allocate_upload_file(path: Path, size: int) -> None:
+    """Create the destination at its final size (sparse) so chunks can land at any offset."""
+    await run_in_threadpool(_allocate, path, size)
+
+
+async def write_chunk(path: Path, offset: int, body: AsyncIterator[bytes], end_limit: int) -> int:
+    """Write a streamed request body into ``path`` at ``offset``; returns the byte count.
+
+    Writes go straight to the final file with pwrite, off the event loop. Bytes beyond ``end_limit``
+    are rejected as they arrive.
+    """
+    fd = await run_in_threadpool(os.open, path, os.O_WRONLY)
+    pos = offset
+    buf = bytearray()
+    try:
+        async for part in body:
+            if pos + len(buf) + len(part) > end_limit:
+                raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Chunk exceeds upload size")
+            buf += part
+            if len(buf) >= WRITE_BUFFER:
+                await run_in_threadpool(os.pwrite, fd, bytes(buf), pos)
+                pos += len(buf)
+                buf.clear()
+        if buf:
+            await run_in_threadpool(os.pwrite, fd, bytes(buf), pos)
+            pos += len(buf)
+    finally:
+        os.close(fd)
+    return pos - offset
+
+
+def _sha256_file(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with path.open("rb") as f:
+        while chunk := f.read(HASH_BUFFER):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def hash_file(path: Path) -> str:
+    return await run_in_threadpool(_sha256_file, path)
+
+
+def session_expiry(settings: Settings) -> datetime:
+    """New deadline of a session that just saw activity (created, written to, or being finalized)."""
+    return datetime.now(timezone.utc) + timedelta(hours=settings.upload_session_ttl_hours)
+
+
+async def expire_upload_sessions(settings: Settings) -> int:
+    """Drop sessions past their deadline together with their staging files; returns how many.
+
+    Any state qualifies: a session left ``finalizing`` that long belongs to a process that died
+    while completing it.
+    """
+    db = get_db()
+    now = datetime.now(timezone.utc)
+    stale = {
+        "$or": [
+            {"expires_at": {"$lte": now}},
+            # sessions opened before they carried a deadline
+            {"expires_at": {"$exists": False}, "created_at": {"$lte": now - timedelta(hours=settings.upload_session_ttl_hours)}},
+        ]
+    }
+    removed = 0
+    while doc := await db.upload_sessions.find_one_and_delete(stale, {"_id": 0, "staging_path": 1}):
+        Path(doc["staging_path"]).unlink(missing_ok=True)
+        removed += 1
+    return removed
+
+
+async def _sweep() -> None:
+    while True:
+        try:
+            removed = await expire_upload_sessions(get_settings())
+            if removed:
+                logger.info("removed %d expired upload sessions", removed)
+        except Exception:
+            logger.exception("upload session sweep failed")
+        await asyncio.sleep(SWEEP_INTERVAL)
+
+
+_sweeper: asyncio.Task[None] | None = None
+
+
+def start_upload_sweeper() -> None:
+    """Expire abandoned upload sessions now and every SWEEP_INTERVAL seconds; call from the event loop."""
+    global _sweeper
+    if _sweeper is None:
+        _sweeper = asyncio.create_task(_sweep())
+
+
+async def stop_upload_sweeper() -> None:
+    global _sweeper
+    if _sweeper is not None:
+        _sweeper.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await _sweeper
+    _sweeper = None
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import math
+
+
+# BlurHash encoder (https://blurha.sh): a few DCT components of an image packed into a short
+# base83 string, decoded client-side into a blurred placeholder. Meant for tiny inputs (~32px).
+
+_BASE83 = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz#$%*+,-.:;=?@[]^_{|}~"
+_SRGB_TO_LINEAR = [((v / 255) / 12.92) if v / 255 <= 0.04045 else ((v / 255 + 0.055) / 1.055) ** 2.4 for v in range(256)]
+
+
+def _base83(value: int, length: int) -> str:
+    return "".join(_BASE83[(value // 83 ** (length - i - 1)) % 83] for i in range(length))
+
+
+def _linear_to_srgb(value: float) -> int:
+    v = max(0.0, min(1.0, value))
+    if v <= 0.0031308:
+        return int(v * 12.92 * 255 + 0.5)
+    return int((1.055 * v ** (1 / 2.4) - 0.055) * 255 + 0.5)
+
+
+def _sign_pow(value: float, exp: float) -> float:
+    return math.copysign(abs(value) ** exp, value)
+
+
+def encode(pixels: list[tuple[int, int, int]], width: int, height: int, x_components: int = 4, y_components: int = 3) -> str:
+    """BlurHash of row-major RGB ``pixels``; 1-9 components per axis."""
+    linear = [(_SRGB_TO_LINEAR[r], _SRGB_TO_LINEAR[g], _SRGB_TO_LINEAR[b]) for r, g, b in pixels]
+    cos_x = [[math.cos(math.pi * i * x / width) for x in range(width)] for i in range(x_components)]
+    cos_y = [[math.cos(math.pi * j * y / height) for y in range(height)] for j in range(y_components)]
+
+    factors: list[tuple[float, float, float]] = []
+    for j in range(y_components):
+        for i in range(x_components):
+            r = g = b = 0.0
+            for y in range(height):
+                cy = cos_y[j][y]
+                row = y * width
+                for x in range(width):
+                    basis = cos_x[i][x] * cy
+                    pr, pg, pb = linear[row + x]
+                    r += basis * pr
+                    g += basis * pg
+                    b += basis * pb
+            scale = (1 if i == 0 and j == 0 else 2) / (width * height)
+            factors.append((r * scale, g * scale, b * scale))
+
+    dc, ac = factors[0], factors[1:]
+    result = _base83((x_components - 1) + (y_components - 1) * 9, 1)
+    if ac:
+        quantized_max = max(0, min(82, math.floor(max(abs(c) for f in ac for c in f) * 166 - 0.5)))
+        max_ac = (quantized_max + 1) / 166
+        result += _base83(quantized_max, 1)
+    else:
+        max_ac = 1.0
+        result += _base83(0, 1)
+    result += _base83((_linear_to_srgb(dc[0]) << 16) + (_linear_to_srgb(dc[1]) << 8) + _linear_to_srgb(dc[2]), 4)
+    for f in ac:
+        r, g, b = (max(0, min(18, math.floor(_sign_pow(c / max_ac, 0.5) * 9 + 9.5))) for c in f)
+        result += _base83(r * 19 * 19 + g * 19 + b, 2)
+    return result
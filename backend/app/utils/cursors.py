@@ -0,0 +1,48 @@
+from __future__ import annotations
+
+import base64
+import binascii
+from datetime import datetime
+from typing import Any
+
+import orjson
+from fastapi import HTTPException, status
+
+
+def encode_cursor(doc: dict[str, Any], field: str = "created_at") -> str:
+    """Opaque keyset position after ``doc`` in (``field``, id) order."""
+    # images stored before capture times were indexed lack taken_at until backfill_metadata has run
+    value = doc.get(field) or doc["created_at"]
+    raw = orjson.dumps([value.isoformat(), doc["id"]])
+    return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        created_at, last_id = orjson.loads(raw)
+        if not isinstance(last_id, str):
+            raise ValueError("bad id")
+        return datetime.fromisoformat(created_at), last_id
+    except (binascii.Error, orjson.JSONDecodeError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor") from e
+
+
+def after_cursor(cursor: str, field: str = "created_at", direction: int = -1) -> dict[str, Any]:
+    """Mongo filter selecting documents strictly after ``cursor`` in keyset_sort(field, direction) order."""
+    value, last_id = decode_cursor(cursor)
+    op = "$lt" if direction < 0 else "$gt"
+    return {
+        "$or": [
+            {field: {op: value}},
+            {field: value, "id": {op: last_id}},
+        ]
+    }
+
+
+def keyset_sort(field: str = "created_at", direction: int = -1) -> list[tuple[str, int]]:
+    # matches the (album_id, [subfolder_id,] field, id) indexes, which serve both directions
+    return [(field, direction), ("id", direction)]
+
+
+KEYSET_SORT: list[tuple[str, int]] = keyset_sort()
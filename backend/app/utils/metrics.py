@@ -0,0 +1,252 @@
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from typing import Any, Callable, Iterable
+
+import anyio.to_thread
+from pymongo import monitoring
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+# In-process metrics in the Prometheus text format (served at /metrics). Observations may come from
+# pymongo's threads as well as the event loop, hence the locks. Values are per process.
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+Labels = tuple[str, ...]
+GaugeReader = Callable[[], Iterable[tuple[Labels, float]]]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Labels, values: Labels, extra: str = "") -> str:
+    parts = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _format_value(value: float) -> str:
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: dict[Labels, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(total)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Labels = (), buckets: tuple[float, ...] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # per label set: non-cumulative bucket counts (last one is +Inf), sum
+        self._series: dict[Labels, tuple[list[int], list[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = sorted((values, list(counts), total[0]) for values, (counts, total) in self._series.items())
+        for values, counts, total in snapshot:
+            cumulative = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                cumulative += count
+                le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labels, values, le)} {cumulative}")
+            labels = _format_labels(self.labels, values)
+            lines.append(f"{self.name}_sum{labels} {total!r}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Gauge:
+    """Read when scraped, from ``read()`` returning ``(label_values, value)`` pairs."""
+
+    def __init__(self, name: str, help: str, read: GaugeReader, labels: Labels = ()) -> None:
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.read = read
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        try:
+            samples = list(self.read())
+        except Exception:
+            # e.g. the pool it reports on isn't running
+            samples = []
+        for values, value in samples:
+            lines.append(f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}")
+        return lines
+
+
+_metrics: list[Counter | Histogram | Gauge] = []
+
+
+def _register(metric: Any) -> Any:
+    _metrics.append(metric)
+    return metric
+
+
+def register_gauge(name: str, help: str, read: GaugeReader, labels: Labels = ()) -> None:
+    _register(Gauge(name, help, read, labels))
+
+
+def register_counter(name: str, help: str, labels: Labels = ()) -> Counter:
+    return _register(Counter(name, help, labels))
+
+
+def render_metrics() -> str:
+    lines: list[str] = []
+    for metric in _metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+HTTP_REQUESTS = _register(
+    Histogram("proofflow_http_request_duration_seconds", "Time to answer HTTP requests, by route template.", ("method", "route", "status"))
+)
+IMAGE_STAGES = _register(
+    Histogram("proofflow_image_stage_duration_seconds", "Time per stage of rendering an image's variants.", ("stage",))
+)
+MONGO_COMMANDS = _register(
+    Histogram(
+        "proofflow_mongo_command_duration_seconds",
+        "MongoDB command round trips as seen by the driver.",
+        ("command", "collection", "outcome"),
+    )
+)
+
+_in_flight = 0
+register_gauge("proofflow_http_requests_in_flight", "HTTP requests being answered.", lambda: [((), _in_flight)])
+
+
+def _threadpool() -> list[tuple[Labels, float]]:
+    stats = anyio.to_thread.current_default_thread_limiter().statistics()
+    return [(("busy",), stats.borrowed_tokens), (("limit",), stats.total_tokens), (("waiting",), stats.tasks_waiting)]
+
+
+register_gauge("proofflow_threadpool_threads", "Threadpool for sync code: busy threads, limit, callers waiting.", _threadpool, ("state",))
+
+# (threshold_ms, hook(method, route, started, finished, seconds)); started/finished are time.monotonic()
+SlowRequestHook = Callable[[str, str, float, float, float], None]
+_slow_request_hook: tuple[float, SlowRequestHook] | None = None
+
+
+def set_slow_request_hook(threshold_ms: float, hook: SlowRequestHook | None) -> None:
+    """Have ``hook`` called after every request that took at least ``threshold_ms``; None removes it."""
+    global _slow_request_hook
+    _slow_request_hook = None if hook is None else (threshold_ms, hook)
+
+
+class StageTimer:
+    """Accumulates wall time per named stage: each ``lap(stage)`` charges the time since the previous lap."""
+
+    def __init__(self) -> None:
+        self.timings: dict[str, float] = {}
+        self._last = time.perf_counter()
+
+    def lap(self, stage: str) -> None:
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self._last
+        self._last = now
+
+
+def observe_stages(timings: dict[str, float]) -> None:
+    for stage, seconds in timings.items():
+        IMAGE_STAGES.observe(seconds, stage)
+
+
+def route_label(scope: Scope) -> str:
+    # the template, never the raw path: ids in paths would make every request its own series
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Times every HTTP request, and hands slow ones to the slow request hook if one is set."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        global _in_flight
+        method = scope["method"]
+        _in_flight += 1
+        status_code = 500
+        started = time.monotonic()
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _in_flight -= 1
+            finished = time.monotonic()
+            elapsed = finished - started
+            route = route_label(scope)
+            HTTP_REQUESTS.observe(elapsed, method, route, str(status_code))
+            hook = _slow_request_hook
+            if hook is not None and elapsed * 1000 >= hook[0]:
+                hook[1](method, route, started, finished, elapsed)
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Feeds driver command timings into MONGO_COMMANDS."""
+
+    def __init__(self) -> None:
+        self._collections: dict[tuple[Any, int], str] = {}
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        target = event.command.get(event.command_name)
+        if not isinstance(target, str):
+            # getMore names its collection separately
+            target = event.command.get("collection")
+        self._collections[(event.connection_id, event.request_id)] = target if isinstance(target, str) else ""
+
+    def _finish(self, event: Any, outcome: str) -> None:
+        collection = self._collections.pop((event.connection_id, event.request_id), "")
+        MONGO_COMMANDS.observe(event.duration_micros / 1_000_000, event.command_name, collection, outcome)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self._finish(event, "ok")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self._finish(event, "error")
@@ -1,8 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, Callable, TypeVar
 
 from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
@@ -10,11 +13,14 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 
 from backend.app.core.config import Settings, get_settings
+from backend.app.utils.metrics import register_gauge
 
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 bearer = HTTPBearer(auto_error=False)
 
+T = TypeVar("T")
+
 
 def hash_password(password: str) -> str:
     return pwd_context.hash(password)
@@ -24,6 +30,143 @@ def verify_password(password: str, password_hash: str) -> bool:
     return pwd_context.verify(password, password_hash)
 
 
+class HashingPool:
+    """Small dedicated executor for bcrypt with admission control.
+
+    bcrypt releases the GIL, so threads are enough; what matters is that its ~250ms calls never
+    run on the event loop and that a burst of logins is shed instead of queueing without bound.
+    """
+
+    def __init__(self, workers: int, max_pending: int) -> None:
+        self.max_pending = max_pending
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="bcrypt")
+
+    async def run(self, fn: Callable[..., T], *args: Any) -> T:
+        if self.pending >= self.max_pending:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Server busy, try again shortly",
+                headers={"Retry-After": "1"},
+            )
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, fn, *args)
+        finally:
+            self.pending -= 1
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_hashing_pool: HashingPool | None = None
+
+
+def get_hashing_pool() -> HashingPool:
+    global _hashing_pool
+    if _hashing_pool is None:
+        settings = get_settings()
+        _hashing_pool = HashingPool(settings.password_hash_workers, settings.password_hash_max_pending)
+    return _hashing_pool
+
+
+def shutdown_hashing_pool() -> None:
+    global _hashing_pool
+    if _hashing_pool is not None:
+        _hashing_pool.shutdown()
+    _hashing_pool = None
+
+
+register_gauge(
+    "proofflow_password_hash_pending",
+    "bcrypt calls queued or running.",
+    lambda: [((), _hashing_pool.pending if _hashing_pool is not None else 0)],
+)
+
+
+async def hash_password_async(password: str) -> str:
+    return await get_hashing_pool().run(hash_password, password)
+
+
+async def verify_password_async(password: str, password_hash: str) -> bool:
+    return await get_hashing_pool().run(verify_password, password, password_hash)
+
+
+class FailureLimiter:
+    """Sliding-window count of failed attempts per key (e.g. per share).
+
+    Attempts still being verified count against the limit too, so parallel requests can't all pass
+    before the first failure is recorded.
+    """
+
+    def __init__(self, max_failures: int, window_seconds: float, max_keys: int = 100_000) -> None:
+        self.max_failures = max_failures
+        self.window = window_seconds
+        self.max_keys = max_keys
+        self._failures: OrderedDict[str, deque[float]] = OrderedDict()
+        self._in_flight: dict[str, int] = {}
+
+    def _recent(self, key: str, now: float) -> deque[float] | None:
+        hits = self._failures.get(key)
+        if hits is None:
+            return None
+        while hits and hits[0] <= now - self.window:
+            hits.popleft()
+        if not hits:
+            del self._failures[key]
+            return None
+        return hits
+
+    def acquire(self, key: str) -> None:
+        """Reserve an attempt for ``key``; hand it back with ``release`` once it is decided.
+
+        Raises 429 while failures in the current window plus attempts in flight reach the limit.
+        """
+        now = time.monotonic()
+        hits = self._recent(key, now)
+        in_flight = self._in_flight.get(key, 0)
+        if (len(hits) if hits is not None else 0) + in_flight >= self.max_failures:
+            # blocked by attempts in flight only: those are decided within moments
+            retry_after = max(1, int(hits[0] + self.window - now) + 1) if hits else 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many attempts, try again later",
+                headers={"Retry-After": str(retry_after)},
+            )
+        self._in_flight[key] = in_flight + 1
+
+    def release(self, key: str) -> None:
+        remaining = self._in_flight.get(key, 0) - 1
+        if remaining > 0:
+            self._in_flight[key] = remaining
+        else:
+            self._in_flight.pop(key, None)
+
+    def record_failure(self, key: str) -> None:
+        now = time.monotonic()
+        hits = self._recent(key, now)
+        if hits is None:
+            hits = self._failures[key] = deque()
+        hits.append(now)
+        self._failures.move_to_end(key)
+        while len(self._failures) > self.max_keys:
+            self._failures.popitem(last=False)
+
+    def reset(self, key: str) -> None:
+        self._failures.pop(key, None)
+
+
+_share_auth_limiter: FailureLimiter | None = None
+
+
+def get_share_auth_limiter() -> FailureLimiter:
+    global _share_auth_limiter
+    if _share_auth_limiter is None:
+        settings = get_settings()
+        _share_auth_limiter = FailureLimiter(settings.share_auth_max_failures, settings.share_auth_window_seconds)
+    return _share_auth_limiter
+
+
 def require_admin(request: Request, settings: Settings = Depends(get_settings)) -> None:
     token = request.headers.get("X-Admin-Token")
     if not token or token != settings.admin_token:
@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import base64
+import hashlib
+import hmac
+import time
+from functools import lru_cache
+from urllib.parse import urlencode
+
+from backend.app.core.config import Settings
+
+
+@lru_cache
+def _media_hmac(secret: str) -> hmac.HMAC:
+    # derived so a media signature can never double as a share JWT signature
+    key = hmac.new(secret.encode("utf-8"), b"proofflow:media-url:v1", hashlib.sha256).digest()
+    return hmac.new(key, digestmod=hashlib.sha256)
+
+
+def _sign(settings: Settings, *parts: str | int) -> str:
+    # copying the keyed state skips re-deriving the HMAC pads for every URL of a listing
+    mac = _media_hmac(settings.jwt_secret).copy()
+    mac.update("\n".join(str(p) for p in parts).encode("utf-8"))
+    return base64.urlsafe_b64encode(mac.digest()[:16]).rstrip(b"=").decode("ascii")
+
+
+def media_signature(settings: Settings, variant: str, image_id: str, expires: int, key: str) -> str:
+    return _sign(settings, variant, image_id, key, expires)
+
+
+def media_url_expiry(settings: Settings, cap: int | None = None) -> int:
+    """Expiry for URLs minted now, rounded to whole TTL windows.
+
+    Every URL minted within one window is byte-identical, so browsers and proxies can reuse
+    cached responses across sessions; a URL stays valid for one to two TTLs.
+    """
+    ttl = settings.media_url_ttl_seconds
+    expires = (int(time.time()) // ttl + 2) * ttl
+    return min(expires, cap) if cap is not None else expires
+
+
+def _media_query(settings: Settings, variant: str, image_id: str, expires: int, key: str | None) -> str:
+    key = key or image_id
+    signature = media_signature(settings, variant, image_id, expires, key)
+    # ids, hex keys and base64url signatures need no escaping; this runs thrice per listed image
+    if key != image_id:
+        return f"e={expires}&k={key}&s={signature}"
+    return f"e={expires}&s={signature}"
+
+
+def signed_media_url(settings: Settings, variant: str, image_id: str, expires: int, key: str | None = None) -> str:
+    """``key`` is the image's storage key; signed along so the files resolve without a lookup."""
+    return f"/media/{variant}/{image_id}?{_media_query(settings, variant, image_id, expires, key)}"
+
+
+def signed_tiles_url(settings: Settings, image_id: str, expires: int, key: str | None = None) -> str:
+    """Deep zoom descriptor of an image; viewers append its query string to every tile they fetch."""
+    return f"/media/tiles/{image_id}.dzi?{_media_query(settings, 'tiles', image_id, expires, key)}"
+
+
+def verify_media_signature(
+    settings: Settings, variant: str, image_id: str, expires: int, key: str, signature: str
+) -> bool:
+    if expires <= time.time():
+        return False
+    expected = media_signature(settings, variant, image_id, expires, key)
+    return hmac.compare_digest(expected, signature)
+
+
+def _sprite_fields(cursor: str | None, limit: int, tile: int, expires: int, order: str) -> tuple[str | int, ...]:
+    # the listing order only takes part when set, so default-order URLs keep their form
+    return (cursor or "", limit, tile, expires, *((order,) if order else ()))
+
+
+def signed_sprite_url(
+    settings: Settings,
+    share_id: str,
+    fingerprint: str,
+    cursor: str | None,
+    limit: int,
+    tile: int,
+    expires: int,
+    order: str = "",
+) -> str:
+    """Sprite sheet of one share page; carries the page so an evicted sheet can be rebuilt."""
+    signature = _sign(settings, "sprite", share_id, fingerprint, *_sprite_fields(cursor, limit, tile, expires, order))
+    params: dict[str, str | int] = {"n": limit, "t": tile, "e": expires, "s": signature}
+    if cursor:
+        params["c"] = cursor
+    if order:
+        params["o"] = order
+    return f"/media/sprite/{share_id}/{fingerprint}?{urlencode(params)}"
+
+
+def verify_sprite_signature(
+    settings: Settings,
+    share_id: str,
+    fingerprint: str,
+    cursor: str | None,
+    limit: int,
+    tile: int,
+    expires: int,
+    signature: str,
+    order: str = "",
+) -> bool:
+    if expires <= time.time():
+        return False
+    expected = _sign(settings, "sprite", share_id, fingerprint, *_sprite_fields(cursor, limit, tile, expires, order))
+    return hmac.compare_digest(expected, signature)
@@ -0,0 +1,106 @@
+"""Image listing serialization: pydantic response_model path vs the orjson path.
+
+    python -m backend.benchmarks.listing [--images 10000] [--repeat 5]
+
+Needs no database: serializes synthetic image documents the way the listing endpoints do. Prints one
+JSON object per path with timings in milliseconds, plus the speedup.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable
+
+from pydantic import TypeAdapter
+
+os.environ.setdefault("ADMIN_TOKEN", "benchmark")
+os.environ.setdefault("JWT_SECRET", "benchmark")
+
+from backend.app.core.config import get_settings  # noqa: E402
+from backend.app.models import ImageOut, ImagePageOut  # noqa: E402
+from backend.app.services.galleries import encode_image_page, image_item  # noqa: E402
+from backend.app.utils.signing import media_url_expiry  # noqa: E402
+
+
+def synthetic_docs(count: int, album_id: str | None = None, subfolder_id: str | None = None) -> list[dict[str, Any]]:
+    album_id, subfolder_id = album_id or uuid.uuid4().hex, subfolder_id or uuid.uuid4().hex
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    return [
+        {
+            "id": uuid.uuid4().hex,
+            "album_id": album_id,
+            "subfolder_id": subfolder_id,
+            "filename": f"IMG_{i:05d}.JPG",
+            "width": 6000,
+            "height": 4000,
+            "created_at": start + timedelta(seconds=i),
+            "storage_key": uuid.uuid4().hex + uuid.uuid4().hex,
+            "status": "ready",
+            "blurhash": "LEHV6nWB2yk8pyo0adR*.7kCMdnj",
+            "dominant_color": "#7a6152",
+        }
+        for i in range(count)
+    ]
+
+
+def pydantic_path(docs: list[dict[str, Any]], expires: int) -> bytes:
+    # What response_model=ImagePageOut costs: build the models, then FastAPI validates and
+    # serializes them again before JSONResponse encodes the result with the json module.
+    settings = get_settings()
+    page = ImagePageOut(items=[ImageOut(**image_item(d, settings, expires)) for d in docs], next_cursor=None)
+    adapter = TypeAdapter(ImagePageOut)
+    data = adapter.dump_python(adapter.validate_python(page, from_attributes=True), mode="json")
+    return json.dumps(data, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def orjson_path(docs: list[dict[str, Any]], expires: int) -> bytes:
+    return encode_image_page(docs, None, get_settings(), expires)
+
+
+def measure(fn: Callable[[list[dict[str, Any]], int], bytes], docs: list[dict[str, Any]], expires: int, repeat: int) -> dict[str, Any]:
+    fn(docs[:100], expires)  # warm up
+    timings = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        body = fn(docs, expires)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return {
+        "min_ms": round(min(timings), 2),
+        "median_ms": round(statistics.median(timings), 2),
+        "max_ms": round(max(timings), 2),
+        "bytes": len(body),
+    }
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.listing", description=__doc__.splitlines()[0])
+    parser.add_argument("--images", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    docs = synthetic_docs(args.images)
+    expires = media_url_expiry(get_settings())
+    if json.loads(pydantic_path(docs[:50], expires)) != json.loads(orjson_path(docs[:50], expires)):
+        sys.exit("orjson output differs from the pydantic response")
+
+    before = measure(pydantic_path, docs, expires, args.repeat)
+    after = measure(orjson_path, docs, expires, args.repeat)
+    result = {
+        "benchmark": "listing_serialization",
+        "images": args.images,
+        "pydantic": before,
+        "orjson": after,
+        "speedup": round(before["median_ms"] / after["median_ms"], 2),
+    }
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
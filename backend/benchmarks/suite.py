@@ -0,0 +1,466 @@
+"""End-to-end benchmarks of the hot paths: bulk upload and variant rendering, image listings, media serving.
+
+    python -m backend.benchmarks.suite [--mongodb-uri mongodb://localhost:27017] [--megapixels 2,12,24]
+                                       [--output result.json] [--baseline previous.json]
+
+The app runs in-process (httpx over ASGI, startup/shutdown included) against a scratch database on a
+local mongod, or against mongomock-motor when no --mongodb-uri is given; files go to a temporary
+STORAGE_PATH. JPEG corpora are generated from a fixed seed. The result is one JSON document per run,
+meant to be kept and diffed between releases; --baseline adds the change against an earlier one.
+Scenarios that got unexpected responses are marked invalid, left out of the comparison, and fail the run.
+Extra dependencies: pip install -r backend/benchmarks/requirements.txt
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable
+
+from PIL import Image
+
+from backend.benchmarks.listing import synthetic_docs
+
+
+ADMIN_TOKEN = "benchmark-admin"
+SHARE_PASSWORD = "benchmark"
+PAGE_SIZE = 200
+
+
+def synthetic_jpeg(megapixels: float, seed: int, quality: int = 90) -> bytes:
+    """A 3:2 photo-sized JPEG with smooth, photo-like detail; distinct seeds give distinct content."""
+    width = round(math.sqrt(megapixels * 1_000_000 * 1.5))
+    height = round(width / 1.5)
+    rng = random.Random(seed)
+    # upscaled noise compresses roughly like real photos, unlike flat colors
+    base = Image.frombytes("RGB", (96, 64), rng.randbytes(96 * 64 * 3)).resize((width, height), Image.Resampling.BICUBIC)
+    grain = Image.frombytes("L", (width // 4, height // 4), rng.randbytes((width // 4) * (height // 4)))
+    img = Image.blend(base, Image.merge("RGB", [grain.resize((width, height))] * 3), 0.15)
+    out = io.BytesIO()
+    img.save(out, "JPEG", quality=quality)
+    return out.getvalue()
+
+
+def _percentile(ordered: list[float], q: float) -> float:
+    # nearest rank
+    return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+
+def latency_summary(samples: list[float]) -> dict[str, float]:
+    ordered = sorted(samples)
+    if not ordered:
+        return {}
+    return {
+        "mean": round(sum(ordered) / len(ordered), 3),
+        "p50": round(_percentile(ordered, 50), 3),
+        "p90": round(_percentile(ordered, 90), 3),
+        "p95": round(_percentile(ordered, 95), 3),
+        "p99": round(_percentile(ordered, 99), 3),
+        "max": round(ordered[-1], 3),
+    }
+
+
+def _vm_hwm_mb(pid: int | str) -> float | None:
+    # peak resident set size of a process, Linux only
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        return None
+    return None
+
+
+def _descendants(pid: int) -> list[int]:
+    # image workers are forkserver children, i.e. grandchildren of this process
+    parents: dict[int, list[int]] = {}
+    for entry in os.listdir("/proc") if os.path.isdir("/proc") else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat") as f:
+                ppid = int(f.read().rsplit(")", 1)[1].split()[1])
+        except (OSError, IndexError, ValueError):
+            continue
+        parents.setdefault(ppid, []).append(int(entry))
+    found, todo = [], [pid]
+    while todo:
+        for child in parents.get(todo.pop(), []):
+            found.append(child)
+            todo.append(child)
+    return found
+
+
+def peak_rss() -> dict[str, float | None]:
+    server = _vm_hwm_mb("self")
+    if server is None:
+        usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        server = round(usage / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+    workers = [mb for mb in (_vm_hwm_mb(pid) for pid in _descendants(os.getpid())) if mb is not None]
+    return {"server_mb": server, "worker_max_mb": max(workers, default=None)}
+
+
+async def run_requests(
+    count: int,
+    concurrency: int,
+    send: Callable[[int], Awaitable[bool]],
+    warmup: int = 0,
+) -> dict[str, Any]:
+    """Call ``send(i)`` ``count`` times, ``concurrency`` at a time; ``send`` returns whether the response was the expected one."""
+    for i in range(warmup):
+        await send(i)
+    latencies: list[float] = []
+    errors = 0
+    next_index = iter(range(count))
+
+    async def worker() -> None:
+        nonlocal errors
+        for i in next_index:
+            t0 = time.perf_counter()
+            ok = await send(i)
+            latencies.append((time.perf_counter() - t0) * 1000)
+            errors += not ok
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(max(1, concurrency))))
+    elapsed = time.perf_counter() - started
+    return {
+        "requests": count,
+        "errors": errors,
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 3),
+        "throughput_per_s": round(count / elapsed, 2) if elapsed else None,
+        "latency_ms": latency_summary(latencies),
+    }
+
+
+class Suite:
+    def __init__(self, client: Any, args: argparse.Namespace) -> None:
+        self.client = client
+        self.args = args
+        self.admin = {"X-Admin-Token": ADMIN_TOKEN}
+        self.results: list[dict[str, Any]] = []
+
+    def record(self, name: str, params: dict[str, Any], stats: dict[str, Any]) -> None:
+        # timings of unexpected responses measure the error path, not the scenario
+        valid = not stats.get("errors")
+        self.results.append({"name": name, "params": params, "valid": valid, **stats})
+        flag = "" if valid else f" INVALID: {stats['errors']}/{stats.get('requests')} unexpected responses"
+        print(f"{name}: {stats.get('throughput_per_s')}/s p50={stats.get('latency_ms', {}).get('p50')}ms{flag}", file=sys.stderr)
+
+    async def _post(self, path: str, body: dict[str, Any]) -> dict[str, Any]:
+        r = await self.client.post(path, json=body, headers=self.admin)
+        r.raise_for_status()
+        return r.json()
+
+    async def album(self, name: str) -> tuple[str, str]:
+        album = await self._post("/api/admin/albums", {"name": name})
+        sub = await self._post("/api/admin/subfolders", {"album_id": album["id"], "name": "bench"})
+        return album["id"], sub["id"]
+
+    async def share(self, album_id: str) -> tuple[str, dict[str, str]]:
+        share = await self._post("/api/admin/shares", {"album_id": album_id, "password": SHARE_PASSWORD})
+        r = await self.client.post(f"/api/shares/{share['id']}/auth", json={"password": SHARE_PASSWORD})
+        r.raise_for_status()
+        return share["id"], {"Authorization": f"Bearer {r.json()['token']}"}
+
+    async def wait_rendered(self, album_id: str) -> dict[str, Any]:
+        deadline = time.monotonic() + self.args.render_timeout
+        while True:
+            r = await self.client.get("/api/admin/processing", params={"album_id": album_id}, headers=self.admin)
+            status = r.json()
+            if not status["processing"]:
+                return status
+            if time.monotonic() > deadline:
+                raise SystemExit(f"rendering did not finish within {self.args.render_timeout}s: {status}")
+            await asyncio.sleep(0.05)
+
+    async def upload(self, megapixels: float) -> list[str]:
+        """bulk_upload of one corpus, then background rendering until every image is ready."""
+        from backend.app.db import get_db
+        from backend.app.services.blobs import RENDER_JOB
+        from backend.app.services.engine import start_engine, stop_engine
+
+        args = self.args
+        # fresh worker processes, so their peak RSS belongs to this corpus alone
+        stop_engine()
+        start_engine()
+        album_id, subfolder_id = await self.album(f"upload-{megapixels}mp-{uuid.uuid4().hex[:6]}")
+        seed0 = int(megapixels * 1000) * 100_000
+        corpus = [synthetic_jpeg(megapixels, seed0 + i) for i in range(args.uploads)]
+        path = f"/api/admin/upload?album_id={album_id}&subfolder_id={subfolder_id}"
+        ids: list[str] = []
+
+        async def send(i: int) -> bool:
+            files = [("files", (f"IMG_{i:05d}.jpg", corpus[i], "image/jpeg"))]
+            r = await self.client.post(path, files=files, headers=self.admin)
+            ok = r.status_code == 200 and not r.json()["errors"]
+            if ok:
+                ids.extend(img["id"] for img in r.json()["images"])
+            return ok
+
+        params = {"megapixels": megapixels, "images": args.uploads, "mean_file_mb": round(sum(map(len, corpus)) / len(corpus) / 2**20, 2)}
+        stats = await run_requests(args.uploads, args.upload_concurrency, send)
+        stats["throughput_mb_per_s"] = round(sum(map(len, corpus)) / 2**20 / stats["duration_s"], 2)
+        self.record("upload", params, stats)
+
+        started = time.perf_counter()
+        status = await self.wait_rendered(album_id)
+        elapsed = time.perf_counter() - started
+        # queue-to-done time per image, from the render jobs themselves
+        keys = [d["storage_key"] async for d in get_db().images.find({"id": {"$in": ids}}, {"_id": 0, "storage_key": 1})]
+        jobs = get_db().jobs.find({"kind": RENDER_JOB, "key": {"$in": keys}, "state": "done"}, {"_id": 0, "created_at": 1, "finished_at": 1})
+        latencies = [(j["finished_at"] - j["created_at"]).total_seconds() * 1000 async for j in jobs]
+        self.record(
+            "render",
+            params,
+            {
+                "images": len(ids),
+                "failed": status["failed"],
+                "duration_s": round(elapsed, 3),
+                "throughput_per_s": round(len(ids) / elapsed, 2) if elapsed else None,
+                "latency_ms": latency_summary(latencies),
+                "peak_rss": peak_rss(),
+            },
+        )
+        return ids
+
+    async def listings(self) -> None:
+        from backend.app.db import get_db
+        from backend.app.services.galleries import bump_versions, get_manifest_cache
+
+        args = self.args
+        album_id, subfolder_id = await self.album(f"listing-{uuid.uuid4().hex[:6]}")
+        docs = synthetic_docs(args.listing_images, album_id, subfolder_id)
+        await get_db().images.insert_many(docs)
+        await bump_versions([(album_id, subfolder_id)])
+        share_id, share_auth = await self.share(album_id)
+        params = {"images": args.listing_images, "limit": PAGE_SIZE}
+
+        def pager(path: str, headers: dict[str, str], base: dict[str, str] | None = None) -> Callable[[int], Awaitable[bool]]:
+            # walks the pages in order, starting over after the last one
+            cursor: list[str | None] = [None]
+
+            async def send(_: int) -> bool:
+                # all of the query goes in params: httpx replaces a query string in the URL with them
+                query = {**(base or {}), "limit": PAGE_SIZE, **({"cursor": cursor[0]} if cursor[0] else {})}
+                r = await self.client.get(path, params=query, headers=headers)
+                if r.status_code != 200:
+                    return False
+                cursor[0] = r.json()["next_cursor"]
+                return True
+
+            return send
+
+        scope = {"album_id": album_id, "subfolder_id": subfolder_id}
+        stats = await run_requests(args.requests, args.concurrency, pager("/api/admin/images", self.admin, scope), warmup=args.warmup)
+        self.record("list_images", params, stats)
+
+        share_path = f"/api/shares/{share_id}/images"
+        manifests = get_manifest_cache()
+        cold = pager(share_path, share_auth)
+
+        async def send_cold(i: int) -> bool:
+            manifests.clear()
+            return await cold(i)
+
+        self.record("list_share_images_uncached", params, await run_requests(args.requests, 1, send_cold, warmup=args.warmup))
+        stats = await run_requests(args.requests, args.concurrency, pager(share_path, share_auth), warmup=args.warmup)
+        self.record("list_share_images_cached", params, stats)
+
+        # first page only: revalidation of the page a gallery opens on
+        etag = (await self.client.get(share_path, params={"limit": PAGE_SIZE}, headers=share_auth)).headers["etag"]
+
+        async def send_304(_: int) -> bool:
+            r = await self.client.get(share_path, params={"limit": PAGE_SIZE}, headers={**share_auth, "If-None-Match": etag})
+            return r.status_code == 304
+
+        self.record("list_share_images_304", params, await run_requests(args.requests, args.concurrency, send_304, warmup=args.warmup))
+
+    async def media(self, image_ids: list[str]) -> None:
+        from backend.app.db import get_db
+
+        args = self.args
+        if not image_ids:
+            return
+        album_id = (await get_db().images.find_one({"id": image_ids[0]}, {"_id": 0, "album_id": 1}))["album_id"]
+        _, share_auth = await self.share(album_id)
+        accept = {"Accept": "image/avif,image/webp,image/*"}
+        params = {"images": len(image_ids)}
+
+        def fetch(url_for: Callable[[int], str], headers: dict[str, str]) -> Callable[[int], Awaitable[bool]]:
+            async def send(i: int) -> bool:
+                r = await self.client.get(url_for(i), headers={**accept, **headers})
+                return r.status_code == 200
+
+            return send
+
+        def thumb(i: int) -> str:
+            return f"/media/thumb/{image_ids[i % len(image_ids)]}"
+
+        for name, headers in (("media_thumb_admin", self.admin), ("media_thumb_share", share_auth)):
+            stats = await run_requests(args.requests, args.concurrency, fetch(thumb, headers), warmup=args.warmup)
+            self.record(name, params, stats)
+
+        r = await self.client.get("/api/admin/images", params={"album_id": album_id, "limit": len(image_ids)}, headers=self.admin)
+        signed = [item["thumb_url"] for item in r.json()["items"]]
+        stats = await run_requests(args.requests, args.concurrency, fetch(lambda i: signed[i % len(signed)], {}), warmup=args.warmup)
+        self.record("media_thumb_signed", params, stats)
+
+
+def in_memory_client(*args: Any, **kwargs: Any) -> Any:
+    """Stand-in for AsyncIOMotorClient keeping everything in memory (mongomock-motor)."""
+    try:
+        import mongomock.collection
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit("in-memory mode needs mongomock-motor (see backend/benchmarks/requirements.txt), or pass --mongodb-uri")
+
+    find_and_modify = mongomock.collection.Collection._find_and_modify
+    if not getattr(find_and_modify, "_proofflow_patched", False):
+        # mongomock finds nothing for find_one_and_update(..., projection={"_id": 0}), which the job queue
+        # and blob store rely on; apply the projection after the fact instead
+        def _find_and_modify(self: Any, query: Any, projection: Any = None, *a: Any, **k: Any) -> Any:
+            doc = find_and_modify(self, query, None, *a, **k)
+            if doc is not None and projection and projection.get("_id") == 0:
+                doc.pop("_id", None)
+            return doc
+
+        _find_and_modify._proofflow_patched = True  # type: ignore[attr-defined]
+        mongomock.collection.Collection._find_and_modify = _find_and_modify
+    return AsyncMongoMockClient(*args, tz_aware=True, **kwargs)
+
+
+def _git_revision() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, cwd=Path(__file__).parent, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return None
+    return out.stdout.strip() or None
+
+
+def compare(result: dict[str, Any], baseline: dict[str, Any]) -> None:
+    """Attach, per scenario, the relative change against the same scenario of ``baseline``."""
+    previous = {(s["name"], json.dumps(s["params"], sort_keys=True)): s for s in baseline.get("scenarios", [])}
+    for scenario in result["scenarios"]:
+        old = previous.get((scenario["name"], json.dumps(scenario["params"], sort_keys=True)))
+        if old is None or not scenario.get("valid", True) or not old.get("valid", True):
+            continue
+        change: dict[str, float] = {}
+        for key, new_value, old_value in (
+            ("throughput_per_s", scenario.get("throughput_per_s"), old.get("throughput_per_s")),
+            ("latency_p50", scenario.get("latency_ms", {}).get("p50"), old.get("latency_ms", {}).get("p50")),
+            ("latency_p99", scenario.get("latency_ms", {}).get("p99"), old.get("latency_ms", {}).get("p99")),
+        ):
+            if new_value is not None and old_value:
+                change[key] = round((new_value - old_value) / old_value * 100, 1)
+        scenario["change_pct"] = change
+
+
+async def run(args: argparse.Namespace) -> dict[str, Any]:
+    import httpx
+
+    from backend.app.core.config import get_settings
+    from backend.app.main import app
+
+    settings = get_settings()
+    suite_started = datetime.now(timezone.utc)
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            suite = Suite(client, args)
+            uploaded: list[str] = []
+            for megapixels in args.megapixels:
+                uploaded = await suite.upload(megapixels)
+            await suite.listings()
+            # thumbnails of the last (largest) corpus
+            await suite.media(uploaded)
+        if args.mongodb_uri:
+            from backend.app.db import get_db
+
+            await get_db().client.drop_database(settings.database_name)
+
+    return {
+        "benchmark": "proofflow_suite",
+        "version": 1,
+        "started_at": suite_started.isoformat(),
+        "environment": {
+            "git_revision": _git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "database": "mongod" if args.mongodb_uri else "in-memory",
+            "image_workers": settings.image_workers or os.cpu_count(),
+            "variant_formats": settings.parsed_variant_formats(),
+        },
+        "scenarios": suite.results,
+    }
+
+
+def _megapixels(raw: str) -> list[float]:
+    return [float(v) for v in raw.split(",") if v.strip()]
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.suite", description=__doc__.splitlines()[0])
+    parser.add_argument("--mongodb-uri", help="local mongod to use (a scratch database is created and dropped); in-memory if omitted")
+    parser.add_argument("--megapixels", type=_megapixels, default=[2.0, 12.0, 24.0], help="corpus sizes, comma-separated")
+    parser.add_argument("--uploads", type=int, default=12, help="images per corpus")
+    parser.add_argument("--upload-concurrency", type=int, default=4)
+    parser.add_argument("--listing-images", type=int, default=5000)
+    parser.add_argument("--requests", type=int, default=300, help="requests per listing/media scenario")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("--render-timeout", type=float, default=900.0)
+    parser.add_argument("--output", type=Path, help="write the JSON result here instead of stdout")
+    parser.add_argument("--baseline", type=Path, help="earlier result to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="proofflow-bench-") as storage:
+        # must be in place before the app reads its settings
+        os.environ.update(
+            {
+                "ADMIN_TOKEN": ADMIN_TOKEN,
+                "JWT_SECRET": uuid.uuid4().hex,
+                "STORAGE_PATH": storage,
+                "DATABASE_NAME": f"proofflow_bench_{uuid.uuid4().hex[:8]}",
+                "PUBLIC_BASE_URL": "http://bench",
+            }
+        )
+        if args.mongodb_uri:
+            os.environ["MONGODB_URI"] = args.mongodb_uri
+        else:
+            import backend.app.db
+
+            backend.app.db.AsyncIOMotorClient = in_memory_client
+        result = asyncio.run(run(args))
+
+    if args.baseline:
+        compare(result, json.loads(args.baseline.read_text()))
+    text = json.dumps(result, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n")
+    else:
+        print(text)
+    invalid = [s["name"] for s in result["scenarios"] if not s["valid"]]
+    if invalid:
+        raise SystemExit(f"scenarios with unexpected responses: {', '.join(invalid)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from pathlib import Path
+
+import pytest
+
+from backend.app.services.engine import VariantEngine
+
+
+def _hold(marker: str, seconds: float) -> None:
+    Path(marker).touch()
+    time.sleep(seconds)
+
+
+async def _wait_for_file(path: Path, timeout: float = 30.0) -> None:
+    deadline = time.monotonic() + timeout
+    while not path.exists():
+        assert time.monotonic() < deadline, "worker never started"
+        await asyncio.sleep(0.01)
+
+
+def test_cancelled_task_keeps_memory_until_worker_returns(tmp_path: Path) -> None:
+    marker = tmp_path / "started"
+
+    async def scenario() -> None:
+        engine = VariantEngine(workers=1, memory_budget=100)
+        try:
+            task = asyncio.create_task(engine.run(_hold, str(marker), 1.0, memory=100))
+            await _wait_for_file(marker)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            # the worker is still running the task
+            assert engine.budget.used == 100
+            assert engine.pending == 1
+            waiter = asyncio.create_task(engine.budget.acquire(1))
+            await asyncio.sleep(0.1)
+            assert not waiter.done()
+
+            assert await asyncio.wait_for(waiter, timeout=10) == 1
+            assert engine.budget.used == 1
+            assert engine.pending == 0
+        finally:
+            engine.shutdown()
+
+    asyncio.run(scenario())
+
@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import asyncio
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from starlette.requests import Request
+
+from backend.app.core.config import Settings
+from backend.app.services.ingest import IngestedFile, ingest_multipart
+
+BOUNDARY = "testboundary"
+
+
+def _settings(tmp_path: Path) -> Settings:
+    return Settings(ADMIN_TOKEN="admin", JWT_SECRET="secret", STORAGE_PATH=str(tmp_path))
+
+
+def _part(name: str, filename: str, data: bytes) -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+        "Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + data + b"\r\n"
+
+
+def _request(body: bytes, chunk: int = 7) -> Request:
+    chunks = [body[i : i + chunk] for i in range(0, len(body), chunk)] or [b""]
+
+    async def receive() -> dict:
+        data = chunks.pop(0) if chunks else b""
+        return {"type": "http.request", "body": data, "more_body": bool(chunks)}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/api/admin/upload",
+        "headers": [(b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode())],
+    }
+    return Request(scope, receive)
+
+
+def _ingest(body: bytes, tmp_path: Path) -> list[IngestedFile]:
+    ids = iter(f"img{i}" for i in range(100))
+
+    async def collect() -> list[IngestedFile]:
+        parts: list[IngestedFile] = []
+        try:
+            async for part in ingest_multipart(_request(body), _settings(tmp_path), lambda: next(ids)):
+                assert isinstance(part, IngestedFile)
+                parts.append(part)
+        except BaseException:
+            # as bulk_upload does with parts it was handed before the error
+            for part in parts:
+                part.path.unlink(missing_ok=True)
+            raise
+        return parts
+
+    return asyncio.run(collect())
+
+
+def _staged(tmp_path: Path) -> list[Path]:
+    return [p for p in tmp_path.rglob("*") if p.is_file()]
+
+
+def test_complete_body_yields_files(tmp_path: Path) -> None:
+    body = _part("files", "a.jpg", b"a" * 100) + _part("files", "b.jpg", b"b" * 50) + f"--{BOUNDARY}--\r\n".encode()
+    parts = _ingest(body, tmp_path)
+    assert [(p.filename, p.size) for p in parts] == [("a.jpg", 100), ("b.jpg", 50)]
+    assert all(p.path.read_bytes() for p in parts)
+
+
+@pytest.mark.parametrize("closed", [False, True], ids=["mid-part", "before-closing-boundary"])
+def test_truncated_body_is_rejected(tmp_path: Path, closed: bool) -> None:
+    parts = _part("files", "a.jpg", b"a" * 100) + _part("files", "b.jpg", b"b" * 100)
+    body = parts if closed else parts[: len(parts) - 50]
+    with pytest.raises(HTTPException) as exc:
+        _ingest(body, tmp_path)
+    assert exc.value.status_code == 400
+    assert _staged(tmp_path) == []
+
+
+def test_empty_body_is_rejected(tmp_path: Path) -> None:
+    with pytest.raises(HTTPException) as exc:
+        _ingest(b"", tmp_path)
+    assert exc.value.status_code == 400
+
+
+def test_body_without_files_field_is_rejected(tmp_path: Path) -> None:
+    body = _part("other", "a.jpg", b"a" * 100) + f"--{BOUNDARY}--\r\n".encode()
+    with pytest.raises(HTTPException) as exc:
+        _ingest(body, tmp_path)
+    assert exc.value.status_code == 422
+    assert _staged(tmp_path) == []
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+import pytest
+from fastapi import HTTPException
+
+from backend.app.utils.security import FailureLimiter
+
+
+def test_attempts_in_flight_count_against_the_limit() -> None:
+    limiter = FailureLimiter(max_failures=3, window_seconds=60)
+    for _ in range(3):
+        limiter.acquire("share")
+    # parallel guesses: none of the first three has failed yet
+    with pytest.raises(HTTPException) as exc:
+        limiter.acquire("share")
+    assert exc.value.status_code == 429
+    limiter.acquire("other")
+
+
+def test_failures_keep_their_slots_after_release() -> None:
+    limiter = FailureLimiter(max_failures=2, window_seconds=60)
+    for _ in range(2):
+        limiter.acquire("share")
+    for _ in range(2):
+        limiter.release("share")
+        limiter.record_failure("share")
+    with pytest.raises(HTTPException):
+        limiter.acquire("share")
+
+
+def test_success_frees_the_slot() -> None:
+    limiter = FailureLimiter(max_failures=1, window_seconds=60)
+    limiter.acquire("share")
+    limiter.release("share")
+    limiter.reset("share")
+    limiter.acquire("share")
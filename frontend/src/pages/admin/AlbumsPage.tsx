@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import { api, type Album, type Image, type Subfolder } from "../../lib/api";
 import { adminMedia } from "../../lib/media";
 import { Button } from "../../ui/button";
@@ -13,12 +13,17 @@ export function AlbumsPage() {
   const [albums, setAlbums] = useState<Album[]>([]);
   const [subfolders, setSubfolders] = useState<Subfolder[]>([]);
   const [images, setImages] = useState<Image[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [albumId, setAlbumId] = useState<string>("");
   const [subfolderId, setSubfolderId] = useState<string | null>(null);
   const [newAlbumName, setNewAlbumName] = useState("");
   const [newSubName, setNewSubName] = useState("");
   const [loading, setLoading] = useState(false);
   const [viewer, setViewer] = useState<ViewerState>({ open: false, idx: 0 });
+  // bumped on every scope change so pages requested for the previous scope are dropped
+  const scopeRef = useRef(0);
+  const sentinelRef = useRef<HTMLDivElement>(null);
 
   const activeImage = images[viewer.idx];
 
@@ -51,6 +56,7 @@ export function AlbumsPage() {
     let live = true;
     setSubfolderId(null);
     setImages([]);
+    setNextCursor(null);
     api.admin
       .listSubfolders(albumId)
       .then((s) => {
@@ -65,19 +71,49 @@ export function AlbumsPage() {
 
   useEffect(() => {
     if (!albumId) return;
-    let live = true;
+    const scope = ++scopeRef.current;
+    setLoadingMore(false);
     api.admin
       .listImages(albumId, subfolderId)
-      .then((imgs) => {
-        if (!live) return;
-        setImages(imgs);
+      .then((page) => {
+        if (scope !== scopeRef.current) return;
+        setImages(page.items);
+        setNextCursor(page.next_cursor);
       })
       .catch((e) => push({ title: "Failed to load images", body: String(e.message || e) }));
-    return () => {
-      live = false;
-    };
   }, [albumId, subfolderId, push]);
 
+  function loadMore() {
+    if (!albumId || !nextCursor || loadingMore) return;
+    const scope = scopeRef.current;
+    setLoadingMore(true);
+    api.admin
+      .listImages(albumId, subfolderId, nextCursor)
+      .then((page) => {
+        if (scope !== scopeRef.current) return;
+        setImages((prev) => [...prev, ...page.items]);
+        setNextCursor(page.next_cursor);
+      })
+      .catch((e) => push({ title: "Failed to load images", body: String(e.message || e) }))
+      .finally(() => {
+        if (scope === scopeRef.current) setLoadingMore(false);
+      });
+  }
+
+  // infinite scroll: fetch the next page once the end of the grid comes into view
+  useEffect(() => {
+    const el = sentinelRef.current;
+    if (!el || !nextCursor) return;
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries.some((e) => e.isIntersecting)) loadMore();
+      },
+      { rootMargin: "600px" }
+    );
+    observer.observe(el);
+    return () => observer.disconnect();
+  });
+
   async function onCreateAlbum() {
     const name = newAlbumName.trim();
     if (!name) return;
@@ -114,6 +150,7 @@ export function AlbumsPage() {
       const next = Math.max(0, Math.min(images.length - 1, v.idx + delta));
       return { ...v, idx: next };
     });
+    if (viewer.idx + delta >= images.length - 1) loadMore();
   }
 
   return (
@@ -197,7 +234,8 @@ export function AlbumsPage() {
               <div style={{ flex: 1 }}>
                 <div className="pf-label">Images</div>
                 <div className="muted" style={{ fontSize: 12 }}>
-                  {images.length} items
+                  {images.length}
+                  {nextCursor ? "+" : ""} items
                 </div>
               </div>
               <div className="muted" style={{ fontSize: 12 }}>
@@ -222,6 +260,8 @@ export function AlbumsPage() {
                   ))}
                 </div>
               )}
+              <div ref={sentinelRef} />
+              {loadingMore ? <div className="muted" style={{ marginTop: 10 }}>Loading more…</div> : null}
             </div>
           </div>
         </div>
@@ -236,6 +276,7 @@ export function AlbumsPage() {
             </div>
             <span className="pf-kbd">
               {images.length ? viewer.idx + 1 : 0}/{images.length}
+              {nextCursor ? "+" : ""}
             </span>
           </div>
         }
@@ -253,7 +294,7 @@ export function AlbumsPage() {
                 <Button variant="ghost" onClick={() => step(-1)} disabled={viewer.idx <= 0}>
                   Prev
                 </Button>
-                <Button variant="ghost" onClick={() => step(1)} disabled={viewer.idx >= images.length - 1}>
+                <Button variant="ghost" onClick={() => step(1)} disabled={viewer.idx >= images.length - 1 && !nextCursor}>
                   Next
                 </Button>
                 <a
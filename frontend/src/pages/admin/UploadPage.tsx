@@ -94,7 +94,9 @@ export function UploadPage() {
           onProgress: (pct) =>
             setItems((prev) => prev.map((x) => (x.id === current.id ? { ...x, progress: pct } : x)))
         });
-        if (result.ok) {
+        // the endpoint answers {images, errors}: a file it rejects still comes back with a 200
+        const error = result.ok ? result.data.errors[0]?.detail : result.error || "Upload failed";
+        if (!error) {
           ok += 1;
           setItems((prev) =>
             prev.map((x) => (x.id === current.id ? { ...x, status: "success", progress: 100 } : x))
@@ -102,7 +104,7 @@ export function UploadPage() {
         } else {
           err += 1;
           setItems((prev) =>
-            prev.map((x) => (x.id === current.id ? { ...x, status: "error", message: result.error } : x))
+            prev.map((x) => (x.id === current.id ? { ...x, status: "error", message: error } : x))
           );
         }
       }
@@ -1,4 +1,4 @@
-import { useEffect, useMemo, useState } from "react";
+import { useEffect, useMemo, useRef, useState } from "react";
 import { useParams } from "react-router-dom";
 import { api, type Image, type ShareMeta } from "../../lib/api";
 import { shareMedia } from "../../lib/media";
@@ -16,9 +16,14 @@ export function ShareGallery() {
 
   const [meta, setMeta] = useState<ShareMeta | null>(null);
   const [images, setImages] = useState<Image[]>([]);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [password, setPassword] = useState("");
   const [phase, setPhase] = useState<"loading" | "password" | "gallery">("loading");
   const [viewer, setViewer] = useState<ViewerState>({ open: false, idx: 0 });
+  // bumped whenever the first page is (re)loaded so pages requested before are dropped
+  const scopeRef = useRef(0);
+  const sentinelRef = useRef<HTMLDivElement>(null);
 
   const activeImage = images[viewer.idx];
   const title = useMemo(() => meta?.title ?? "Client gallery", [meta]);
@@ -33,11 +38,14 @@ export function ShareGallery() {
         setMeta(m);
         const existing = getShareToken(shareId);
         if (existing) {
+          const scope = ++scopeRef.current;
           api.shares
             .listImages(shareId)
-            .then((imgs) => {
-              if (!live) return;
-              setImages(imgs);
+            .then((page) => {
+              if (!live || scope !== scopeRef.current) return;
+              setImages(page.items);
+              setNextCursor(page.next_cursor);
+              setLoadingMore(false);
               setPhase("gallery");
             })
             .catch(() => setPhase("password"));
@@ -64,15 +72,50 @@ export function ShareGallery() {
     try {
       const res = await api.shares.auth(shareId, pw);
       setShareToken(shareId, res.token);
-      const imgs = await api.shares.listImages(shareId);
-      setImages(imgs);
+      const scope = ++scopeRef.current;
+      const page = await api.shares.listImages(shareId);
+      if (scope !== scopeRef.current) return;
+      setImages(page.items);
+      setNextCursor(page.next_cursor);
+      setLoadingMore(false);
       setPhase("gallery");
-      push({ title: "Unlocked", body: `${imgs.length} photos` });
+      push({ title: "Unlocked", body: `${page.items.length}${page.next_cursor ? "+" : ""} photos` });
     } catch {
       push({ title: "Invalid password or expired link" });
     }
   }
 
+  function loadMore() {
+    if (!nextCursor || loadingMore) return;
+    const scope = scopeRef.current;
+    setLoadingMore(true);
+    api.shares
+      .listImages(shareId, nextCursor)
+      .then((page) => {
+        if (scope !== scopeRef.current) return;
+        setImages((prev) => [...prev, ...page.items]);
+        setNextCursor(page.next_cursor);
+      })
+      .catch(() => push({ title: "Failed to load more photos" }))
+      .finally(() => {
+        if (scope === scopeRef.current) setLoadingMore(false);
+      });
+  }
+
+  // infinite scroll: fetch the next page once the end of the grid comes into view
+  useEffect(() => {
+    const el = sentinelRef.current;
+    if (!el || !nextCursor) return;
+    const observer = new IntersectionObserver(
+      (entries) => {
+        if (entries.some((e) => e.isIntersecting)) loadMore();
+      },
+      { rootMargin: "600px" }
+    );
+    observer.observe(el);
+    return () => observer.disconnect();
+  });
+
   function openViewer(idx: number) {
     setViewer({ open: true, idx });
   }
@@ -82,6 +125,7 @@ export function ShareGallery() {
       const next = Math.max(0, Math.min(images.length - 1, v.idx + delta));
       return { ...v, idx: next };
     });
+    if (viewer.idx + delta >= images.length - 1) loadMore();
   }
 
   return (
@@ -140,6 +184,8 @@ export function ShareGallery() {
               ))}
             </div>
           )}
+          <div ref={sentinelRef} />
+          {loadingMore ? <div className="muted" style={{ marginTop: 10 }}>Loading more…</div> : null}
         </div>
       ) : null}
 
@@ -152,6 +198,7 @@ export function ShareGallery() {
             </div>
             <span className="pf-kbd">
               {images.length ? viewer.idx + 1 : 0}/{images.length}
+              {nextCursor ? "+" : ""}
             </span>
           </div>
         }
@@ -169,7 +216,7 @@ export function ShareGallery() {
                 <Button variant="ghost" onClick={() => step(-1)} disabled={viewer.idx <= 0}>
                   Prev
                 </Button>
-                <Button variant="ghost" onClick={() => step(1)} disabled={viewer.idx >= images.length - 1}>
+                <Button variant="ghost" onClick={() => step(1)} disabled={viewer.idx >= images.length - 1 && !nextCursor}>
                   Next
                 </Button>
                 <a